@@ -0,0 +1,104 @@
+"""Precompute SCimilarity and Geneformer embeddings, the barcode index and the sha256 sidecar of every
+built-in sample.
+
+Built-in search jobs (job_type 2) then read the rows of the queried barcodes from the store instead
+of running the models.
+
+Usage (from the project root):
+    python -m script.index_samples
+    python -m script.index_samples --models geneformer --sample-ids S1,S2 --force
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Iterator, List
+
+import numpy as np
+import scanpy as sc
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.main.app.common.cache.embedding_cache import read_file_digest, write_file_digest
+from src.main.app.common.cell_emb_search.model_registry import model_registry
+from src.main.app.common.cell_emb_search.sample_embedding_store import sample_embedding_store
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.datasource.barcode_index import barcode_index_cache
+from src.main.app.common.session.db_engine import get_async_engine
+from src.main.app.model.sample_model import SampleDO
+from src.main.app.service.impl.job_service_impl import JobServiceImpl
+
+EMBED_FUNCTIONS = {
+    model_registry.SCIMILARITY: JobServiceImpl.embed_scimilarity,
+    model_registry.GENEFORMER: JobServiceImpl.embed_geneformer,
+}
+
+
+async def fetch_sample_ids() -> List[str]:
+    async with AsyncSession(get_async_engine()) as session:
+        result = await session.exec(select(SampleDO.sample_id))
+        return [sample_id for sample_id in result.all() if sample_id]
+
+
+def embed_chunks(h5ad_path: str, model_name: str, chunk_size: int) -> Iterator[np.ndarray]:
+    adata = sc.read_h5ad(h5ad_path, backed="r")
+    embed = EMBED_FUNCTIONS[model_name]
+    for start in range(0, adata.n_obs, chunk_size):
+        chunk = adata[start : start + chunk_size].to_memory()
+        yield np.asarray(embed(chunk), dtype=np.float32)
+
+
+def index_sample(sample_id: str, model_name: str, chunk_size: int, force: bool) -> None:
+    h5ad_path = os.path.join(load_config().server.built_in_dir, sample_id + ".h5ad")
+    if not os.path.exists(h5ad_path):
+        print(f"  {sample_id}: {h5ad_path} not found, skipped")
+        return
+    model_version = model_registry.version(model_name)
+    meta = sample_embedding_store.read_meta(model_name, sample_id)
+    if not force and meta is not None and meta["model_version"] == model_version:
+        print(f"  {sample_id}: {model_name} up to date")
+        return
+    barcodes = list(sc.read_h5ad(h5ad_path, backed="r").obs_names)
+    start = time.perf_counter()
+    sample_dir = sample_embedding_store.write(
+        model_name, sample_id, model_version, barcodes, embed_chunks(h5ad_path, model_name, chunk_size)
+    )
+    print(f"  {sample_id}: {len(barcodes)} cells with {model_name} in {time.perf_counter() - start:.1f} s -> {sample_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute embeddings of the built-in samples")
+    parser.add_argument("--models", type=str, default=f"{model_registry.SCIMILARITY},{model_registry.GENEFORMER}")
+    parser.add_argument("--sample-ids", type=str, default="", help="Comma separated, default all samples")
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Cells embedded per step")
+    parser.add_argument("--force", action="store_true", help="Recompute stores that are up to date")
+    args = parser.parse_args()
+
+    if args.sample_ids:
+        sample_ids = [sample_id.strip() for sample_id in args.sample_ids.split(",") if sample_id.strip()]
+    else:
+        sample_ids = asyncio.run(fetch_sample_ids())
+    models = [model.strip() for model in args.models.split(",") if model.strip()]
+    print(f"Indexing {len(sample_ids)} samples with {models}")
+    failed = []
+    for i, sample_id in enumerate(sample_ids, start=1):
+        print(f"[{i}/{len(sample_ids)}] {sample_id}")
+        h5ad_path = os.path.join(load_config().server.built_in_dir, sample_id + ".h5ad")
+        if os.path.exists(h5ad_path):
+            barcode_index_cache.build(h5ad_path)
+            # 嵌入缓存按内容哈希取键, 预先写好避免作业读取整个文件
+            if args.force or read_file_digest(h5ad_path) is None:
+                write_file_digest(h5ad_path)
+        for model_name in models:
+            try:
+                index_sample(sample_id, model_name, args.chunk_size, args.force)
+            except Exception as e:
+                failed.append((sample_id, model_name))
+                print(f"  {sample_id}: {model_name} failed: {e}")
+    if failed:
+        print(f"{len(failed)} failed: {failed}")
+
+
+if __name__ == "__main__":
+    main()
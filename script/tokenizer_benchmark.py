@@ -0,0 +1,60 @@
+"""Benchmark Geneformer rank value tokenization throughput on a synthetic count matrix.
+
+Usage (from the project root):
+    python -m script.tokenizer_benchmark --n-cells 100000 --genes-per-cell 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from src.main.app.service.geneformer.tokenizer import TranscriptomeTokenizer
+
+
+def make_counts(n_cells: int, n_genes: int, genes_per_cell: int, seed: int = 2025) -> sp.csr_matrix:
+    """
+    Build a random cells x genes CSR count matrix with about `genes_per_cell` detected genes per cell.
+    """
+    rng = np.random.default_rng(seed)
+    indptr = np.arange(n_cells + 1, dtype=np.int64) * genes_per_cell
+    indices = rng.integers(0, n_genes, size=n_cells * genes_per_cell, dtype=np.int32)
+    data = rng.negative_binomial(2, 0.3, size=n_cells * genes_per_cell).astype(np.float32) + 1
+    counts = sp.csr_matrix((data, indices, indptr), shape=(n_cells, n_genes))
+    counts.sum_duplicates()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenization throughput in cells per second")
+    parser.add_argument("--n-cells", type=int, default=100_000)
+    parser.add_argument("--n-genes", type=int, default=20_000)
+    parser.add_argument("--genes-per-cell", type=int, default=1_000)
+    parser.add_argument("--engines", type=str, default="vectorized,per_cell")
+    args = parser.parse_args()
+
+    tk = TranscriptomeTokenizer()
+    ensembl_ids = [gene for gene in tk.gene_median_dict.keys() if gene in tk.gene_token_dict][: args.n_genes]
+    counts = make_counts(args.n_cells, len(ensembl_ids), args.genes_per_cell)
+    print(f"Synthetic matrix: {counts.shape[0]} cells x {counts.shape[1]} genes, {counts.nnz} non-zeros")
+
+    results = {}
+    for engine in args.engines.split(","):
+        tk.tokenize_engine = engine.strip()
+        start = time.perf_counter()
+        tokenized_cells = tk.tokenize_matrix(counts, ensembl_ids)
+        elapsed = time.perf_counter() - start
+        results[tk.tokenize_engine] = tokenized_cells
+        print(f"{tk.tokenize_engine:>10}: {elapsed:8.2f} s, {args.n_cells / elapsed:12.0f} cells/s")
+
+    if len(results) > 1:
+        engines = list(results.keys())
+        first = results[engines[0]]
+        for engine in engines[1:]:
+            same = sum(np.array_equal(a, b) for a, b in zip(first, results[engine]))
+            print(f"{engine} matches {engines[0]} on {same}/{len(first)} cells (ties may be ordered differently)")
+
+
+if __name__ == "__main__":
+    main()
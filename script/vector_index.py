@@ -0,0 +1,294 @@
+"""Manage the approximate nearest neighbour index on metadata.cell_embedding and measure its recall.
+
+The HNSW index is created by the alembic migration a7d3f5c1e924; this script rebuilds it with other
+parameters, switches to IVFFlat and compares the recall and latency of index scans with exact search.
+`snapshot` writes the in-process index used with `vector.backend: local`. The HNSW indexes on the
+half precision and binary quantized casts of cell_embedding are created by migration d4b7e2a9c615,
+`create --quantization` rebuilds them, and `benchmark --quantization` compares the size, recall
+and latency of quantized search reranked with the float32 embedding.
+
+Usage (from the project root):
+    python -m script.vector_index status
+    python -m script.vector_index create --type hnsw --m 24 --ef-construction 128 --replace
+    python -m script.vector_index create --type ivfflat --lists 2000
+    python -m script.vector_index create --type hnsw --partial "organism=Mus musculus"
+    python -m script.vector_index drop --type ivfflat
+    python -m script.vector_index create --type hnsw --quantization binary
+    python -m script.vector_index snapshot --index-type hnsw
+    python -m script.vector_index benchmark --queries 200 --k 100 --ef-search 40,100,200,400 --probes 10,50
+    python -m script.vector_index benchmark --ef-search 100 --quantization float32,halfvec,binary --rerank 4
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.main.app.common.cell_emb_search.vector_backend import LocalIndexBackend
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.session.db_engine import get_async_engine
+from src.main.app.mapper.metadata_mapper import QUANTIZED_INDEXES, VECTOR_INDEX_NAMES, metadataMapper
+
+
+def parse_partial(partial: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not partial:
+        return None
+    column, _, value = partial.partition("=")
+    return column.strip(), value.strip()
+
+
+async def show_status() -> None:
+    async with get_async_engine().connect() as connection:
+        indexes = await metadataMapper.list_vector_indexes(connection)
+        result = await connection.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'metadata'"))
+        rows = result.scalar()
+    print(f"metadata: about {rows} rows")
+    if not indexes:
+        print("No index on cell_embedding, vector queries scan the whole table")
+    for index in indexes:
+        print(f"  {index['name']} ({index['size']}{'' if index['valid'] else ', INVALID'}): {index['definition']}")
+
+
+async def create_index(args) -> None:
+    vector_config = load_config().vector
+    partial = parse_partial(args.partial)
+    index_name = metadataMapper.vector_index_name(args.type, partial, args.quantization)
+    statement = metadataMapper.build_index_sql(
+        args.type,
+        m=args.m or vector_config.hnsw_m,
+        ef_construction=args.ef_construction or vector_config.hnsw_ef_construction,
+        lists=args.lists or vector_config.ivfflat_lists,
+        concurrently=not args.blocking,
+        partial=partial,
+        quantization=args.quantization,
+    )
+    async with get_async_engine().connect() as connection:
+        # CONCURRENTLY 不能在事务中执行
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        maintenance_work_mem = args.maintenance_work_mem or vector_config.maintenance_work_mem
+        await connection.execute(text(f"SET maintenance_work_mem = '{maintenance_work_mem}'"))
+        if args.parallel_workers is not None:
+            await connection.execute(text(f"SET max_parallel_maintenance_workers = {int(args.parallel_workers)}"))
+        if args.replace:
+            await connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+        print(statement)
+        start = time.perf_counter()
+        await connection.execute(text(statement))
+        print(f"Built {index_name} in {time.perf_counter() - start:.1f} s")
+
+
+async def drop_index(args) -> None:
+    index_name = metadataMapper.vector_index_name(args.type, parse_partial(args.partial), args.quantization)
+    async with get_async_engine().connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    print(f"Dropped {index_name}")
+
+
+def write_snapshot(args) -> None:
+    """
+    Copy the metadata rows with an embedding into a local index snapshot, page by page in id order,
+    from one REPEATABLE READ transaction so the pages agree with the row count.
+    """
+    vector_config = load_config().vector
+    index_dir = args.index_dir or vector_config.local_index_dir
+    loop = asyncio.new_event_loop()
+    session = AsyncSession(get_async_engine())
+
+    def chunks():
+        after_id = None
+        done = 0
+        while True:
+            frame, embeddings = loop.run_until_complete(
+                metadataMapper.select_embedding_page(after_id, args.page_size, db_session=session)
+            )
+            if len(frame) == 0:
+                return
+            after_id = int(frame["id"].iloc[-1])
+            done += len(frame)
+            print(f"  {done}/{n_rows} rows")
+            yield frame, embeddings
+
+    try:
+        loop.run_until_complete(session.connection(execution_options={"isolation_level": "REPEATABLE READ"}))
+        n_rows = loop.run_until_complete(metadataMapper.count_embeddings(db_session=session))
+        print(f"Writing {n_rows} rows to {index_dir}")
+        start = time.perf_counter()
+        meta = LocalIndexBackend.write_snapshot(
+            index_dir,
+            n_rows,
+            chunks(),
+            index_type=args.index_type or vector_config.local_index_type,
+            m=args.m or vector_config.hnsw_m,
+            ef_construction=args.ef_construction or vector_config.hnsw_ef_construction,
+        )
+        print(f"Snapshot {meta} written in {time.perf_counter() - start:.1f} s")
+    finally:
+        loop.run_until_complete(session.close())
+        loop.close()
+
+
+async def sample_queries(n: int, percent: float) -> List[np.ndarray]:
+    statement = text(
+        f"SELECT cell_embedding FROM metadata TABLESAMPLE SYSTEM ({float(percent)}) "
+        f"WHERE cell_embedding IS NOT NULL LIMIT :n"
+    ).columns(cell_embedding=Vector(512))
+    async with AsyncSession(get_async_engine()) as session:
+        result = await session.execute(statement, {"n": n})
+        return [np.asarray(row, dtype=np.float32) for row in result.scalars()]
+
+
+async def run_queries(
+    queries: List[np.ndarray],
+    k: int,
+    exact: bool = False,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    filters: Optional[Dict[str, List[str]]] = None,
+    quantization: Optional[str] = None,
+    rerank: int = 4,
+) -> Tuple[List[set], np.ndarray]:
+    """
+    Run every query in one transaction, as a search job does.
+
+    Returns:
+        The ids returned by each query and the latency of each query in ms.
+    """
+    vector_config = load_config().vector
+    hits, latencies = [], []
+    async with AsyncSession(get_async_engine()) as session:
+        for query in queries:
+            start = time.perf_counter()
+            frame = await metadataMapper.get_docs_by_vectors(
+                embeddings=query[None], top_k=k, db_session=session, ef_search=ef_search, probes=probes,
+                exact=exact, filters=filters, iterative_scan=vector_config.iterative_scan,
+                oversample=vector_config.filter_oversample, quantization=quantization, rerank=rerank,
+                max_index_top_k=vector_config.max_index_top_k,
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits.append(set(frame["id"].tolist()))
+    return hits, np.array(latencies)
+
+
+def summarize(name: str, hits: List[set], truth: List[set], latencies: np.ndarray, k: int) -> None:
+    recall = np.mean([len(hit & expected) / max(min(k, len(expected)), 1) for hit, expected in zip(hits, truth)])
+    print(
+        f"{name:>16}: recall@{k} {recall:6.4f}, p50 {np.percentile(latencies, 50):8.1f} ms, "
+        f"p95 {np.percentile(latencies, 95):8.1f} ms, {1000 / latencies.mean():8.1f} queries/s"
+    )
+
+
+async def benchmark(args) -> None:
+    queries = await sample_queries(args.queries, args.sample_percent)
+    if not queries:
+        print("No embeddings sampled, raise --sample-percent")
+        return
+    partial = parse_partial(args.filter)
+    filters = {partial[0]: [partial[1]]} if partial is not None else None
+    print(f"{len(queries)} query cells sampled from metadata, k = {args.k}, filters = {filters}")
+    # 精确检索作为召回率的基准
+    truth, latencies = await run_queries(queries, args.k, exact=True, filters=filters)
+    summarize("exact", truth, truth, latencies, args.k)
+    for ef_search in [int(value) for value in args.ef_search.split(",") if value.strip()]:
+        hits, latencies = await run_queries(queries, args.k, ef_search=ef_search, filters=filters)
+        summarize(f"ef_search={ef_search}", hits, truth, latencies, args.k)
+    for probes in [int(value) for value in args.probes.split(",") if value.strip()]:
+        hits, latencies = await run_queries(queries, args.k, probes=probes, filters=filters)
+        summarize(f"probes={probes}", hits, truth, latencies, args.k)
+    quantizations = [value.strip() for value in args.quantization.split(",") if value.strip()]
+    if quantizations:
+        await compare_quantizations(args, queries, truth, filters, quantizations)
+
+
+async def compare_quantizations(
+    args, queries: List[np.ndarray], truth: List[set], filters: Optional[Dict[str, List[str]]], quantizations: List[str]
+) -> None:
+    """
+    Storage per row and index size of each representation, then the recall and latency of its index
+    search reranked with the float32 embedding, at the first --ef-search setting.
+    """
+    async with get_async_engine().connect() as connection:
+        sizes = await metadataMapper.embedding_sizes(connection, args.sample_percent)
+        indexes = {index["name"]: index for index in await metadataMapper.list_vector_indexes(connection)}
+    ef_search = next((int(value) for value in args.ef_search.split(",") if value.strip()), None)
+    print(f"Quantized search, ef_search = {ef_search}, rerank = {args.rerank} x k")
+    for quantization in quantizations:
+        if quantization != "float32" and quantization not in QUANTIZED_INDEXES:
+            print(f"{quantization:>16}: unknown, use float32, halfvec or binary")
+            continue
+        name = None if quantization == "float32" else quantization
+        index = indexes.get(metadataMapper.vector_index_name("hnsw", quantization=name))
+        index_size = f"{index['bytes'] / 2 ** 20:.0f} MiB" if index is not None else "no index"
+        print(f"{quantization:>16}: {sizes[quantization]:7.0f} bytes per row, hnsw {index_size}")
+        hits, latencies = await run_queries(
+            queries, args.k, ef_search=ef_search, filters=filters, quantization=name, rerank=args.rerank
+        )
+        summarize(quantization, hits, truth, latencies, args.k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector index on metadata.cell_embedding")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("status", help="List the indexes on cell_embedding")
+
+    create_parser = subparsers.add_parser("create", help="Build an index, defaults from the vector config section")
+    create_parser.add_argument("--type", choices=list(VECTOR_INDEX_NAMES), default=load_config().vector.index_type)
+    create_parser.add_argument("--m", type=int, default=None)
+    create_parser.add_argument("--ef-construction", type=int, default=None)
+    create_parser.add_argument("--lists", type=int, default=None)
+    create_parser.add_argument("--maintenance-work-mem", type=str, default=None)
+    create_parser.add_argument("--parallel-workers", type=int, default=None)
+    create_parser.add_argument("--partial", type=str, default=None, help="column=value, index only the matching rows")
+    create_parser.add_argument(
+        "--quantization", choices=list(QUANTIZED_INDEXES), default=None, help="Index a halfvec or binary cast of cell_embedding"
+    )
+    create_parser.add_argument("--replace", action="store_true", help="Drop the index of this type first")
+    create_parser.add_argument(
+        "--blocking", action="store_true", help="Build without CONCURRENTLY, blocks writes to metadata"
+    )
+
+    drop_parser = subparsers.add_parser("drop", help="Drop an index")
+    drop_parser.add_argument("--type", choices=list(VECTOR_INDEX_NAMES), required=True)
+    drop_parser.add_argument("--partial", type=str, default=None, help="column=value of a partial index")
+    drop_parser.add_argument("--quantization", choices=list(QUANTIZED_INDEXES), default=None)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Write the index of the local search backend")
+    snapshot_parser.add_argument("--index-dir", type=str, default=None, help="Default vector.local_index_dir")
+    snapshot_parser.add_argument("--index-type", choices=["hnsw", "flat"], default=None)
+    snapshot_parser.add_argument("--m", type=int, default=None)
+    snapshot_parser.add_argument("--ef-construction", type=int, default=None)
+    snapshot_parser.add_argument("--page-size", type=int, default=50_000, help="Rows read per query")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Recall and latency of index scans against exact search")
+    benchmark_parser.add_argument("--queries", type=int, default=100, help="Stored cells used as queries")
+    benchmark_parser.add_argument("--sample-percent", type=float, default=1.0, help="TABLESAMPLE percentage")
+    benchmark_parser.add_argument("--k", type=int, default=100)
+    benchmark_parser.add_argument("--ef-search", type=str, default="40,100,200,400", help="HNSW settings to compare")
+    benchmark_parser.add_argument("--probes", type=str, default="", help="IVFFlat settings to compare")
+    benchmark_parser.add_argument("--filter", type=str, default=None, help="column=value, recall of filtered search")
+    benchmark_parser.add_argument(
+        "--quantization", type=str, default="", help="Representations to compare: float32,halfvec,binary"
+    )
+    benchmark_parser.add_argument("--rerank", type=int, default=4, help="Candidates per result of quantized search")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        asyncio.run(show_status())
+    elif args.command == "create":
+        asyncio.run(create_index(args))
+    elif args.command == "drop":
+        asyncio.run(drop_index(args))
+    elif args.command == "snapshot":
+        write_snapshot(args)
+    else:
+        asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
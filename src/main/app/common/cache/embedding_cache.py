@@ -0,0 +1,255 @@
+"""Content-addressed cache of query cell embeddings"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.main.app.common.config.config_manager import load_config
+
+_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+DIGEST_SUFFIX = ".sha256"
+
+
+def read_file_digest(path: str) -> Optional[str]:
+    """
+    The sha256 of a file from its `<file>.sha256` sidecar, None if missing or older than the file.
+
+    The sidecar of a built-in sample is written by `script/index_samples.py`, so jobs never hash a
+    multi-GB h5ad just to build a cache key.
+    """
+    digest_path = path + DIGEST_SUFFIX
+    try:
+        if os.stat(digest_path).st_mtime_ns < os.stat(path).st_mtime_ns:
+            return None
+        with open(digest_path, "r", encoding="utf-8") as f:
+            digest = f.read().strip()
+    except OSError:
+        return None
+    return digest if len(digest) == 64 else None
+
+
+def write_file_digest(path: str) -> str:
+    """
+    Hash a file and write its `<file>.sha256` sidecar.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    tmp_path = f"{path}{DIGEST_SUFFIX}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(digest)
+    os.replace(tmp_path, path + DIGEST_SUFFIX)
+    return digest
+
+
+class EmbeddingCache:
+    """
+    Two tier cache of per cell embeddings keyed by (file hash, model version, barcode).
+
+    The memory tier is an LRU bounded by the bytes of the cached rows. The disk tier stores every
+    `put` as a shard, a float32 `.npy` matrix plus a `.barcodes.npy` array, under
+    `<cache_dir>/<model_version>/<file_hash>/`. Shards are opened memory mapped, so a lookup only
+    reads the rows it needs, and the oldest shards are removed once the tier exceeds its byte bound.
+    Shards are written to a temporary name and renamed, so several worker processes can share one
+    directory.
+
+    The size of the disk tier is scanned on the first `put` and then kept as a running total of the
+    shards this process writes; the directory is only walked again to evict, which also picks up the
+    shards written by other processes.
+    """
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[Tuple[str, str, str], np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        # (model_version, file_hash) -> (directory mtime, barcode -> (shard path, row))
+        self._shard_index: Dict[Tuple[str, str], Tuple[int, Dict[str, Tuple[str, int]]]] = {}
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key_dir(self, file_hash: str, model_version: str) -> str:
+        return os.path.join(self.cache_dir, model_version, file_hash)
+
+    def _remember(self, key: Tuple[str, str, str], embedding: np.ndarray) -> None:
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key).nbytes
+        self._memory[key] = embedding
+        self._memory_bytes += embedding.nbytes
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _disk_index(self, file_hash: str, model_version: str) -> Dict[str, Tuple[str, int]]:
+        key_dir = self._key_dir(file_hash, model_version)
+        try:
+            mtime = os.stat(key_dir).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = self._shard_index.get((model_version, file_hash))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        index: Dict[str, Tuple[str, int]] = {}
+        for name in sorted(os.listdir(key_dir)):
+            if not name.endswith(".barcodes.npy"):
+                continue
+            shard_path = os.path.join(key_dir, name[: -len(".barcodes.npy")] + ".npy")
+            try:
+                barcodes = np.load(os.path.join(key_dir, name), allow_pickle=False)
+            except (OSError, ValueError):
+                continue
+            for row, barcode in enumerate(barcodes.tolist()):
+                index[barcode] = (shard_path, row)
+        self._shard_index[(model_version, file_hash)] = (mtime, index)
+        return index
+
+    def get(
+        self, file_hash: str, model_version: str, barcodes: Sequence[str]
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Look up the embeddings of the given cells.
+
+        Args:
+            file_hash: sha256 of the h5ad file.
+            model_version: Version of the model that produced the embeddings.
+            barcodes: Cell barcodes, in query order.
+
+        Returns:
+            Tuple[np.ndarray, Optional[np.ndarray]]: A boolean hit mask over `barcodes` and the
+            embeddings of the hits in query order, or None if nothing was found.
+        """
+        barcodes = [str(barcode) for barcode in barcodes]
+        found: List[Optional[np.ndarray]] = [None] * len(barcodes)
+        with self._lock:
+            disk_rows: Dict[str, List[Tuple[int, int]]] = {}
+            disk_index = None
+            for i, barcode in enumerate(barcodes):
+                key = (file_hash, model_version, barcode)
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    found[i] = embedding
+                    continue
+                if disk_index is None:
+                    disk_index = self._disk_index(file_hash, model_version)
+                location = disk_index.get(barcode)
+                if location is not None:
+                    disk_rows.setdefault(location[0], []).append((i, location[1]))
+            for shard_path, positions in disk_rows.items():
+                try:
+                    shard = np.load(shard_path, mmap_mode="r")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Embedding cache shard {shard_path} unreadable: {e}")
+                    continue
+                rows = np.asarray(shard[[row for _, row in positions]])
+                for (i, _), embedding in zip(positions, rows):
+                    found[i] = embedding
+                    self._remember((file_hash, model_version, barcodes[i]), embedding)
+            hit_mask = np.array([embedding is not None for embedding in found], dtype=bool)
+            self.hits += int(hit_mask.sum())
+            self.misses += int((~hit_mask).sum())
+        if not hit_mask.any():
+            return hit_mask, None
+        return hit_mask, np.stack([embedding for embedding in found if embedding is not None])
+
+    def put(self, file_hash: str, model_version: str, barcodes: Sequence[str], embeddings: np.ndarray) -> None:
+        """
+        Store the embeddings of the given cells in both tiers.
+        """
+        barcodes = [str(barcode) for barcode in barcodes]
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if len(barcodes) == 0:
+            return
+        with self._lock:
+            for barcode, embedding in zip(barcodes, embeddings):
+                self._remember((file_hash, model_version, barcode), embedding.copy())
+        try:
+            written = self._write_shard(file_hash, model_version, barcodes, embeddings)
+            # 首次写入时扫描一次目录, 之后累加本进程写入的字节数
+            scanned = sum(size for _, _, size in self._scan_shards()) if self._disk_bytes is None else None
+            with self._lock:
+                if scanned is not None:
+                    self._disk_bytes = scanned
+                else:
+                    self._disk_bytes += written
+                over = self._disk_bytes > self.max_disk_bytes
+            if over:
+                self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _write_shard(self, file_hash: str, model_version: str, barcodes: List[str], embeddings: np.ndarray) -> int:
+        """
+        Write one shard, returning the bytes of its embedding matrix.
+        """
+        key_dir = self._key_dir(file_hash, model_version)
+        os.makedirs(key_dir, exist_ok=True)
+        shard_id = uuid.uuid4().hex
+        shard_path = os.path.join(key_dir, shard_id + ".npy")
+        for path, array in (
+            (shard_path, embeddings),
+            (os.path.join(key_dir, shard_id + ".barcodes.npy"), np.array(barcodes, dtype=np.str_)),
+        ):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, path)
+        return os.stat(shard_path).st_size
+
+    def _scan_shards(self) -> List[Tuple[float, str, int]]:
+        shards = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".barcodes.npy") or not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                shards.append((stat.st_mtime, path, stat.st_size))
+        return shards
+
+    def _evict_disk(self) -> None:
+        shards = sorted(self._scan_shards())
+        total_bytes = sum(size for _, _, size in shards)
+        for _, path, size in shards:
+            if total_bytes <= self.max_disk_bytes:
+                break
+            for stale in (path[: -len(".npy")] + ".barcodes.npy", path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total_bytes -= size
+        with self._lock:
+            self._disk_bytes = total_bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+_cache_config = load_config().cache
+embedding_cache = EmbeddingCache(
+    _cache_config.embedding_dir,
+    max_memory_bytes=_cache_config.embedding_memory_mb * 1024 * 1024,
+    max_disk_bytes=_cache_config.embedding_disk_gb * 1024 * 1024 * 1024,
+)
@@ -0,0 +1,263 @@
+"""Cache of completed job results served by /job/getResult"""
+
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.datasource.result_store import RESULT_SUFFIX, read_result, result_nbytes, to_arrow_table
+
+_ENTRY_OVERHEAD = 1024
+_HEADER = struct.Struct("<Q")
+
+
+class ResultEntry:
+    """
+    Where the result of a completed job lives and, for small results, its decoded rows.
+    """
+
+    def __init__(self, path: str, species: int, has_hits: bool, frame: Optional[pd.DataFrame] = None):
+        self.path = path
+        self.species = species
+        self.has_hits = has_hits
+        self.frame = frame
+        # 是否有对应的共享内存段 (本进程发布或从其他进程读取), 只有这样的条目才随段的删除失效
+        self.shared = False
+        self.nbytes = _ENTRY_OVERHEAD
+        if frame is not None:
+            self.nbytes += int(frame.memory_usage(deep=True).sum())
+
+
+class ResultCache:
+    """
+    LRU of result entries keyed by job id, with an optional shared memory tier.
+
+    The memory tier is bounded by the decoded size of the held frames; results larger than
+    `max_frame_bytes` are held by location only and paged from their file. With the shared memory
+    tier enabled, every entry put by a process is also published as an Arrow IPC stream in a
+    segment named after the job id, so the other server workers attach to it instead of querying
+    the database and decoding the file again. A process unlinks the oldest segments it published
+    once they exceed `max_shared_bytes`, and all of them when it exits.
+
+    `invalidate` drops the entry and unlinks its segment. Workers holding an entry that has a
+    segment check that it still exists on every hit, so a deleted job is not served by another
+    worker. Entries that were never published, because they exceed `max_shared_bytes` or failed to
+    serialize, and entries whose segment this process evicted itself keep hitting from memory; their
+    invalidation is local to the process, as it is without the shared memory tier.
+    """
+
+    SHARED_MEMORY_PREFIX = "scemb_result_"
+
+    def __init__(
+        self, max_memory_bytes: int, max_frame_bytes: int, shared_memory: bool = False, max_shared_bytes: int = 0
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_frame_bytes = max_frame_bytes
+        self.shared_memory = shared_memory
+        self.max_shared_bytes = max_shared_bytes
+        self._memory: "OrderedDict[int, ResultEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._published: "OrderedDict[int, SharedMemory]" = OrderedDict()
+        self._published_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared_name(self, job_id: int) -> str:
+        return f"{self.SHARED_MEMORY_PREFIX}{job_id}"
+
+    def _attach(self, job_id: int, to_unlink: bool = False) -> Optional[SharedMemory]:
+        try:
+            shm = SharedMemory(self._shared_name(job_id))
+        except FileNotFoundError:
+            return None
+        if job_id not in self._published and not to_unlink:
+            # attaching registers the segment with this process' resource tracker too, which would
+            # unlink it when this process exits although another process owns it
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+    def get(self, job_id: int) -> Optional[ResultEntry]:
+        """
+        The entry held in memory by this process. Only checks that its segment still exists, the
+        shared memory tier is read by `get_shared`.
+        """
+        with self._lock:
+            entry = self._memory.get(job_id)
+            if entry is not None and entry.shared:
+                shm = self._attach(job_id)
+                if shm is None:
+                    self._drop(job_id)
+                    entry = None
+                else:
+                    shm.close()
+            if entry is not None:
+                self._memory.move_to_end(job_id)
+                self.memory_hits += 1
+                return entry
+        return None
+
+    def get_shared(self, job_id: int) -> Optional[ResultEntry]:
+        """
+        The entry published by another worker, remembered in memory. Copies and decodes the segment,
+        so async callers run it in a thread.
+        """
+        entry = self._read_shared(job_id) if self.shared_memory else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._remember(job_id, entry)
+        return entry
+
+    def put(self, job_id: int, entry: ResultEntry) -> None:
+        """
+        Cache the entry of a completed job. Frames larger than `max_frame_bytes` are not kept.
+        """
+        if entry.frame is not None and entry.nbytes > self.max_frame_bytes:
+            entry = ResultEntry(entry.path, entry.species, entry.has_hits)
+        with self._lock:
+            self._remember(job_id, entry)
+        if self.shared_memory:
+            try:
+                entry.shared = self._publish(job_id, entry)
+            except Exception as e:
+                logger.warning(f"Publish result of job {job_id} to shared memory failed: {e}")
+
+    def invalidate(self, job_id: int) -> None:
+        with self._lock:
+            self._drop(job_id)
+            if not self.shared_memory:
+                return
+            # unlink() unregisters the segment, so keep the registration made by attaching
+            shm = self._attach(job_id, to_unlink=True)
+            published = self._published.pop(job_id, None)
+            if published is not None:
+                self._published_bytes -= published.size
+                published.close()
+        if shm is not None:
+            shm.close()
+            self._unlink(shm)
+
+    @staticmethod
+    def _unlink(shm: SharedMemory) -> None:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            # already unlinked by the worker that invalidated it
+            pass
+
+    def load_frame(self, path: str) -> Optional[pd.DataFrame]:
+        """
+        Decode a whole result file when it fits the frame bound. Legacy Excel results are always
+        decoded, they cannot be paged from disk.
+        """
+        if path.endswith(RESULT_SUFFIX):
+            if result_nbytes(path) > self.max_frame_bytes:
+                return None
+            return read_result(path)
+        return pd.read_excel(path)
+
+    def _remember(self, job_id: int, entry: ResultEntry) -> None:
+        self._drop(job_id)
+        nbytes = entry.nbytes
+        if nbytes > self.max_memory_bytes:
+            return
+        self._memory[job_id] = entry
+        self._memory_bytes += nbytes
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _drop(self, job_id: int) -> None:
+        entry = self._memory.pop(job_id, None)
+        if entry is not None:
+            self._memory_bytes -= entry.nbytes
+
+    def _publish(self, job_id: int, entry: ResultEntry) -> bool:
+        """
+        Write the entry to a segment named after the job id. Returns whether the segment exists.
+        """
+        table = to_arrow_table(entry.frame) if entry.frame is not None else pa.table({})
+        table = table.replace_schema_metadata({
+            "path": entry.path,
+            "species": str(entry.species),
+            "has_hits": str(int(entry.has_hits)),
+            "has_frame": str(int(entry.frame is not None)),
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        payload = sink.getvalue()
+        size = _HEADER.size + payload.size
+        if size > self.max_shared_bytes:
+            return False
+        try:
+            shm = SharedMemory(self._shared_name(job_id), create=True, size=size)
+        except FileExistsError:
+            # 其他进程已发布同一结果
+            return True
+        # Arrow 缓冲区的 memoryview 格式为有符号字节, 转为与共享内存一致的无符号字节
+        shm.buf[_HEADER.size: size] = memoryview(payload).cast("B")
+        # the length is written last, readers treat a zero length as a segment still being written
+        _HEADER.pack_into(shm.buf, 0, payload.size)
+        with self._lock:
+            self._published[job_id] = shm
+            self._published_bytes += shm.size
+            while self._published_bytes > self.max_shared_bytes:
+                evicted_id, evicted = self._published.popitem(last=False)
+                self._published_bytes -= evicted.size
+                evicted.close()
+                self._unlink(evicted)
+                # 容量淘汰不是失效, 本进程内存中的条目继续有效
+                remembered = self._memory.get(evicted_id)
+                if remembered is not None:
+                    remembered.shared = False
+        return True
+
+    def _read_shared(self, job_id: int) -> Optional[ResultEntry]:
+        shm = self._attach(job_id)
+        if shm is None:
+            return None
+        try:
+            (length,) = _HEADER.unpack_from(shm.buf, 0)
+            if length == 0:
+                return None
+            payload = pa.py_buffer(bytes(shm.buf[_HEADER.size: _HEADER.size + length]))
+        finally:
+            shm.close()
+        table = pa.ipc.open_stream(payload).read_all()
+        metadata = {key.decode(): value.decode() for key, value in (table.schema.metadata or {}).items()}
+        frame = table.to_pandas() if metadata.get("has_frame") == "1" else None
+        entry = ResultEntry(metadata["path"], int(metadata["species"]), metadata["has_hits"] == "1", frame)
+        entry.shared = True
+        return entry
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "shared_entries": len(self._published),
+            "shared_bytes": self._published_bytes,
+        }
+
+
+_cache_config = load_config().cache
+result_cache = ResultCache(
+    max_memory_bytes=_cache_config.result_memory_mb * 1024 * 1024,
+    max_frame_bytes=_cache_config.result_frame_mb * 1024 * 1024,
+    shared_memory=_cache_config.result_shared_memory,
+    max_shared_bytes=_cache_config.result_shared_memory_mb * 1024 * 1024,
+)
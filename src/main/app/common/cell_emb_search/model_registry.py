@@ -0,0 +1,162 @@
+"""Process-wide registry of the resident search models"""
+
+import hashlib
+import os
+import threading
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from src.main.app.common.cell_emb_search.cell_search_model import CellQuerySingleton
+from src.main.app.common.cell_emb_search.projection_head import ProjectionHead
+from src.main.app.common.config.config_manager import load_config
+
+
+class ModelState(str, Enum):
+    """
+    Enum for model load state.
+    """
+
+    unloaded = "unloaded"
+    loading = "loading"
+    loaded = "loaded"
+    failed = "failed"
+
+
+class ModelRegistry:
+    """
+    Loads SCimilarity, Geneformer and the Geneformer projection head at most once per process
+    and keeps them resident.
+
+    Listeners are notified on every state change, which lets a worker process report
+    its model states back to the server.
+    """
+
+    SCIMILARITY = "scimilarity"
+    GENEFORMER = "geneformer"
+    PROJECTION = "projection"
+    # 预加载且决定就绪状态的模型; 投影头不在检索路径上, 仅在调用 get_projection 时加载
+    WARM_UP = (SCIMILARITY, GENEFORMER)
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._states: Dict[str, ModelState] = {
+            self.SCIMILARITY: ModelState.unloaded,
+            self.GENEFORMER: ModelState.unloaded,
+            self.PROJECTION: ModelState.unloaded,
+        }
+        self._loaders: Dict[str, Callable[[], Any]] = {
+            self.SCIMILARITY: self._load_scimilarity,
+            self.GENEFORMER: self._load_geneformer,
+            self.PROJECTION: self._load_projection,
+        }
+        self._listeners: List[Callable[[str, ModelState], None]] = []
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_scimilarity() -> Any:
+        return CellQuerySingleton(load_config().server.model_dir)
+
+    @staticmethod
+    def _load_geneformer() -> Any:
+        from src.main.app.service.geneformer import perturber_utils as pu
+
+        model_dir = load_config().server.model_dir + os.sep + "geneformer"
+        return pu.load_model("Pretrained", 0, model_dir, mode="eval")
+
+    @staticmethod
+    def _load_projection() -> ProjectionHead:
+        config = load_config()
+        model_dir = config.server.model_dir + os.sep + "geneformer"
+        return ProjectionHead.load(model_dir, out_dim=config.model.projection_dim)
+
+    def add_listener(self, listener: Callable[[str, ModelState], None]) -> None:
+        self._listeners.append(listener)
+
+    def _set_state(self, name: str, state: ModelState) -> None:
+        self._states[name] = state
+        for listener in self._listeners:
+            try:
+                listener(name, state)
+            except Exception as e:
+                logger.warning(f"Model state listener failed: {e}")
+
+    def get(self, name: str) -> Any:
+        """
+        Return the resident model, loading it on first use.
+
+        Args:
+            name: The model name, SCIMILARITY or GENEFORMER.
+
+        Returns:
+            The loaded model instance.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                logger.info(f"开始加载{name}模型")
+                self._set_state(name, ModelState.loading)
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception:
+                    self._set_state(name, ModelState.failed)
+                    raise
+                self._set_state(name, ModelState.loaded)
+                logger.info(f"{name}模型加载完成")
+            return self._models[name]
+
+    def get_scimilarity(self) -> Any:
+        return self.get(self.SCIMILARITY)
+
+    def get_geneformer(self) -> Any:
+        return self.get(self.GENEFORMER)
+
+    def get_projection(self) -> ProjectionHead:
+        return self.get(self.PROJECTION)
+
+    def version(self, name: str) -> str:
+        """
+        Identify the weights of a model without loading it, for use in cache keys.
+
+        The version hashes the name, size and modification time of the files directly in the
+        model directory, so replacing a checkpoint changes it.
+        """
+        if name not in self._versions:
+            model_dir = load_config().server.model_dir
+            if name != self.SCIMILARITY:
+                model_dir = model_dir + os.sep + "geneformer"
+            sha256 = hashlib.sha256(name.encode())
+            for entry in sorted(os.scandir(model_dir), key=lambda e: e.name):
+                if entry.is_file():
+                    stat = entry.stat()
+                    sha256.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            self._versions[name] = f"{name}-{sha256.hexdigest()[:16]}"
+        return self._versions[name]
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        """
+        Load the given models, or the WARM_UP models, recording failures instead of raising.
+        """
+        for name in names or self.WARM_UP:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"{name}模型加载失败: {e}")
+
+    def status(self) -> Dict[str, str]:
+        return {name: state.value for name, state in self._states.items()}
+
+    @classmethod
+    def is_ready(cls, states: Dict[str, str]) -> bool:
+        """
+        Whether the states reported by a worker have every WARM_UP model loaded. Models outside
+        WARM_UP are loaded on demand and do not gate readiness.
+        """
+        return all(states.get(name) == ModelState.loaded.value for name in cls.WARM_UP)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,96 @@
+"""Fixed linear projection applied to Geneformer cell embeddings"""
+
+import hashlib
+import io
+import json
+import os
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import torch
+from loguru import logger
+
+PROJECTION_FILE_NAME = "projection_head.pt"
+PROJECTION_SEED = 2025
+
+
+class ProjectionHead:
+    """
+    Linear projection whose weights are persisted next to the Geneformer model.
+
+    The weights are loaded from `<model_dir>/projection_head.pt`. If the file does not exist yet,
+    they are initialised once from a fixed seed and saved, so every process and every job projects
+    into the same space.
+    """
+
+    def __init__(self, weight: torch.Tensor, bias: torch.Tensor, version: str):
+        self.weight = weight
+        self.bias = bias
+        self.version = version
+
+    @property
+    def in_dim(self) -> int:
+        return self.weight.shape[1]
+
+    @property
+    def out_dim(self) -> int:
+        return self.weight.shape[0]
+
+    @classmethod
+    def load(cls, model_dir: str, out_dim: int = 128) -> "ProjectionHead":
+        """
+        Load the projection head from the model directory, creating it on first use.
+
+        Args:
+            model_dir: The Geneformer model directory.
+            out_dim: Output dimension used when the head has to be created.
+
+        Returns:
+            ProjectionHead: The loaded projection head.
+        """
+        path = os.path.join(model_dir, PROJECTION_FILE_NAME)
+        if not os.path.exists(path):
+            cls._create(path, cls._hidden_size(model_dir), out_dim)
+        with open(path, "rb") as f:
+            content = f.read()
+        # 只读一次文件, 版本与权重来自同一份内容
+        state = torch.load(io.BytesIO(content), map_location="cpu")
+        version = hashlib.sha256(content).hexdigest()[:16]
+        logger.info(f"Projection head {path} loaded, version {version}")
+        return cls(state["weight"].float(), state["bias"].float(), version)
+
+    @staticmethod
+    def _hidden_size(model_dir: str) -> int:
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            return int(json.load(f)["hidden_size"])
+
+    @staticmethod
+    def _create(path: str, in_dim: int, out_dim: int) -> None:
+        generator = torch.Generator().manual_seed(PROJECTION_SEED)
+        # same initialisation as torch.nn.Linear, drawn from a fixed seed
+        bound = 1 / np.sqrt(in_dim)
+        weight = (torch.rand(out_dim, in_dim, generator=generator) * 2 - 1) * bound
+        bias = (torch.rand(out_dim, generator=generator) * 2 - 1) * bound
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save({"weight": weight, "bias": bias}, tmp_path)
+        # several workers may race to create the file, the rename keeps it whole
+        os.replace(tmp_path, path)
+        logger.warning(f"Projection head not found, created {path} ({in_dim} -> {out_dim})")
+
+    def project(self, embeddings: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """
+        Project all cell embeddings with a single matrix multiplication.
+
+        Args:
+            embeddings: Cell embeddings, one row per cell.
+
+        Returns:
+            np.ndarray: Projected embeddings of shape (n_cells, out_dim), float32.
+        """
+        emb = torch.as_tensor(np.asarray(embeddings, dtype=np.float32))
+        if emb.dim() == 1:
+            emb = emb.unsqueeze(0)
+        with torch.no_grad():
+            result = torch.addmm(self.bias, emb, self.weight.T)
+        return result.numpy()
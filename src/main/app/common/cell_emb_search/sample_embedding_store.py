@@ -0,0 +1,155 @@
+"""Precomputed embeddings of the built-in samples"""
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.main.app.common.config.config_manager import load_config
+
+EMBEDDINGS_FILE = "embeddings.npy"
+BARCODES_FILE = "barcodes.npy"
+META_FILE = "meta.json"
+
+
+class SampleEmbeddingStore:
+    """
+    One embedding matrix per (model, built-in sample), written offline by `script/index_samples.py`.
+
+    Layout: `<store_dir>/<model name>/<sample_id>/` holds `embeddings.npy` (n_cells x dim, float16 or
+    float32), `barcodes.npy` (row order of the matrix) and `meta.json` (model version, dtype, shape).
+    The matrix is opened memory mapped, so a lookup only reads the rows of the queried cells.
+    """
+
+    def __init__(self, store_dir: str, dtype: str = "float16", max_open_samples: int = 64):
+        self.store_dir = store_dir
+        self.dtype = np.dtype(dtype)
+        self.max_open_samples = max_open_samples
+        # (model name, sample_id) -> (model version, barcode -> row, memory mapped matrix)
+        self._open: "OrderedDict[Tuple[str, str], Tuple[str, dict, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sample_dir(self, model_name: str, sample_id: str) -> str:
+        return os.path.join(self.store_dir, model_name, sample_id)
+
+    def read_meta(self, model_name: str, sample_id: str) -> Optional[dict]:
+        meta_path = os.path.join(self.sample_dir(model_name, sample_id), META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open_sample(self, model_name: str, sample_id: str):
+        key = (model_name, sample_id)
+        with self._lock:
+            if key in self._open:
+                self._open.move_to_end(key)
+                return self._open[key]
+        meta = self.read_meta(model_name, sample_id)
+        if meta is None:
+            return None
+        sample_dir = self.sample_dir(model_name, sample_id)
+        barcodes = np.load(os.path.join(sample_dir, BARCODES_FILE), allow_pickle=False)
+        matrix = np.load(os.path.join(sample_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        entry = (meta["model_version"], {barcode: row for row, barcode in enumerate(barcodes.tolist())}, matrix)
+        with self._lock:
+            self._open[key] = entry
+            while len(self._open) > self.max_open_samples:
+                self._open.popitem(last=False)
+        return entry
+
+    def lookup(
+        self, model_name: str, sample_id: str, model_version: str, barcodes: Sequence[str]
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Look up the precomputed embeddings of the given cells of a built-in sample.
+
+        Args:
+            model_name: ModelRegistry model name.
+            sample_id: SampleDO.sample_id of the built-in sample.
+            model_version: Current version of the model, stale stores are ignored.
+            barcodes: Cell barcodes, in query order.
+
+        Returns:
+            Tuple[np.ndarray, Optional[np.ndarray]]: A boolean hit mask over `barcodes` and the
+            float32 embeddings of the hits in query order, or None if nothing was found.
+        """
+        hit_mask = np.zeros(len(barcodes), dtype=bool)
+        try:
+            entry = self._open_sample(model_name, sample_id)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Embedding store of {sample_id} unreadable: {e}")
+            return hit_mask, None
+        if entry is None:
+            return hit_mask, None
+        version, rows_by_barcode, matrix = entry
+        if version != model_version:
+            logger.warning(f"Embedding store of {sample_id} is stale ({version} != {model_version})")
+            return hit_mask, None
+        rows = [rows_by_barcode.get(str(barcode), -1) for barcode in barcodes]
+        hit_mask = np.array([row >= 0 for row in rows], dtype=bool)
+        if not hit_mask.any():
+            return hit_mask, None
+        return hit_mask, np.asarray(matrix[[row for row in rows if row >= 0]], dtype=np.float32)
+
+    def write(
+        self,
+        model_name: str,
+        sample_id: str,
+        model_version: str,
+        barcodes: Sequence[str],
+        chunks: Iterable[np.ndarray],
+    ) -> str:
+        """
+        Write the embeddings of every cell of a sample, replacing any previous store.
+
+        Args:
+            model_name: ModelRegistry model name.
+            sample_id: SampleDO.sample_id of the built-in sample.
+            model_version: Version of the model that produced the embeddings.
+            barcodes: All barcodes of the sample, in row order.
+            chunks: Consecutive blocks of embedding rows covering all barcodes.
+
+        Returns:
+            str: The sample directory.
+        """
+        sample_dir = self.sample_dir(model_name, sample_id)
+        tmp_dir = f"{sample_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        matrix = None
+        start = 0
+        for chunk in chunks:
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, EMBEDDINGS_FILE),
+                    mode="w+",
+                    dtype=self.dtype,
+                    shape=(len(barcodes), chunk.shape[1]),
+                )
+            matrix[start : start + len(chunk)] = chunk
+            start += len(chunk)
+        if matrix is None or start != len(barcodes):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise ValueError(f"Expected {len(barcodes)} embeddings for {sample_id}, got {start}")
+        matrix.flush()
+        del matrix
+        np.save(os.path.join(tmp_dir, BARCODES_FILE), np.array([str(b) for b in barcodes], dtype=np.str_))
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {"model_version": model_version, "dtype": self.dtype.name, "n_cells": len(barcodes)}, f
+            )
+        shutil.rmtree(sample_dir, ignore_errors=True)
+        os.replace(tmp_dir, sample_dir)
+        with self._lock:
+            self._open.pop((model_name, sample_id), None)
+        return sample_dir
+
+
+_cache_config = load_config().cache
+sample_embedding_store = SampleEmbeddingStore(_cache_config.sample_store_dir, dtype=_cache_config.sample_store_dtype)
@@ -0,0 +1,432 @@
+"""Nearest neighbour search backends of the metadata cell embeddings"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import hnswlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from src.main.app.common.config.config import VectorConfig
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.datasource.result_store import ROW_GROUP_SIZE, read_result_rows
+from src.main.app.mapper.metadata_mapper import FILTER_COLUMNS, MAX_INDEX_TOP_K, RESULT_COLUMNS, metadataMapper
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.parquet"
+INDEX_FILE = "hnsw.bin"
+META_FILE = "meta.json"
+CURRENT_LINK = "current"
+# 写入新快照后保留的快照版本数, 仍在使用旧快照的进程通过已打开的文件继续读取
+KEEP_VERSIONS = 2
+# 精确检索时每块相似度矩阵的元素数上限 (查询数 x 行数)
+EXACT_BLOCK_ELEMENTS = 16 * 1024 * 1024
+METADATA_SCHEMA = pa.schema(
+    [("id", pa.int64())] + [(column, pa.string()) for column in RESULT_COLUMNS if column != "id"]
+)
+
+
+class VectorSearchBackend(ABC):
+    """
+    Top k search of query embeddings over metadata.cell_embedding.
+
+    `search` returns one row per hit with query_idx (the row of the query), the metadata RESULT_COLUMNS
+    and score (cosine similarity), ordered by query_idx then descending score; cell_embedding is added
+    with `with_embedding`.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def search(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        db_session: Optional[AsyncSession] = None,
+        similarity_threshold: Optional[float] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        with_embedding: bool = False,
+    ) -> pd.DataFrame:
+        pass
+
+
+class PgvectorBackend(VectorSearchBackend):
+    """
+    Search in PostgreSQL with the pgvector index of the metadata table, see `MetadataMapper.get_docs_by_vectors`.
+    """
+
+    name = "pgvector"
+
+    def __init__(
+        self, iterative_scan: Optional[str] = None, oversample: int = 1, quantization: Optional[str] = None,
+        rerank: int = 4, max_index_top_k: int = MAX_INDEX_TOP_K
+    ):
+        self.iterative_scan = iterative_scan
+        self.oversample = oversample
+        self.quantization = quantization
+        self.rerank = rerank
+        self.max_index_top_k = max_index_top_k
+
+    async def search(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        db_session: Optional[AsyncSession] = None,
+        similarity_threshold: Optional[float] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        with_embedding: bool = False,
+    ) -> pd.DataFrame:
+        return await metadataMapper.get_docs_by_vectors(
+            embeddings=embeddings, db_session=db_session, top_k=top_k, similarity_threshold=similarity_threshold,
+            ef_search=ef_search, probes=probes, filters=filters, iterative_scan=self.iterative_scan,
+            oversample=self.oversample, with_embedding=with_embedding, quantization=self.quantization,
+            rerank=self.rerank, max_index_top_k=self.max_index_top_k,
+        )
+
+
+class _Snapshot:
+    def __init__(self, version_dir: str, meta: dict, matrix: np.ndarray, index: Optional[hnswlib.Index]):
+        self.version_dir = version_dir
+        self.meta = meta
+        self.matrix = matrix
+        self.index = index
+        # 元数据文件在加载时打开并一直保持, 快照版本被删除后仍可读取
+        self.metadata_source = pa.memory_map(os.path.join(version_dir, METADATA_FILE))
+        self.filter_columns: Dict[str, pd.Series] = {}
+        self.lock = threading.Lock()
+
+    def filter_column(self, column: str) -> pd.Series:
+        """
+        A filter column of every row, dictionary encoded, read on first use.
+        """
+        with self.lock:
+            if column not in self.filter_columns:
+                table = pq.read_table(self.metadata_source, columns=[column], read_dictionary=[column])
+                self.filter_columns[column] = table.column(column).to_pandas()
+            return self.filter_columns[column]
+
+
+class LocalIndexBackend(VectorSearchBackend):
+    """
+    In-process search over a snapshot of the metadata table, without a database round trip.
+
+    Snapshots are written by `script/vector_index.py snapshot` to versioned directories under
+    index_dir, and the `current` symlink is switched to the new version with an atomic rename. A
+    version holds `embeddings.npy` (the L2-normalized float32 embeddings, opened memory mapped so the
+    server workers share the page cache), `metadata.parquet` (RESULT_COLUMNS in the same row order,
+    read by row group for the hits only), `hnsw.bin` (an hnswlib graph in cosine space, absent for
+    the flat index type) and `meta.json`.
+
+    Each search resolves `current` and loads a version it has not loaded yet; a loaded snapshot
+    keeps its files open, so searches already running on it, and workers that have not switched
+    yet, keep reading one consistent version even after it is pruned.
+
+    Filters and the similarity threshold are applied to an oversampled HNSW candidate list; queries
+    left with fewer than top k hits although more rows match the filters are searched exactly over
+    the matching rows. The flat index type always searches exactly, by blocks of the matrix.
+    """
+
+    name = "local"
+
+    def __init__(self, index_dir: str, ef_search: int = 100, oversample: int = 4):
+        self.index_dir = index_dir
+        self.ef_search = ef_search
+        self.oversample = oversample
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> _Snapshot:
+        try:
+            version = os.readlink(os.path.join(self.index_dir, CURRENT_LINK))
+        except OSError:
+            raise FileNotFoundError(f"No vector index snapshot in {self.index_dir}, see script/vector_index.py")
+        version_dir = os.path.join(self.index_dir, version)
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.version_dir == version_dir:
+                return self._snapshot
+            with open(os.path.join(version_dir, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(os.path.join(version_dir, EMBEDDINGS_FILE), mmap_mode="r")
+            index = None
+            if meta["index_type"] == "hnsw":
+                index = hnswlib.Index(space="cosine", dim=meta["dim"])
+                index.load_index(os.path.join(version_dir, INDEX_FILE), max_elements=meta["n_rows"])
+            self._snapshot = _Snapshot(version_dir, meta, matrix, index)
+            logger.info(f"Loaded vector index snapshot {version}: {meta}")
+            return self._snapshot
+
+    async def search(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        db_session: Optional[AsyncSession] = None,
+        similarity_threshold: Optional[float] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        with_embedding: bool = False,
+    ) -> pd.DataFrame:
+        return await run_in_threadpool(
+            self.search_sync, embeddings, top_k, similarity_threshold, ef_search, filters, with_embedding
+        )
+
+    def search_sync(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        similarity_threshold: Optional[float] = None,
+        ef_search: Optional[int] = None,
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        with_embedding: bool = False,
+    ) -> pd.DataFrame:
+        snapshot = self.load()
+        queries = normalize(np.asarray(embeddings, dtype=np.float32))
+        allowed = None
+        for column, values in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported metadata filter: {column}")
+            if values:
+                mask = snapshot.filter_column(column).isin(list(values)).to_numpy()
+                allowed = mask if allowed is None else allowed & mask
+        n_rows = snapshot.meta["n_rows"]
+        top_k = min(top_k, n_rows)
+        if len(queries) == 0 or top_k == 0:
+            rows = np.empty((len(queries), 0), dtype=np.int64)
+            scores = np.empty((len(queries), 0), dtype=np.float32)
+        elif snapshot.index is None:
+            rows, scores = exact_search(snapshot.matrix, queries, top_k, allowed)
+        else:
+            rows, scores = self._hnsw_search(snapshot, queries, top_k, ef_search, allowed, similarity_threshold)
+        return self._to_frame(snapshot, rows, scores, similarity_threshold, with_embedding)
+
+    def _hnsw_search(
+        self,
+        snapshot: _Snapshot,
+        queries: np.ndarray,
+        top_k: int,
+        ef_search: Optional[int],
+        allowed: Optional[np.ndarray],
+        similarity_threshold: Optional[float],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        filtered = allowed is not None or similarity_threshold is not None
+        k = min(top_k * self.oversample if filtered else top_k, snapshot.meta["n_rows"])
+        # hnswlib 的 set_ef 作用于整个索引, 与 knn_query 一起加锁
+        with snapshot.lock:
+            snapshot.index.set_ef(max(ef_search or self.ef_search, k))
+            labels, distances = snapshot.index.knn_query(queries, k=k)
+        rows = labels.astype(np.int64)
+        scores = (1 - distances).astype(np.float32)
+        if not filtered:
+            return rows, scores
+        valid = np.ones(rows.shape, dtype=bool) if allowed is None else allowed[rows]
+        if similarity_threshold is not None:
+            valid &= scores >= similarity_threshold
+        keep = valid & (np.cumsum(valid, axis=1) <= top_k)
+        rows = np.where(keep, rows, -1)
+        scores = np.where(keep, scores, -np.inf)
+        if allowed is not None:
+            # 候选集中满足条件的不足 top_k 且候选未被阈值截断时, 对满足条件的行精确检索
+            retry = keep.sum(axis=1) < min(top_k, int(allowed.sum()))
+            if similarity_threshold is not None:
+                retry &= scores_at_k(distances) >= similarity_threshold
+            if retry.any():
+                exact_rows, exact_scores = exact_search(snapshot.matrix, queries[retry], top_k, allowed)
+                rows[retry] = -1
+                scores[retry] = -np.inf
+                rows[retry, :top_k] = exact_rows
+                scores[retry, :top_k] = exact_scores
+        order = np.argsort(-scores, axis=1, kind="stable")
+        return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    @staticmethod
+    def _to_frame(
+        snapshot: _Snapshot,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        similarity_threshold: Optional[float],
+        with_embedding: bool,
+    ) -> pd.DataFrame:
+        valid = (rows >= 0) & np.isfinite(scores)
+        if similarity_threshold is not None:
+            valid &= scores >= similarity_threshold
+        query_idx = np.nonzero(valid)[0].astype(np.int64)
+        hit_rows = rows[valid]
+        hits = read_result_rows(snapshot.metadata_source, hit_rows)
+        hits.insert(0, "query_idx", query_idx)
+        hits["score"] = scores[valid].astype(np.float64)
+        if with_embedding:
+            hits["cell_embedding"] = list(np.asarray(snapshot.matrix[hit_rows]))
+        return hits
+
+    @staticmethod
+    def write_snapshot(
+        index_dir: str,
+        n_rows: int,
+        chunks: Iterable[Tuple[pd.DataFrame, np.ndarray]],
+        index_type: str = "hnsw",
+        m: int = 16,
+        ef_construction: int = 64,
+    ) -> dict:
+        """
+        Write a snapshot version from consecutive chunks of metadata rows and their embeddings, point
+        `current` at it and prune all but the newest KEEP_VERSIONS versions.
+
+        Args:
+            index_dir: The snapshot directory.
+            n_rows: The total number of rows of the chunks.
+            chunks: (RESULT_COLUMNS frame, embedding matrix) pairs covering n_rows rows.
+            index_type: hnsw, or flat for exact search only.
+            m: Connections per layer of the HNSW graph.
+            ef_construction: Candidate list size while building the HNSW graph.
+
+        Returns:
+            dict: The snapshot meta, with its version.
+        """
+        # 版本名按时间排序, 同一秒内写入的快照以纳秒区分
+        now = time.time_ns()
+        version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10 ** 9))}-{now % 10 ** 9:09d}"
+        tmp_dir = os.path.join(index_dir, f"{version}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        matrix = None
+        writer = None
+        start = 0
+        try:
+            for frame, embeddings in chunks:
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(
+                        os.path.join(tmp_dir, EMBEDDINGS_FILE), mode="w+", dtype=np.float32,
+                        shape=(n_rows, embeddings.shape[1]),
+                    )
+                matrix[start: start + len(embeddings)] = normalize(np.asarray(embeddings, dtype=np.float32))
+                start += len(embeddings)
+                table = pa.Table.from_pandas(frame[list(RESULT_COLUMNS)], schema=METADATA_SCHEMA, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(tmp_dir, METADATA_FILE), METADATA_SCHEMA, compression="zstd")
+                writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            if matrix is None or start != n_rows:
+                raise ValueError(f"Expected {n_rows} embeddings, got {start}")
+        except Exception:
+            if writer is not None:
+                writer.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        writer.close()
+        matrix.flush()
+        dim = matrix.shape[1]
+        if index_type == "hnsw":
+            index = hnswlib.Index(space="cosine", dim=dim)
+            index.init_index(max_elements=n_rows, ef_construction=ef_construction, M=m)
+            for chunk_start in range(0, n_rows, 100_000):
+                chunk = np.asarray(matrix[chunk_start: chunk_start + 100_000])
+                index.add_items(chunk, np.arange(chunk_start, chunk_start + len(chunk)))
+            index.save_index(os.path.join(tmp_dir, INDEX_FILE))
+        del matrix
+        meta = {
+            "version": version, "index_type": index_type, "n_rows": n_rows, "dim": dim, "m": m,
+            "ef_construction": ef_construction, "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_dir, os.path.join(index_dir, version))
+        # 新建符号链接后原子替换 current, 搜索始终看到完整的某个版本
+        tmp_link = os.path.join(index_dir, f"{CURRENT_LINK}.{os.getpid()}.tmp")
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, os.path.join(index_dir, CURRENT_LINK))
+        LocalIndexBackend.prune_versions(index_dir, version)
+        return meta
+
+    @staticmethod
+    def prune_versions(index_dir: str, current: str, keep: int = KEEP_VERSIONS) -> None:
+        """
+        Remove the snapshot versions older than the newest `keep`, never the current one.
+        """
+        versions = sorted(
+            name for name in os.listdir(index_dir)
+            if name != CURRENT_LINK and not name.endswith(".tmp") and os.path.isdir(os.path.join(index_dir, name))
+        )
+        for name in versions[:-keep] if keep > 0 else versions:
+            if name != current:
+                shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def scores_at_k(distances: np.ndarray) -> np.ndarray:
+    """
+    The similarity of the last candidate of each query, the lower bound of the candidates returned.
+    """
+    return 1 - distances[:, -1]
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def exact_search(
+    matrix: np.ndarray, queries: np.ndarray, top_k: int, allowed: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top k cosine search of normalized queries over a normalized, possibly memory mapped matrix,
+    by blocks of rows. Rows outside `allowed` are skipped.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The rows and scores, both n_queries x top_k, by descending
+        score; missing hits have row -1 and score -inf.
+    """
+    n_queries = len(queries)
+    best_rows = np.empty((n_queries, 0), dtype=np.int64)
+    best_scores = np.empty((n_queries, 0), dtype=np.float32)
+    block_rows = max(1024, EXACT_BLOCK_ELEMENTS // max(n_queries, 1))
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start: start + block_rows], dtype=np.float32)
+        scores = queries @ block.T
+        if allowed is not None:
+            scores[:, ~allowed[start: start + len(block)]] = -np.inf
+        rows = np.broadcast_to(np.arange(start, start + len(block), dtype=np.int64), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        if scores.shape[1] > top_k:
+            part = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            scores = np.take_along_axis(scores, part, axis=1)
+            rows = np.take_along_axis(rows, part, axis=1)
+        best_rows, best_scores = rows, scores
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows[~np.isfinite(best_scores)] = -1
+    if best_rows.shape[1] < top_k:
+        pad = top_k - best_rows.shape[1]
+        best_rows = np.pad(best_rows, ((0, 0), (0, pad)), constant_values=-1)
+        best_scores = np.pad(best_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return best_rows, best_scores
+
+
+def create_vector_backend(vector_config: VectorConfig) -> VectorSearchBackend:
+    if vector_config.backend == "local":
+        return LocalIndexBackend(
+            vector_config.local_index_dir, ef_search=vector_config.ef_search, oversample=vector_config.filter_oversample
+        )
+    quantization = vector_config.quantization if vector_config.quantization != "none" else None
+    return PgvectorBackend(
+        vector_config.iterative_scan, vector_config.filter_oversample, quantization, vector_config.rerank_factor,
+        vector_config.max_index_top_k,
+    )
+
+
+vector_backend = create_vector_backend(load_config().vector)
@@ -184,6 +184,231 @@ class GenConfig:
         return f"{self.__class__.__name__}({self.__dict__})"
 
 
+class JobConfig:
+    def __init__(
+        self,
+        max_workers: int = 1,
+        poll_interval: float = 2.0,
+        mp_start_method: str = "spawn",
+        max_query_cells: int = 50000,
+        heartbeat_timeout: float = 60.0,
+        max_attempts: int = 2,
+    ) -> None:
+        """
+        Initializes job execution configuration.
+
+        Args:
+            max_workers (int): The number of worker processes that execute search jobs.
+                               The pool is created per server worker. Default is 1.
+            poll_interval (float): Seconds between two polls of the pending job queue. Default is 2.0.
+            mp_start_method (str): The multiprocessing start method of the worker pool. Default is 'spawn'.
+            max_query_cells (int): The maximum number of query cells of one search job. Default is 50000.
+            heartbeat_timeout (float): Seconds without a heartbeat after which an executing job is
+                                       considered lost with its server worker. Default is 60.0.
+            max_attempts (int): Claims of a lost job before it is marked failed instead of run
+                                again. Default is 2.
+        """
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.mp_start_method = mp_start_method
+        self.max_query_cells = max_query_cells
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+    def __repr__(self) -> str:
+        """
+        Returns a string representation of the job configuration.
+
+        Returns:
+            str: A string representation of the JobConfig instance.
+        """
+        return f"{self.__class__.__name__}({self.__dict__})"
+
+
+class ModelConfig:
+    def __init__(
+        self,
+        preload: bool = True,
+        geneformer_on_disk: bool = False,
+        geneformer_batch_tokens: int = 16384,
+        geneformer_batch_cells: int = 256,
+        projection_dim: int = 128,
+    ) -> None:
+        """
+        Initializes model loading configuration.
+
+        Args:
+            preload (bool): Whether each job worker loads SCimilarity and Geneformer when it starts
+                            instead of on its first job. Default is True.
+            geneformer_on_disk (bool): Debug mode that runs Geneformer through the .loom, .dataset
+                                       and .csv files in the job output directory. Default is False.
+            geneformer_batch_tokens (int): Padded tokens per Geneformer forward pass; cells are batched
+                                           by length under this budget. Default is 16384.
+            geneformer_batch_cells (int): Maximum number of cells per Geneformer forward pass. Default is 256.
+            projection_dim (int): Output dimension of the Geneformer projection head, used only when
+                                  projection_head.pt has to be created. Default is 128.
+        """
+        self.preload = preload
+        self.geneformer_on_disk = geneformer_on_disk
+        self.geneformer_batch_tokens = geneformer_batch_tokens
+        self.geneformer_batch_cells = geneformer_batch_cells
+        self.projection_dim = projection_dim
+
+    def __repr__(self) -> str:
+        """
+        Returns a string representation of the model configuration.
+
+        Returns:
+            str: A string representation of the ModelConfig instance.
+        """
+        return f"{self.__class__.__name__}({self.__dict__})"
+
+
+class CacheConfig:
+    def __init__(
+        self,
+        embedding_enable: bool = True,
+        embedding_dir: str = "",
+        embedding_memory_mb: int = 256,
+        embedding_disk_gb: int = 20,
+        sample_store_enable: bool = True,
+        sample_store_dir: str = "",
+        sample_store_dtype: str = "float16",
+        h5ad_handles: int = 16,
+        result_enable: bool = True,
+        result_memory_mb: int = 256,
+        result_frame_mb: int = 32,
+        result_shared_memory: bool = False,
+        result_shared_memory_mb: int = 512,
+    ) -> None:
+        """
+        Initializes cache configuration.
+
+        Args:
+            embedding_enable (bool): Whether query cell embeddings are cached by file hash, barcode and
+                                     model version. Default is True.
+            embedding_dir (str): Directory of the on-disk embedding shards. Default is
+                                 `<server.home_dir>/cache/embedding`.
+            embedding_memory_mb (int): Memory bound of the in-process embedding LRU. Default is 256.
+            embedding_disk_gb (int): Disk bound of the embedding shards. Default is 20.
+            sample_store_enable (bool): Whether built-in sample jobs read precomputed embeddings.
+                                        Default is True.
+            sample_store_dir (str): Directory of the precomputed built-in sample embeddings. Default is
+                                    `<server.home_dir>/embedding-store`.
+            sample_store_dtype (str): Storage dtype of the precomputed embeddings, float16 or float32.
+                                      Default is float16.
+            h5ad_handles (int): Number of h5ad files kept open in backed mode per process. Default is 16.
+            result_enable (bool): Whether completed job results are cached for /job/getResult. Default is True.
+            result_memory_mb (int): Memory bound of the in-process result LRU. Default is 256.
+            result_frame_mb (int): Results up to this decoded size are held as a whole frame, larger ones
+                                   only by their file location. Default is 32.
+            result_shared_memory (bool): Whether cached results are also published in shared memory for
+                                         the other server workers. Default is False.
+            result_shared_memory_mb (int): Bound of the shared memory published by one process.
+                                           Default is 512.
+        """
+        self.embedding_enable = embedding_enable
+        self.embedding_dir = embedding_dir
+        self.embedding_memory_mb = embedding_memory_mb
+        self.embedding_disk_gb = embedding_disk_gb
+        self.sample_store_enable = sample_store_enable
+        self.sample_store_dir = sample_store_dir
+        self.sample_store_dtype = sample_store_dtype
+        self.h5ad_handles = h5ad_handles
+        self.result_enable = result_enable
+        self.result_memory_mb = result_memory_mb
+        self.result_frame_mb = result_frame_mb
+        self.result_shared_memory = result_shared_memory
+        self.result_shared_memory_mb = result_shared_memory_mb
+
+    def __repr__(self) -> str:
+        """
+        Returns a string representation of the cache configuration.
+
+        Returns:
+            str: A string representation of the CacheConfig instance.
+        """
+        return f"{self.__class__.__name__}({self.__dict__})"
+
+
+class VectorConfig:
+    def __init__(
+        self,
+        backend: str = "pgvector",
+        local_index_dir: str = "",
+        local_index_type: str = "hnsw",
+        index_type: str = "hnsw",
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 64,
+        ivfflat_lists: int = 1000,
+        ef_search: int = 100,
+        probes: int = 10,
+        maintenance_work_mem: str = "2GB",
+        iterative_scan: str = "relaxed_order",
+        filter_oversample: int = 4,
+        quantization: str = "none",
+        rerank_factor: int = 4,
+        max_index_top_k: int = 10000,
+    ) -> None:
+        """
+        Initializes the configuration of the approximate nearest neighbour index on metadata.cell_embedding.
+
+        Args:
+            backend (str): The search backend of metadata embeddings: pgvector searches in PostgreSQL, local
+                           in process over a snapshot written by script/vector_index.py. Default is 'pgvector'.
+            local_index_dir (str): Directory of the local snapshot. Default is `<server.home_dir>/vector-index`.
+            local_index_type (str): Index of the local snapshot, hnsw or flat for exact search. Default is 'hnsw'.
+            index_type (str): The index built by script/vector_index.py, hnsw or ivfflat. Default is 'hnsw'.
+            hnsw_m (int): Connections per layer of the HNSW graph. Default is 16.
+            hnsw_ef_construction (int): Candidate list size while building the HNSW graph. Default is 64.
+            ivfflat_lists (int): Number of IVFFlat lists, about rows / 1000 up to 1M rows. Default is 1000.
+            ef_search (int): Default HNSW candidate list size of a query, raised to the number of requested
+                             results. Default is 100.
+            probes (int): Default number of IVFFlat lists scanned by a query. Default is 10.
+            maintenance_work_mem (str): Memory of the index build, the HNSW graph is built much faster
+                                        when it fits. Default is '2GB'.
+            iterative_scan (str): pgvector 0.8+ iterative index scan of queries with metadata filters or
+                                  more than 1000 results, so they still return top k rows from the index;
+                                  skipped on older pgvector, 'off' disables it.
+                                  Default is 'relaxed_order'.
+            filter_oversample (int): Factor of ef_search and probes of filtered queries when iterative
+                                     scan is off. Default is 4.
+            quantization (str): Index searched for candidates of pgvector queries: none for the float32
+                                embedding, halfvec for its half precision cast or binary for its binary
+                                quantized cast; candidates are reranked with the float32 embedding.
+                                Default is 'none'.
+            rerank_factor (int): Candidates per requested result of quantized queries. Default is 4.
+            max_index_top_k (int): Largest number of results per query answered by the pgvector index.
+                                   Above ef_search's limit of 1000 the HNSW scan is iterative (pgvector
+                                   0.8+), trading recall for latency; larger queries scan exactly.
+                                   Default is 10000.
+        """
+        self.backend = backend
+        self.local_index_dir = local_index_dir
+        self.local_index_type = local_index_type
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.ivfflat_lists = ivfflat_lists
+        self.ef_search = ef_search
+        self.probes = probes
+        self.maintenance_work_mem = maintenance_work_mem
+        self.iterative_scan = iterative_scan
+        self.filter_oversample = filter_oversample
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.max_index_top_k = max_index_top_k
+
+    def __repr__(self) -> str:
+        """
+        Returns a string representation of the vector index configuration.
+
+        Returns:
+            str: A string representation of the VectorConfig instance.
+        """
+        return f"{self.__class__.__name__}({self.__dict__})"
+
+
 class Config:
     def __init__(self, config_dict=None):
         if "server" in config_dict:
@@ -202,6 +427,28 @@ class Config:
             self.gen = GenConfig(**config_dict["gen"])
         else:
             self.gen = GenConfig()
+        if "job" in config_dict:
+            self.job = JobConfig(**config_dict["job"])
+        else:
+            self.job = JobConfig()
+        if "model" in config_dict:
+            self.model = ModelConfig(**config_dict["model"])
+        else:
+            self.model = ModelConfig()
+        if "cache" in config_dict:
+            self.cache = CacheConfig(**config_dict["cache"])
+        else:
+            self.cache = CacheConfig()
+        if "vector" in config_dict:
+            self.vector = VectorConfig(**config_dict["vector"])
+        else:
+            self.vector = VectorConfig()
+        if self.cache.embedding_dir == "":
+            self.cache.embedding_dir = self.server.home_dir + "/cache/embedding"
+        if self.cache.sample_store_dir == "":
+            self.cache.sample_store_dir = self.server.home_dir + "/embedding-store"
+        if self.vector.local_index_dir == "":
+            self.vector.local_index_dir = self.server.home_dir + "/vector-index"
 
     def __repr__(self) -> str:
         """
@@ -0,0 +1,172 @@
+"""Sorted barcode index stored next to an h5ad file"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from src.main.app.common.datasource.h5ad_source import h5ad_source
+
+SORTED_SUFFIX = ".barcodes.npy"
+ROWS_SUFFIX = ".barcode_rows.npy"
+POSITIONS_SUFFIX = ".barcode_positions.npy"
+
+
+class BarcodeIndex:
+    """
+    Barcodes of one h5ad file as a sorted, fixed-width utf-8 table with row offsets.
+
+    Three sidecar files sit next to the h5ad file and are opened memory mapped:
+    `<file>.barcodes.npy` holds the barcodes in sorted order, `<file>.barcode_rows.npy` the row of
+    each sorted barcode and `<file>.barcode_positions.npy` the sorted position of each row. Exact
+    lookups and prefix ranges are binary searches over the sorted table.
+    """
+
+    def __init__(self, barcodes: np.ndarray, rows: np.ndarray, positions: np.ndarray):
+        self.barcodes = barcodes
+        self.rows = rows
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _encode(barcodes: Sequence[str]) -> np.ndarray:
+        return np.array([str(barcode).encode("utf-8") for barcode in barcodes], dtype=np.bytes_)
+
+    @staticmethod
+    def sidecar_paths(h5ad_path: str) -> Tuple[str, str, str]:
+        return h5ad_path + SORTED_SUFFIX, h5ad_path + ROWS_SUFFIX, h5ad_path + POSITIONS_SUFFIX
+
+    @classmethod
+    def build(cls, h5ad_path: str) -> "BarcodeIndex":
+        """
+        Build the index from the file's obs_names and write the sidecar files.
+
+        The index is still returned when the directory is not writable.
+        """
+        encoded = cls._encode(h5ad_source.read_obs_names(h5ad_path))
+        rows = np.argsort(encoded, kind="stable").astype(np.int64)
+        sorted_barcodes = encoded[rows]
+        positions = np.empty_like(rows)
+        positions[rows] = np.arange(len(rows), dtype=np.int64)
+        try:
+            for path, array in zip(cls.sidecar_paths(h5ad_path), (sorted_barcodes, rows, positions)):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, array, allow_pickle=False)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Write barcode index of {h5ad_path} failed: {e}")
+        return cls(sorted_barcodes, rows, positions)
+
+    @classmethod
+    def load(cls, h5ad_path: str) -> "BarcodeIndex":
+        """
+        Open the sidecar files memory mapped, building them first if missing or older than the file.
+        """
+        paths = cls.sidecar_paths(h5ad_path)
+        h5ad_mtime = os.stat(h5ad_path).st_mtime_ns
+        if all(os.path.exists(path) and os.stat(path).st_mtime_ns >= h5ad_mtime for path in paths):
+            try:
+                return cls(*(np.load(path, mmap_mode="r") for path in paths))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Barcode index of {h5ad_path} unreadable, rebuilding: {e}")
+        return cls.build(h5ad_path)
+
+    def lookup(self, barcodes: Sequence[str]) -> np.ndarray:
+        """
+        Resolve barcodes to row positions of the h5ad file.
+
+        Returns:
+            np.ndarray: The row of each barcode, -1 for barcodes not in the file.
+        """
+        encoded = self._encode(barcodes)
+        if len(self) == 0 or len(encoded) == 0:
+            return np.full(len(encoded), -1, dtype=np.int64)
+        found = np.searchsorted(self.barcodes, encoded)
+        in_range = found < len(self)
+        hit = np.zeros(len(encoded), dtype=bool)
+        hit[in_range] = self.barcodes[found[in_range]] == encoded[in_range]
+        rows = np.full(len(encoded), -1, dtype=np.int64)
+        rows[hit] = self.rows[found[hit]]
+        return rows
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """
+        Sorted positions [start, stop) of the barcodes starting with prefix.
+        """
+        if not prefix:
+            return 0, len(self)
+        encoded = prefix.encode("utf-8")
+        start = int(np.searchsorted(self.barcodes, np.bytes_(encoded), side="left"))
+        # 0xff never occurs in utf-8, so it sorts after every barcode with this prefix
+        stop = int(np.searchsorted(self.barcodes, np.bytes_(encoded + b"\xff"), side="left"))
+        return start, stop
+
+    def page(self, prefix: str = "", current: int = 1, page_size: int = 100) -> Tuple[List[str], int]:
+        """
+        One page of barcodes starting with prefix, in sorted order, or in file order without a prefix.
+
+        Returns:
+            Tuple[List[str], int]: The barcodes of the page and the total number of matches.
+        """
+        start, stop = self.prefix_range(prefix)
+        total = stop - start
+        offset = start + max(current - 1, 0) * page_size
+        end = min(offset + page_size, stop)
+        if offset >= end:
+            return [], total
+        if prefix:
+            page = self.barcodes[offset:end]
+        else:
+            page = self.barcodes[self.positions[offset:end]]
+        return [barcode.decode("utf-8") for barcode in page.tolist()], total
+
+    def all_barcodes(self) -> List[str]:
+        """
+        Every barcode in file order.
+        """
+        return [barcode.decode("utf-8") for barcode in self.barcodes[self.positions].tolist()]
+
+
+class BarcodeIndexCache:
+    """
+    Recently used barcode indexes, keyed by (path, mtime) of their h5ad file.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._indexes: "OrderedDict[Tuple[str, int], BarcodeIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, h5ad_path: str) -> BarcodeIndex:
+        h5ad_path = os.path.abspath(h5ad_path)
+        key = (h5ad_path, os.stat(h5ad_path).st_mtime_ns)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = BarcodeIndex.load(h5ad_path)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def build(self, h5ad_path: str) -> BarcodeIndex:
+        """
+        (Re)write the sidecar files of a file, e.g. right after it was uploaded.
+        """
+        h5ad_path = os.path.abspath(h5ad_path)
+        index = BarcodeIndex.build(h5ad_path)
+        with self._lock:
+            self._indexes[(h5ad_path, os.stat(h5ad_path).st_mtime_ns)] = index
+        return index
+
+
+barcode_index_cache = BarcodeIndexCache()
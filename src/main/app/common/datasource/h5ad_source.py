@@ -0,0 +1,107 @@
+"""Backed, cached access to h5ad files"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Sequence, Union
+
+import anndata
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from src.main.app.common.config.config_manager import load_config
+
+
+class H5adSource:
+    """
+    Keeps recently used h5ad files open in backed mode and reads only what a caller asks for.
+
+    Opening a file in backed mode loads `obs` and `var` but leaves `X` and the layers on disk, so
+    listing barcodes or materializing a few rows no longer reads the whole matrix. Handles are
+    keyed by (path, size, mtime), so a replaced file is reopened, and at most `max_open` files stay
+    open; the least recently used handle is closed first.
+    """
+
+    def __init__(self, max_open: int = 16):
+        self.max_open = max_open
+        self._handles: "OrderedDict[tuple, anndata.AnnData]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _close(adata: anndata.AnnData) -> None:
+        try:
+            adata.file.close()
+        except Exception as e:
+            logger.warning(f"Close h5ad handle {adata.filename} failed: {e}")
+
+    def open(self, path: str) -> anndata.AnnData:
+        """
+        Return a backed, read-only AnnData for the file, reusing an open handle when possible.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            adata = self._handles.get(key)
+            if adata is not None:
+                self._handles.move_to_end(key)
+                return adata
+            for stale_key in [k for k in self._handles if k[0] == path]:
+                self._close(self._handles.pop(stale_key))
+            adata = anndata.read_h5ad(path, backed="r")
+            self._handles[key] = adata
+            while len(self._handles) > self.max_open:
+                _, evicted = self._handles.popitem(last=False)
+                self._close(evicted)
+            return adata
+
+    def close(self, path: str) -> None:
+        """
+        Close the open handles of a file, e.g. before it is deleted.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._handles if k[0] == path]:
+                self._close(self._handles.pop(key))
+
+    def read_obs_names(self, path: str) -> pd.Index:
+        """
+        Return the barcodes of the file without reading its expression matrix.
+        """
+        with self._lock:
+            return self.open(path).obs_names.copy()
+
+    def read_rows(self, path: str, rows: Union[Sequence[int], np.ndarray]) -> anndata.AnnData:
+        """
+        Load the given rows of the file into memory, in the given order.
+
+        Args:
+            path: The h5ad file.
+            rows: Integer row positions or a boolean mask over all cells.
+
+        Returns:
+            anndata.AnnData: An in-memory AnnData holding only the requested cells.
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        # h5py reads increasing positions only, restore the requested order afterwards
+        order = np.argsort(rows, kind="stable")
+        with self._lock:
+            adata = self.open(path)[rows[order]].to_memory()
+        if not np.array_equal(order, np.arange(len(rows))):
+            adata = adata[np.argsort(order)].copy()
+        return adata
+
+    def materialize(self, adata: anndata.AnnData) -> anndata.AnnData:
+        """
+        Load a backed AnnData or backed view into memory, under the handle lock.
+        """
+        if not adata.isbacked:
+            return adata
+        with self._lock:
+            return adata.to_memory()
+
+
+h5ad_source = H5adSource(load_config().cache.h5ad_handles)
@@ -0,0 +1,130 @@
+"""Columnar storage of search job results"""
+
+import os
+from typing import Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.main.app.common.util.excel_util import write_excel_rows
+
+RESULT_SUFFIX = ".parquet"
+ROW_GROUP_SIZE = 2048
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    df = df.rename(columns=str)
+    for column in df.columns:
+        # Excel accepted columns of mixed types, Arrow needs one type per column
+        if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True).startswith("mixed"):
+            df[column] = df[column].map(lambda value: None if pd.isna(value) else str(value))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_result(df: pd.DataFrame, path: str, row_group_size: int = ROW_GROUP_SIZE) -> int:
+    """
+    Write a result frame as a Parquet file with fixed-size row groups.
+
+    Args:
+        df: The result rows.
+        path: Destination path, replaced atomically.
+        row_group_size: Rows per row group, the unit read by `read_result_page`.
+
+    Returns:
+        int: The size of the written file in bytes.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        pq.write_table(to_arrow_table(df), tmp_path, row_group_size=row_group_size, compression="zstd")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(path)
+
+
+def _row_group_starts(parquet_file: pq.ParquetFile) -> Tuple[np.ndarray, np.ndarray]:
+    metadata = parquet_file.metadata
+    group_rows = np.array([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)], dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(group_rows)[:-1]]).astype(np.int64), group_rows
+
+
+def read_result_page(path: str, start: int, stop: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Read rows [start, stop) of a result file, decoding only the row groups that overlap them.
+
+    Returns:
+        Tuple[pd.DataFrame, int]: The rows and the total number of rows in the file.
+    """
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    total = metadata.num_rows
+    stop = min(stop, total)
+    if start >= stop:
+        return parquet_file.schema_arrow.empty_table().to_pandas(), total
+    group_starts, group_rows = _row_group_starts(parquet_file)
+    groups = np.flatnonzero((group_starts < stop) & (group_starts + group_rows > start))
+    table = parquet_file.read_row_groups(groups.tolist())
+    offset = start - int(group_starts[groups[0]])
+    return table.slice(offset, stop - start).to_pandas(), total
+
+
+def read_result_rows(path: Union[str, pa.NativeFile], rows: Sequence[int]) -> pd.DataFrame:
+    """
+    Read the given rows of a result file, by path or from an open file, in the given order, decoding
+    only the row groups holding them.
+    """
+    parquet_file = pq.ParquetFile(path)
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) == 0:
+        return parquet_file.schema_arrow.empty_table().to_pandas()
+    group_starts, group_rows = _row_group_starts(parquet_file)
+    row_groups = np.searchsorted(group_starts, rows, side="right") - 1
+    groups = np.unique(row_groups)
+    # offset of each selected row group within the table read below
+    read_starts = np.concatenate([[0], np.cumsum(group_rows[groups])[:-1]])
+    positions = rows - group_starts[row_groups] + read_starts[np.searchsorted(groups, row_groups)]
+    table = parquet_file.read_row_groups(groups.tolist())
+    return table.take(pa.array(positions)).to_pandas()
+
+
+def result_num_rows(path: str) -> int:
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def result_nbytes(path: str) -> int:
+    """
+    Uncompressed size of a result file's columns, an estimate of its size once decoded.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    return sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+
+
+def read_result(path: str) -> pd.DataFrame:
+    return pq.read_table(path).to_pandas()
+
+
+def iter_result_batches(path: str, batch_size: int = ROW_GROUP_SIZE) -> Iterator[pd.DataFrame]:
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def iter_result_rows(path: str, batch_size: int = ROW_GROUP_SIZE) -> Iterator[tuple]:
+    """
+    Rows of a result file as tuples, missing values as None.
+    """
+    for batch in iter_result_batches(path, batch_size):
+        yield from batch.astype(object).where(batch.notna(), None).itertuples(index=False, name=None)
+
+
+def result_columns(path: str) -> List[str]:
+    return pq.ParquetFile(path).schema_arrow.names
+
+
+def export_result_excel(parquet_path: str, xlsx_path: str) -> None:
+    """
+    Convert a result file to xlsx batch by batch, for downloads.
+    """
+    write_excel_rows(xlsx_path, result_columns(parquet_path), iter_result_batches(parquet_path))
@@ -75,3 +75,13 @@ class TokenTypeEnum(str, Enum):
     access = "access"
     refresh = "refresh"
     bearer = "Bearer"
+
+
+class ExportFormat(str, Enum):
+    """
+    Enum for export file formats.
+    """
+
+    xlsx = "xlsx"
+    csv = "csv"
+    parquet = "parquet"
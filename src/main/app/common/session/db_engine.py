@@ -1,10 +1,16 @@
 from threading import Lock
 from typing import Dict
 
+from loguru import logger
+from pgvector.asyncpg import register_vector
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 
 from src.main.app.common.config.config_manager import load_config
 
+# Set in the connection info once the pgvector binary codecs are registered on an asyncpg connection
+VECTOR_CODEC_KEY = "pgvector_codec"
+
 # Global engine cache with thread safety
 _engine_map: Dict[str, AsyncEngine] = {}
 _lock = Lock()
@@ -31,4 +37,20 @@ def get_async_engine():
             pool_recycle=database_config.pool_recycle,
             pool_pre_ping=True,
         )
+        if async_engine.dialect.driver == "asyncpg":
+            event.listen(async_engine.sync_engine, "connect", register_vector_codec)
     return async_engine
+
+
+def register_vector_codec(dbapi_connection, connection_record) -> None:
+    """
+    Register the pgvector binary codecs on a new asyncpg connection, so vector parameters are sent as
+    float32 arrays from NumPy and vector columns come back as NumPy arrays, without text formatting.
+    """
+    try:
+        dbapi_connection.run_async(register_vector)
+    except Exception as e:
+        # 数据库尚未安装 vector 扩展时, 向量参数退回文本格式
+        logger.warning(f"Register pgvector codec failed: {e}")
+        return
+    connection_record.info[VECTOR_CODEC_KEY] = True
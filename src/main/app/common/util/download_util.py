@@ -0,0 +1,63 @@
+"""File download util"""
+
+import os
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+
+def is_not_modified(response: Response, request: Request) -> bool:
+    """
+    Whether the client's cached copy, named by If-None-Match or If-Modified-Since, is still current.
+    If-None-Match takes precedence when both are sent.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = response.headers.get("etag")
+        return etag is not None and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = response.headers.get("last-modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def file_download(
+    path: str,
+    filename: str,
+    request: Optional[Request] = None,
+    media_type: str = "application/octet-stream",
+    remove_after: bool = False,
+) -> Response:
+    """
+    Send a file as an attachment with ETag, Last-Modified and Range support.
+
+    Starlette's FileResponse answers Range and If-Range requests with 206 responses, so interrupted
+    downloads resume where they stopped, and reads the file in a worker thread, or hands it to the
+    server when it supports the pathsend extension. A request whose If-None-Match or
+    If-Modified-Since matches the file gets an empty 304.
+
+    Args:
+        path: The file to send.
+        filename: The download name in Content-Disposition.
+        request: The incoming request, for the conditional headers. None disables them.
+        media_type: The Content-Type.
+        remove_after: Delete the file once it was sent, for temporary exports.
+    """
+    stat_result = os.stat(path)
+    background = BackgroundTask(os.remove, path) if remove_after else None
+    response = FileResponse(
+        path, filename=filename, media_type=media_type, stat_result=stat_result, background=background
+    )
+    if request is not None and not remove_after and is_not_modified(response, request):
+        headers = {name: response.headers[name] for name in ("etag", "last-modified") if name in response.headers}
+        return Response(status_code=304, headers=headers)
+    return response
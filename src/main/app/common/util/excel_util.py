@@ -1,65 +1,182 @@
+import csv
 import io
-from datetime import datetime
-from typing import List, Type
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterable, Iterator, List, Sequence, Type
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
 from loguru import logger
 from pydantic import BaseModel
-from starlette.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+from src.main.app.common.enums.enum import ExportFormat
+from src.main.app.common.util.download_util import file_download
+
+EXPORT_BATCH_SIZE = 1000
+_MEDIA_TYPES = {
+    ExportFormat.xlsx: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+
+def _cell(value: Any) -> Any:
+    if value is None or isinstance(value, (str, bool, int, float, date)):
+        return value
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
 
 
-async def export_excel(schema: Type[BaseModel], file_name: str, data_list: List[BaseModel] = []) -> StreamingResponse:
+def _batched(rows: Iterable[Sequence[Any]], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Sequence[Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Iterator[bytes]:
     """
-    Export a template or data as an Excel file with Microsoft YaHei font for all cells and auto-width headers.
+    Encode rows as utf-8 CSV, yielding one chunk per batch of rows. The byte order mark lets Excel
+    detect the encoding.
     """
-    field_names = list(schema.model_fields.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for batch in _batched(rows):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
 
-    # 创建 DataFrame
-    if data_list:
-        data_dicts = [item.model_dump() for item in data_list]
-        user_export_df = pd.DataFrame(data_dicts, columns=field_names)
-    else:
-        user_export_df = pd.DataFrame(columns=field_names)
 
-    # 生成文件名
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    filename = f"{file_name}_{timestamp}.xlsx"
-    stream = io.BytesIO()
+def write_xlsx(path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]], sheet_name: str = "Sheet1") -> None:
+    """
+    Write rows to an xlsx file in xlsxwriter constant_memory mode, so only the current row is held by
+    the writer. Cells use the Microsoft YaHei font, the header is bold and columns are sized from the
+    header.
+    """
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_numbers": False})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        body_format = workbook.add_format({"font_name": "Microsoft YaHei"})
+        # 传入单元格格式时 default_date_format 不生效, 日期需要单独的格式
+        date_format = workbook.add_format({"font_name": "Microsoft YaHei", "num_format": "yyyy-mm-dd hh:mm:ss"})
+        header_format = workbook.add_format({"font_name": "Microsoft YaHei", "bold": True})
+        for col_idx, column in enumerate(columns):
+            worksheet.set_column(col_idx, col_idx, max(len(str(column)) + 2, 15))
+        worksheet.write_row(0, 0, columns, header_format)
+        for row_idx, row in enumerate(rows, start=1):
+            for col_idx, value in enumerate(row):
+                value = _cell(value)
+                worksheet.write(row_idx, col_idx, value, date_format if isinstance(value, date) else body_format)
+    finally:
+        workbook.close()
+
+
+def write_parquet(path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """
+    Write rows to a Parquet file one row group per batch.
+    """
+    writer = None
+    try:
+        for batch in _batched(rows, EXPORT_BATCH_SIZE * 10):
+            table = pa.Table.from_pandas(
+                pd.DataFrame([[_cell(value) for value in row] for row in batch], columns=list(columns)),
+                preserve_index=False,
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            elif table.schema != writer.schema:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+        if writer is None:
+            pq.write_table(pa.table({column: pa.array([], type=pa.string()) for column in columns}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_excel_rows(path: str, columns: List[str], batches: Iterable[pd.DataFrame], sheet_name: str = "Sheet1") -> None:
+    """
+    Write DataFrame batches to an xlsx file, replacing it atomically. Missing values are written as
+    empty cells.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def rows() -> Iterator[tuple]:
+        for batch in batches:
+            yield from batch.astype(object).where(batch.notna(), None).itertuples(index=False, name=None)
 
     try:
-        with pd.ExcelWriter(stream, engine="openpyxl") as writer:
-            user_export_df.to_excel(writer, index=False, sheet_name=filename)
-
-            # 获取 worksheet
-            workbook = writer.book
-            worksheet = workbook.active  # 获取默认工作表
-
-            # 设置字体 & 表头加粗
-            yahei_font = Font(name="Microsoft YaHei")
-            bold_font = Font(name="Microsoft YaHei", bold=True)
-
-            for row_idx, row in enumerate(worksheet.iter_rows(), start=1):
-                for cell in row:
-                    cell.font = yahei_font if row_idx > 1 else bold_font  # 第一行加粗
-
-            # 计算最佳列宽
-            for col_idx, col_name in enumerate(user_export_df.columns, start=1):
-                column_letter = get_column_letter(col_idx)
-                max_length = max(
-                    user_export_df[col_name].astype(str).map(len).max() if not user_export_df.empty else 0,
-                    len(col_name)
-                )
-                worksheet.column_dimensions[column_letter].width = max(max_length + 2, 15)  # 适当增加宽度
-
-        # 保存到流
-        stream.seek(0)
-        return StreamingResponse(
-            stream,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
+        write_xlsx(tmp_path, columns, rows(), sheet_name)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def stream_rows(
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    file_name: str,
+    export_format: ExportFormat = ExportFormat.xlsx,
+) -> Response:
+    """
+    Stream rows as a download in the requested format.
+
+    CSV is encoded while the response is sent. xlsx and Parquet keep their index at the end of the
+    file, so they are written to a temporary file in the threadpool first, then streamed and removed.
 
+    Args:
+        columns: The header.
+        rows: The rows, consumed once.
+        file_name: The download name without extension.
+        export_format: xlsx, csv or parquet.
+    """
+    export_format = ExportFormat(export_format)
+    filename = f"{file_name}.{export_format.value}"
+    if export_format == ExportFormat.csv:
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+        return StreamingResponse(iter_csv(columns, rows), media_type=_MEDIA_TYPES[export_format], headers=headers)
+    fd, tmp_path = tempfile.mkstemp(suffix="." + export_format.value)
+    os.close(fd)
+    try:
+        if export_format == ExportFormat.xlsx:
+            await run_in_threadpool(write_xlsx, tmp_path, columns, rows, file_name)
+        else:
+            await run_in_threadpool(write_parquet, tmp_path, columns, rows)
     except Exception as e:
-        logger.error(f"Failed to export Excel: {e}")
+        os.remove(tmp_path)
+        logger.error(f"Failed to export {export_format.value}: {e}")
         raise
+    return file_download(tmp_path, filename, media_type=_MEDIA_TYPES[export_format], remove_after=True)
+
+
+async def export_excel(
+    schema: Type[BaseModel],
+    file_name: str,
+    data_list: Iterable[BaseModel] = (),
+    export_format: ExportFormat = ExportFormat.xlsx,
+) -> Response:
+    """
+    Export a template or data with the fields of the schema as columns, as xlsx by default.
+    """
+    field_names = list(schema.model_fields.keys())
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    rows = ([getattr(item, name, None) for name in field_names] for item in data_list)
+    return await stream_rows(field_names, rows, f"{file_name}_{timestamp}", export_format)
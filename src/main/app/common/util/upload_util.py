@@ -0,0 +1,185 @@
+"""Streaming and resumable h5ad upload util"""
+
+import fcntl
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from src.main.app.common.config.config_manager import load_config
+
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+
+def is_hdf5_header(head: bytes) -> bool:
+    """
+    Check the HDF5 format signature, which sits at offset 0 or at 512, 1024, 2048... when the
+    file starts with a user block.
+    """
+    offset = 0
+    while offset + len(HDF5_SIGNATURE) <= len(head):
+        if head[offset: offset + len(HDF5_SIGNATURE)] == HDF5_SIGNATURE:
+            return True
+        offset = 512 if offset == 0 else offset * 2
+    return False
+
+
+async def stream_to_file(upload: UploadFile, path: str, sha256=None, mode: str = "wb") -> Tuple[int, bytes]:
+    """
+    Copy an upload to disk chunk by chunk, hashing it on the way.
+
+    Args:
+        upload: The incoming file.
+        path: Destination path.
+        sha256: A hashlib object updated with every chunk, or None.
+        mode: "wb" to create the file, "ab" to append to it.
+
+    Returns:
+        Tuple[int, bytes]: The number of bytes written and the first bytes of the upload.
+    """
+    with open(path, mode) as f:
+        return await copy_upload(upload, f, sha256)
+
+
+async def copy_upload(upload: UploadFile, f: BinaryIO, sha256=None) -> Tuple[int, bytes]:
+    """
+    Copy an upload to an open file chunk by chunk, see `stream_to_file`.
+    """
+    written = 0
+    head = b""
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(head) < 4096:
+            head += chunk[: 4096 - len(head)]
+        if sha256 is not None:
+            sha256.update(chunk)
+        await run_in_threadpool(f.write, chunk)
+        written += len(chunk)
+    return written, head
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ResumableUploadStore:
+    """
+    Keeps the state of resumable uploads under `<upload_dir>/<upload_id>.part` and `.json`.
+
+    Chunks must arrive in order: a chunk is accepted only at the current size of the partial
+    file, so a client that lost its connection asks for the status and resends from there.
+    Appends hold an exclusive flock on the partial file, which serializes them across server
+    workers.
+
+    Each worker keeps a running sha256 with the number of bytes it has hashed. A chunk appended
+    by another worker leaves that count behind the file size; such a hash is dropped and the
+    content hash is then recomputed from the partial file on completion.
+    """
+
+    def __init__(self, upload_dir: str):
+        self.upload_dir = upload_dir
+        self._hashes: Dict[str, Tuple["hashlib._Hash", int]] = {}
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, upload_id + ".part")
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_dir, upload_id + ".json")
+
+    def init(self, file_name: str, size: int) -> str:
+        os.makedirs(self.upload_dir, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        with open(self._meta_path(upload_id), "w", encoding="utf-8") as f:
+            json.dump({"file_name": file_name, "size": size}, f)
+        open(self._part_path(upload_id), "wb").close()
+        self._hashes[upload_id] = (hashlib.sha256(), 0)
+        return upload_id
+
+    def meta(self, upload_id: str) -> dict:
+        if not upload_id.isalnum() or not os.path.exists(self._meta_path(upload_id)):
+            raise ValueError(f"upload {upload_id} not exists")
+        with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def received(self, upload_id: str) -> int:
+        self.meta(upload_id)
+        return os.path.getsize(self._part_path(upload_id))
+
+    @contextmanager
+    def _locked(self, upload_id: str, mode: str = "ab") -> Iterator[BinaryIO]:
+        """
+        Open the partial file under an exclusive flock, failing at once when another request,
+        in this or another worker, holds it.
+        """
+        with open(self._part_path(upload_id), mode) as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ValueError(f"upload {upload_id} is receiving another chunk")
+            try:
+                yield f
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    async def append(self, upload_id: str, offset: int, chunk: UploadFile) -> int:
+        """
+        Append a chunk written at `offset`, returning the bytes received so far.
+        """
+        meta = self.meta(upload_id)
+        with self._locked(upload_id) as f:
+            received = os.fstat(f.fileno()).st_size
+            if offset != received:
+                raise ValueError(f"chunk offset {offset} does not match received size {received}")
+            # 只有已哈希的字节数等于文件大小时才继续使用内存中的哈希
+            sha256, hashed = self._hashes.pop(upload_id, (None, -1))
+            if hashed != received:
+                sha256 = None
+            written, _ = await copy_upload(chunk, f, sha256)
+            f.flush()
+            if received + written > meta["size"]:
+                os.ftruncate(f.fileno(), received)
+                raise ValueError(f"upload {upload_id} exceeds declared size {meta['size']}")
+            if sha256 is not None:
+                self._hashes[upload_id] = (sha256, received + written)
+            return received + written
+
+    def complete(self, upload_id: str) -> Tuple[str, str, int, str]:
+        """
+        Check a finished upload and hand its partial file over to the caller.
+
+        Returns:
+            Tuple[str, str, int, str]: The partial file path, the original file name, the size
+            and the sha256 of the content.
+        """
+        meta = self.meta(upload_id)
+        part_path = self._part_path(upload_id)
+        with self._locked(upload_id, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size != meta["size"]:
+                raise ValueError(f"upload {upload_id} incomplete: {size} of {meta['size']} bytes")
+            if not is_hdf5_header(f.read(4096)):
+                raise ValueError(f"{meta['file_name']} is not an HDF5 file")
+        sha256, hashed = self._hashes.pop(upload_id, (None, -1))
+        content_hash = sha256.hexdigest() if hashed == size else hash_file(part_path)
+        return part_path, meta["file_name"], size, content_hash
+
+    def discard(self, upload_id: str) -> None:
+        self._hashes.pop(upload_id, None)
+        for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+resumable_upload_store = ResumableUploadStore(os.path.join(load_config().server.customer_dir, ".uploads"))
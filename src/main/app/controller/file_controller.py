@@ -3,14 +3,15 @@
 from __future__ import annotations
 from typing import Dict, Annotated, List, Any, Union
 from fastapi import APIRouter, Query, UploadFile, Form, Request, File
-from starlette.responses import StreamingResponse
+from starlette.responses import Response
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.common.schema.response_schema import HttpResponse
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.mapper.file_mapper import fileMapper
 from src.main.app.model.file_model import FileDO
 from src.main.app.schema.common_schema import PageResult
 from src.main.app.schema.file_schema import FileQuery, FileModify, FileCreate, \
-    FileBatchModify, FileDetail
+    FileBatchModify, FileDetail, UploadInit, UploadSession
 from src.main.app.service.impl.file_service_impl import FileServiceImpl
 from src.main.app.service.file_service import FileService
 
@@ -35,14 +36,16 @@ async def fetch_file_detail(
     return HttpResponse.success(file_detail)
 
 @file_router.get("/export-template")
-async def export_template(request: Request) -> StreamingResponse:
+async def export_template(request: Request) -> Response:
     return await export_excel(schema=FileCreate, file_name="file_import_tpl")
 
 @file_router.get("/export")
 async def export_file_page(
-    request: Request, ids: list[int] = Query(...)
-) -> StreamingResponse:
-    return await file_service.export_file_page(ids=ids, request=request)
+    request: Request,
+    ids: list[int] = Query(...),
+    export_format: ExportFormat = Query(ExportFormat.xlsx, alias="format"),
+) -> Response:
+    return await file_service.export_file_page(ids=ids, request=request, export_format=export_format)
 
 @file_router.post("/create")
 async def create_file(
@@ -72,6 +75,28 @@ async def upload_file(
     service_response = await file_service.upload_file(file=file, request=request)
     return HttpResponse.success(data=service_response)
 
+@file_router.post("/upload/init")
+async def init_upload(upload_init: UploadInit) -> Dict[str, Any]:
+    upload_session: UploadSession = await file_service.init_upload(upload_init=upload_init)
+    return HttpResponse.success(data=upload_session)
+
+@file_router.put("/upload/chunk")
+async def upload_chunk(
+    upload_id: str = Form(...), offset: int = Form(..., ge=0), chunk: UploadFile = File(...)
+) -> Dict[str, Any]:
+    upload_session: UploadSession = await file_service.upload_chunk(upload_id=upload_id, offset=offset, chunk=chunk)
+    return HttpResponse.success(data=upload_session)
+
+@file_router.get("/upload/status")
+async def get_upload_status(upload_id: str) -> Dict[str, Any]:
+    upload_session: UploadSession = await file_service.get_upload_status(upload_id=upload_id)
+    return HttpResponse.success(data=upload_session)
+
+@file_router.post("/upload/complete")
+async def complete_upload(upload_id: str = Form(...)) -> Dict[str, Any]:
+    service_response = await file_service.complete_upload(upload_id=upload_id)
+    return HttpResponse.success(data=service_response)
+
 
 @file_router.get("/barcode")
 async def get_barcode(
@@ -80,6 +105,19 @@ async def get_barcode(
     service_response = await file_service.get_barcode(sample_id=sample_id)
     return HttpResponse.success(data=service_response)
 
+@file_router.get("/barcode/page")
+async def page_barcode(
+    file_id: Union[int, None] = None,
+    sample_id: Union[int, None] = None,
+    prefix: str = "",
+    current: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=10000, alias="pageSize"),
+) -> Dict[str, Any]:
+    barcode_page_result: PageResult = await file_service.page_barcode(
+        file_id=file_id, sample_id=sample_id, prefix=prefix, current=current, page_size=page_size
+    )
+    return HttpResponse.success(barcode_page_result)
+
 @file_router.delete("/remove/{id}")
 async def remove(
     id: int, request: Request
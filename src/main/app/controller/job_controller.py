@@ -2,13 +2,15 @@
 
 from __future__ import annotations
 from typing import Dict, Annotated, List, Any, Union
-from fastapi import APIRouter, Query, UploadFile, Form, Request, BackgroundTasks
-from starlette.responses import StreamingResponse
+from fastapi import APIRouter, Query, UploadFile, Form, Request
+from starlette.responses import Response
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.common.schema.response_schema import HttpResponse
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.mapper.job_mapper import jobMapper
 from src.main.app.model.job_model import JobDO
 from src.main.app.schema.common_schema import PageResult
+from src.main.app.schema.job_result_schema import JobHitQuery
 from src.main.app.schema.job_schema import JobQuery, JobModify, JobCreate, \
     JobBatchModify, JobDetail, JobSubmit
 from src.main.app.service.impl.job_service_impl import JobServiceImpl
@@ -35,20 +37,25 @@ async def fetch_job_detail(
     return HttpResponse.success(job_detail)
 
 @job_router.get("/export-template")
-async def export_template(request: Request) -> StreamingResponse:
+async def export_template(request: Request) -> Response:
     return await export_excel(schema=JobCreate, file_name="job_import_tpl")
 
 @job_router.get("/export")
 async def export_job_page(
-    request: Request, ids: list[int] = Query(...)
-) -> StreamingResponse:
-    return await job_service.export_job_page(ids=ids, request=request)
+    request: Request,
+    ids: list[int] = Query(...),
+    export_format: ExportFormat = Query(ExportFormat.xlsx, alias="format"),
+) -> Response:
+    return await job_service.export_job_page(ids=ids, request=request, export_format=export_format)
 
 @job_router.get("/export_result")
 async def export_job_page(
-    request: Request, job_id: int = Query(...), emb: bool = False
-) -> StreamingResponse:
-    return await job_service.export_result(job_id=job_id, request=request, emb=emb)
+    request: Request,
+    job_id: int = Query(...),
+    emb: bool = False,
+    export_format: ExportFormat = Query(ExportFormat.xlsx, alias="format"),
+) -> Response:
+    return await job_service.export_result(job_id=job_id, request=request, emb=emb, export_format=export_format)
 
 @job_router.post("/create")
 async def create_job(
@@ -59,16 +66,16 @@ async def create_job(
 
 @job_router.post("/submit")
 async def submit_job(
-    job_submit: JobSubmit, request: Request, background_tasks: BackgroundTasks
+    job_submit: JobSubmit, request: Request
 ) -> Dict[str, Any]:
-    job: JobDO = await job_service.submit_job(job_submit=job_submit, request=request, background_tasks=background_tasks)
+    job: JobDO = await job_service.submit_job(job_submit=job_submit, request=request)
     return HttpResponse.success(job.id)
 
 @job_router.get("/getResult")
 async def get_result(
-    job_id: int, request: Request, current: int = 1, page_size: int = 10
+    hit_query: Annotated[JobHitQuery, Query()], request: Request
 ) -> Dict[str, Any]:
-    service_resp = await job_service.get_result(job_id=job_id, request=request, current = current, page_size=page_size)
+    service_resp = await job_service.get_result(hit_query=hit_query, request=request)
     return HttpResponse.success(service_resp)
 
 @job_router.post("/batch-create")
@@ -3,7 +3,8 @@
 from __future__ import annotations
 from typing import Dict, Annotated, List, Any, Union
 from fastapi import APIRouter, Query, UploadFile, Form, Request
-from starlette.responses import StreamingResponse
+from starlette.responses import Response
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.common.schema.response_schema import HttpResponse
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.mapper.job_result_mapper import jobResultMapper
@@ -35,14 +36,16 @@ async def fetch_job_result_detail(
     return HttpResponse.success(job_result_detail)
 
 @job_result_router.get("/export-template")
-async def export_template(request: Request) -> StreamingResponse:
+async def export_template(request: Request) -> Response:
     return await export_excel(schema=JobResultCreate, file_name="job_result_import_tpl")
 
 @job_result_router.get("/export")
 async def export_job_result_page(
-    request: Request, ids: list[int] = Query(...)
-) -> StreamingResponse:
-    return await job_result_service.export_job_result_page(ids=ids, request=request)
+    request: Request,
+    ids: list[int] = Query(...),
+    export_format: ExportFormat = Query(ExportFormat.xlsx, alias="format"),
+) -> Response:
+    return await job_result_service.export_job_result_page(ids=ids, request=request, export_format=export_format)
 
 @job_result_router.post("/create")
 async def create_job_result(
@@ -1,10 +1,17 @@
 """Project health probe"""
 
+import http
 from typing import Dict
 
 from fastapi import APIRouter
+from starlette.responses import JSONResponse
 
 from src.main.app.common import result
+from src.main.app.common.cache.embedding_cache import embedding_cache
+from src.main.app.common.cache.result_cache import result_cache
+from src.main.app.common.cell_emb_search.model_registry import ModelRegistry
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.worker.job_dispatcher import jobDispatcher
 
 probe_router = APIRouter()
 
@@ -18,3 +25,35 @@ async def liveness() -> Dict:
         dict: A status object with a 'code' and a 'msg' indicating liveness.
     """
     return result.success()
+
+
+@probe_router.get("/readiness")
+async def readiness():
+    """
+    Check whether the job workers have their models loaded.
+
+    Returns:
+        dict: A status object whose data maps each worker pid to its model load states.
+              Responds with 503 while preloading is enabled and a preloaded model is not loaded yet.
+    """
+    model_status = jobDispatcher.model_status()
+    ready = not load_config().model.preload or (
+        len(model_status) > 0 and all(ModelRegistry.is_ready(states) for states in model_status.values())
+    )
+    if not ready:
+        return JSONResponse(
+            status_code=http.HTTPStatus.SERVICE_UNAVAILABLE,
+            content={"code": http.HTTPStatus.SERVICE_UNAVAILABLE, "msg": "Models are not loaded", "data": model_status},
+        )
+    return result.success(data=model_status)
+
+
+@probe_router.get("/cache")
+async def cache_stats() -> Dict:
+    """
+    Report the hit and miss counters of the caches of this server process.
+
+    Returns:
+        dict: A status object whose data maps each cache to its counters and sizes.
+    """
+    return result.success(data={"embedding": embedding_cache.stats(), "result": result_cache.stats()})
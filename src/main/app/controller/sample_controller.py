@@ -5,6 +5,7 @@ from __future__ import annotations
 from typing import Dict, Annotated, List, Any
 
 from fastapi import APIRouter, Query, UploadFile, Form, Request
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.common.schema.response_schema import HttpResponse
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.mapper.sample_mapper import sampleMapper
@@ -14,7 +15,7 @@ from src.main.app.schema.sample_schema import SampleQuery, SampleModify, SampleC
     SampleBatchModify, SampleDetail, SampleOptions
 from src.main.app.service.impl.sample_service_impl import SampleServiceImpl
 from src.main.app.service.sample_service import SampleService
-from starlette.responses import StreamingResponse
+from starlette.responses import Response
 
 sample_router = APIRouter()
 sample_service: SampleService = SampleServiceImpl(mapper=sampleMapper)
@@ -44,19 +45,21 @@ async def fetch_sample_detail(
     return HttpResponse.success(sample_detail)
 
 @sample_router.get("/export-template")
-async def export_template(request: Request) -> StreamingResponse:
+async def export_template(request: Request) -> Response:
     return await export_excel(schema=SampleCreate, file_name="sample_import_tpl")
 
 @sample_router.get("/export")
 async def export_sample_page(
-    request: Request, ids: list[int] = Query(...)
-) -> StreamingResponse:
-    return await sample_service.export_sample_page(ids=ids, request=request)
+    request: Request,
+    ids: list[int] = Query(...),
+    export_format: ExportFormat = Query(ExportFormat.xlsx, alias="format"),
+) -> Response:
+    return await sample_service.export_sample_page(ids=ids, request=request, export_format=export_format)
 
 @sample_router.get("/download")
 async def download_sample_page(
     request: Request, id: int = Query(...)
-) -> StreamingResponse:
+) -> Response:
     return await sample_service.download_sample_page(id=id, request=request)
 
 @sample_router.post("/create")
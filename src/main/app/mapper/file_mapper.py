@@ -1,11 +1,111 @@
 """File mapper"""
 
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import delete, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from src.main.app.mapper.mapper_base_impl import SqlModelMapper
 from src.main.app.model.file_model import FileDO
 
 
 class FileMapper(SqlModelMapper[FileDO]):
-    pass
+    async def select_by_content_hash(
+        self, *, content_hash: str, db_session: Optional[AsyncSession] = None
+    ) -> Optional[FileDO]:
+        """
+        Select the file holding the given content.
+
+        Args:
+            content_hash: The sha256 of the file content.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The file record, or None if the content was never uploaded.
+        """
+        db_session = db_session or self.db.session
+        statement = select(FileDO).where(FileDO.content_hash == content_hash)
+        exec_response = await db_session.exec(statement)
+        return exec_response.one_or_none()
+
+    async def add_reference(self, *, id: int, db_session: Optional[AsyncSession] = None) -> int:
+        """
+        Increase the reference count of a file by one.
+
+        Args:
+            id: The ID of the file.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The number of rows updated.
+        """
+        db_session = db_session or self.db.session
+        statement = update(FileDO).where(FileDO.id == id).values(ref_count=FileDO.ref_count + 1)
+        exec_response = await db_session.exec(statement)
+        return exec_response.rowcount
+
+    async def insert_or_reference(self, *, record: FileDO, db_session: Optional[AsyncSession] = None) -> FileDO:
+        """
+        Insert a file record, or reference the record that already holds the same content.
+
+        The insert runs in a savepoint, so when a concurrent upload of the same content wins the
+        unique content hash, only the savepoint is rolled back and the winner gets another reference.
+        When the winner is deleted again before it is referenced, the insert is retried.
+
+        Args:
+            record: The new file record, with its content hash set.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The inserted record or the existing one.
+        """
+        db_session = db_session or self.db.session
+        for attempt in range(3):
+            try:
+                async with db_session.begin_nested():
+                    db_session.add(record)
+            except IntegrityError:
+                existing = await self.select_by_content_hash(content_hash=record.content_hash, db_session=db_session)
+                if existing is not None and await self.add_reference(id=existing.id, db_session=db_session) == 1:
+                    return existing
+                # 冲突的记录已被并发删除, 重新插入
+                if attempt == 2:
+                    raise
+                continue
+            return record
+
+    async def release_reference(self, *, id: int, db_session: Optional[AsyncSession] = None) -> Optional[int]:
+        """
+        Drop one reference to a file, deleting the record with its last reference.
+
+        Each step is a conditional update or delete on the count that was read, retried when a
+        concurrent release changed it in between.
+
+        Args:
+            id: The ID of the file.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The number of references left, 0 when the record was deleted, or None if it does not exist.
+        """
+        db_session = db_session or self.db.session
+        while True:
+            exec_response = await db_session.exec(select(FileDO.ref_count).where(FileDO.id == id))
+            ref_count = exec_response.one_or_none()
+            if ref_count is None:
+                return None
+            if ref_count > 1:
+                statement = (
+                    update(FileDO)
+                    .where(FileDO.id == id, FileDO.ref_count == ref_count)
+                    .values(ref_count=ref_count - 1)
+                )
+            else:
+                statement = delete(FileDO).where(FileDO.id == id, FileDO.ref_count <= 1)
+            exec_response = await db_session.exec(statement)
+            if exec_response.rowcount == 1:
+                return max(ref_count - 1, 0)
 
 
-fileMapper = FileMapper(FileDO)
\ No newline at end of file
+fileMapper = FileMapper(FileDO)
@@ -0,0 +1,133 @@
+"""JobHit mapper"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, tuple_
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.main.app.mapper.mapper_base_impl import SqlModelMapper
+from src.main.app.model.job_hit_model import JobHitDO
+
+HIT_COLUMNS = ("job_id", "row_idx", "query_idx", "rank", "hit_id", "score", "tissue", "disease", "cell_type")
+SORT_COLUMNS = ("row", "score", "tissue", "disease", "cell_type")
+
+
+class JobHitMapper(SqlModelMapper[JobHitDO]):
+    async def bulk_insert(
+        self, *, columns: Dict[str, np.ndarray], batch_size: int = 50_000, db_session: Optional[AsyncSession] = None
+    ) -> int:
+        """
+        Insert the hits of a job, given column-wise.
+
+        On PostgreSQL each batch is sent with COPY over the session's asyncpg connection, inside the
+        session's transaction; other databases get a batched executemany.
+
+        Args:
+            columns: One array per name in HIT_COLUMNS, all of the same length.
+            batch_size: Rows sent per COPY or executemany.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The number of rows inserted.
+        """
+        db_session = db_session or self.db.session
+        connection = await db_session.connection()
+        is_postgresql = connection.dialect.name == "postgresql"
+        if is_postgresql:
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+        total = len(columns["row_idx"])
+        for start in range(0, total, batch_size):
+            batch = [columns[name][start: start + batch_size].tolist() for name in HIT_COLUMNS]
+            if is_postgresql:
+                await driver_connection.copy_records_to_table(
+                    JobHitDO.__tablename__, records=list(zip(*batch)), columns=list(HIT_COLUMNS)
+                )
+            else:
+                await db_session.execute(
+                    insert(JobHitDO.__table__), [dict(zip(HIT_COLUMNS, row)) for row in zip(*batch)]
+                )
+        return total
+
+    @staticmethod
+    def _where(statement, job_id: int, filters: Dict[str, Any]):
+        statement = statement.where(JobHitDO.job_id == job_id)
+        for name in ("tissue", "disease", "cell_type"):
+            if filters.get(name):
+                statement = statement.where(getattr(JobHitDO, name) == filters[name])
+        if filters.get("min_score") is not None:
+            statement = statement.where(JobHitDO.score >= filters["min_score"])
+        return statement
+
+    async def select_page(
+        self,
+        *,
+        job_id: int,
+        filters: Dict[str, Any],
+        sort_by: str = "row",
+        descending: bool = False,
+        cursor: Optional[Tuple[Any, int]] = None,
+        offset: int = 0,
+        limit: int = 10,
+        db_session: Optional[AsyncSession] = None,
+    ) -> List[Tuple[int, Any]]:
+        """
+        Select one page of hits with keyset pagination on (sort column, row_idx).
+
+        Every sort column is backed by a (job_id, column, row_idx) index, so a page with a cursor is an
+        index range scan of `limit` rows however deep the page is. Without a cursor the page starts at
+        `offset`.
+
+        Args:
+            job_id: The ID of the job.
+            filters: Equality filters on tissue, disease and cell_type, and min_score.
+            sort_by: One of SORT_COLUMNS, "row" keeps the order of the result file.
+            descending: Sort in descending order.
+            cursor: The (sort value, row_idx) of the last hit of the previous page.
+            offset: Rows to skip when no cursor is given.
+            limit: The page size.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The (row_idx, sort value) of the hits on the page.
+        """
+        db_session = db_session or self.db.session
+        if sort_by == "row":
+            keys = (JobHitDO.row_idx,)
+            cursor_key = cursor[1:] if cursor is not None else None
+        else:
+            keys = (getattr(JobHitDO, sort_by), JobHitDO.row_idx)
+            cursor_key = cursor
+        statement = self._where(select(*keys), job_id, filters)
+        if cursor_key is not None:
+            key = tuple_(*keys) if len(keys) > 1 else keys[0]
+            value = tuple_(*cursor_key) if len(keys) > 1 else cursor_key[0]
+            statement = statement.where(key < value if descending else key > value)
+        else:
+            statement = statement.offset(offset)
+        statement = statement.order_by(*(k.desc() if descending else k.asc() for k in keys)).limit(limit)
+        exec_response = await db_session.exec(statement)
+        rows = exec_response.all()
+        if sort_by == "row":
+            return [(row_idx, row_idx) for row_idx in rows]
+        return [(row_idx, value) for value, row_idx in rows]
+
+    async def count(self, *, job_id: int, filters: Dict[str, Any], db_session: Optional[AsyncSession] = None) -> int:
+        db_session = db_session or self.db.session
+        exec_response = await db_session.exec(self._where(select(func.count()).select_from(JobHitDO), job_id, filters))
+        return exec_response.one()
+
+    async def exists(self, *, job_id: int, db_session: Optional[AsyncSession] = None) -> bool:
+        db_session = db_session or self.db.session
+        exec_response = await db_session.exec(select(JobHitDO.row_idx).where(JobHitDO.job_id == job_id).limit(1))
+        return exec_response.first() is not None
+
+    async def delete_by_job_ids(self, *, job_ids: List[int], db_session: Optional[AsyncSession] = None) -> int:
+        db_session = db_session or self.db.session
+        exec_response = await db_session.exec(delete(JobHitDO).where(JobHitDO.job_id.in_(job_ids)))
+        return exec_response.rowcount
+
+
+jobHitMapper = JobHitMapper(JobHitDO)
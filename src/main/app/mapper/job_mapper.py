@@ -1,11 +1,140 @@
 """Job mapper"""
 
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlmodel import func, or_, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from src.main.app.mapper.mapper_base_impl import SqlModelMapper
 from src.main.app.model.job_model import JobDO
 
 
 class JobMapper(SqlModelMapper[JobDO]):
-    pass
+    async def claim_jobs(
+        self,
+        *,
+        from_status: int,
+        to_status: int,
+        limit: int,
+        db_session: Optional[AsyncSession] = None,
+    ) -> List[int]:
+        """
+        Atomically move up to `limit` jobs from one status to another, oldest first.
+
+        Each candidate is claimed with a conditional update, so concurrent dispatchers
+        never claim the same job twice. A claim starts the job's heartbeat and counts an attempt.
+
+        Args:
+            from_status: The status of the jobs waiting to be claimed.
+            to_status: The status written to the claimed jobs.
+            limit: The maximum number of jobs to claim.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The IDs of the claimed jobs.
+        """
+        db_session = db_session or self.db.session
+        statement = select(JobDO.id).where(JobDO.status == from_status).order_by(JobDO.id.asc()).limit(limit)
+        exec_response = await db_session.exec(statement)
+        claimed_ids: List[int] = []
+        for job_id in exec_response.all():
+            claim_statement = (
+                update(JobDO)
+                .where(JobDO.id == job_id, JobDO.status == from_status)
+                .values(
+                    status=to_status,
+                    heartbeat_at=datetime.now(),
+                    attempts=func.coalesce(JobDO.attempts, 0) + 1,
+                )
+            )
+            claim_response = await db_session.exec(claim_statement)
+            if claim_response.rowcount == 1:
+                claimed_ids.append(job_id)
+        return claimed_ids
+
+    async def update_status(
+        self,
+        *,
+        id: int,
+        status: int,
+        expected_status: Optional[int] = None,
+        db_session: Optional[AsyncSession] = None,
+    ) -> int:
+        """
+        Update the status of a job, optionally only when it is still in `expected_status`.
+
+        Args:
+            id: The ID of the job.
+            status: The new status.
+            expected_status: The status the job must currently have. If None, updates unconditionally.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The number of rows updated.
+        """
+        db_session = db_session or self.db.session
+        statement = update(JobDO).where(JobDO.id == id)
+        if expected_status is not None:
+            statement = statement.where(JobDO.status == expected_status)
+        exec_response = await db_session.exec(statement.values(status=status))
+        return exec_response.rowcount
+
+    async def touch_jobs(
+        self,
+        *,
+        ids: Sequence[int],
+        status: int,
+        db_session: Optional[AsyncSession] = None,
+    ) -> int:
+        """
+        Refresh the heartbeat of jobs still in `status`.
+
+        Returns:
+            The number of rows updated.
+        """
+        db_session = db_session or self.db.session
+        statement = (
+            update(JobDO).where(JobDO.id.in_(list(ids)), JobDO.status == status).values(heartbeat_at=datetime.now())
+        )
+        exec_response = await db_session.exec(statement)
+        return exec_response.rowcount
+
+    async def recover_stale_jobs(
+        self,
+        *,
+        status: int,
+        stale_before: datetime,
+        max_attempts: int,
+        retry_status: int,
+        failed_status: int,
+        db_session: Optional[AsyncSession] = None,
+    ) -> Tuple[int, int]:
+        """
+        Release jobs left in `status` by a dispatcher that stopped refreshing their heartbeat.
+
+        Jobs with attempts left go back to `retry_status`, the others to `failed_status`. Jobs
+        without a heartbeat, claimed before it existed, count as stale.
+
+        Args:
+            status: The status of running jobs.
+            stale_before: Jobs whose last heartbeat is older are stale.
+            max_attempts: The number of claims after which a stale job fails.
+            retry_status: The status of stale jobs that are run again.
+            failed_status: The status of stale jobs out of attempts.
+            db_session: The database session to use. If None, uses the default session.
+
+        Returns:
+            The numbers of retried and failed jobs.
+        """
+        db_session = db_session or self.db.session
+        stale = update(JobDO).where(
+            JobDO.status == status, or_(JobDO.heartbeat_at.is_(None), JobDO.heartbeat_at < stale_before)
+        )
+        attempts = func.coalesce(JobDO.attempts, 0)
+        retried = await db_session.exec(stale.where(attempts < max_attempts).values(status=retry_status))
+        failed = await db_session.exec(stale.where(attempts >= max_attempts).values(status=failed_status))
+        return retried.rowcount, failed.rowcount
 
 
-jobMapper = JobMapper(JobDO)
\ No newline at end of file
+jobMapper = JobMapper(JobDO)
@@ -1,66 +1,470 @@
 """Metadata mapper"""
 
-from typing import List, Optional, Tuple
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
+import pandas as pd
+from loguru import logger
+from pgvector import Vector
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.main.app.common.session.db_engine import VECTOR_CODEC_KEY
 from src.main.app.mapper.mapper_base_impl import SqlModelMapper
 from src.main.app.model.metadata_model import MetadataEntity
 
+EMBEDDING_DIM = 512
+# 向量索引名, 与 alembic 迁移中创建的索引一致
+VECTOR_INDEX_NAMES = {
+    "hnsw": "ix_metadata_cell_embedding_hnsw",
+    "ivfflat": "ix_metadata_cell_embedding_ivfflat",
+}
+# 量化向量索引的名称后缀、索引表达式与操作符类; 索引建在 cell_embedding 的类型转换上, 不单独存储量化向量
+QUANTIZED_INDEXES = {
+    "halfvec": ("half", f"(cell_embedding::halfvec({EMBEDDING_DIM}))", "halfvec_cosine_ops"),
+    "binary": ("bit", f"(binary_quantize(cell_embedding)::bit({EMBEDDING_DIM}))", "bit_hamming_ops"),
+}
+# 量化向量的候选距离, 与索引表达式一致才能使用索引
+QUANTIZED_DISTANCES = {
+    "halfvec": (
+        f"CAST(metadata.cell_embedding AS halfvec({EMBEDDING_DIM})) "
+        f"<=> CAST(q.embedding AS halfvec({EMBEDDING_DIM}))"
+    ),
+    "binary": (
+        f"CAST(binary_quantize(metadata.cell_embedding) AS bit({EMBEDDING_DIM})) "
+        f"<~> binary_quantize(q.embedding)"
+    ),
+}
+# pgvector 允许的 hnsw.ef_search 上限
+MAX_EF_SEARCH = 1000
+# 索引检索的默认 top_k 上限, 超出时精确扫描; 超过 MAX_EF_SEARCH 需要迭代扫描
+MAX_INDEX_TOP_K = 10_000
+# 迭代扫描访问的候选数至少为结果数的倍数, 不低于 pgvector 默认的 hnsw.max_scan_tuples
+SCAN_TUPLES_PER_RESULT = 4
+DEFAULT_MAX_SCAN_TUPLES = 20_000
+# 批量检索时单条语句返回的最大行数, 查询数 x top_k 超出时分多条语句执行
+MAX_BATCH_ROWS = 100_000
+# 检索结果返回的元数据列, 不含 cell_embedding 与时间字段
+RESULT_COLUMNS = (
+    "id", "barcode", "sample_id", "assay", "organism", "development_stage", "tissue", "disease", "sex", "cell_type"
+)
+# 可在 SQL 中过滤的元数据列, 均有 B-tree 索引
+FILTER_COLUMNS = ("tissue", "disease", "cell_type", "organism", "assay")
+# 支持 hnsw.iterative_scan / ivfflat.iterative_scan 的最低 pgvector 版本
+ITERATIVE_SCAN_VERSION = (0, 8)
+
 
 class MetadataMapper(SqlModelMapper[MetadataEntity]):
-    async def get_docs_by_vector(
+    # 数据库的 pgvector 是否支持迭代扫描, 首次过滤检索时查询一次
+    _iterative_scan_supported: Optional[bool] = None
+
+    @staticmethod
+    async def vector_param(db_session: AsyncSession, embedding: Union[np.ndarray, Sequence[float]]) -> Any:
+        """
+        The bind value of a query vector: a float32 array sent through the pgvector binary codec when
+        the connection has it, otherwise the vector's text form.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        connection = await db_session.connection()
+        if connection.info.get(VECTOR_CODEC_KEY):
+            return vector
+        return str(vector.tolist())
+
+    @staticmethod
+    async def set_search_params(
+            db_session: AsyncSession,
+            top_k: int,
+            ef_search: Optional[int] = None,
+            probes: Optional[int] = None,
+            iterative_scan: Optional[str] = None,
+            max_scan_tuples: Optional[int] = None,
+    ) -> bool:
+        """
+        Set the pgvector search parameters for the rest of the session's transaction, like SET LOCAL.
+
+        An HNSW scan returns at most ef_search rows, so ef_search is raised to top_k, up to
+        MAX_EF_SEARCH. Beyond that only an iterative scan returns top_k rows.
+
+        Args:
+            db_session: The database session.
+            top_k: The number of results requested by the query.
+            ef_search: The HNSW candidate list size. If None, only raised to top_k.
+            probes: The number of IVFFlat lists scanned. If None, the server setting is kept.
+            iterative_scan: hnsw.iterative_scan and ivfflat.iterative_scan (pgvector 0.8+), so a filtered
+                            scan goes on until it found top_k rows. If None, the server setting is kept.
+            max_scan_tuples: hnsw.max_scan_tuples, the candidates visited by an iterative scan. If None,
+                             the server setting is kept.
+
+        Returns:
+            False when top_k exceeds what an HNSW scan can return and the query has to be exact.
+        """
+        params = {"ef_search": str(min(max(ef_search or 0, top_k), MAX_EF_SEARCH))}
+        statement = "SELECT set_config('hnsw.ef_search', :ef_search, true)"
+        if probes is not None:
+            params["probes"] = str(probes)
+            statement += ", set_config('ivfflat.probes', :probes, true)"
+        if iterative_scan is not None:
+            params["iterative_scan"] = iterative_scan
+            statement += (
+                ", set_config('hnsw.iterative_scan', :iterative_scan, true)"
+                ", set_config('ivfflat.iterative_scan', :iterative_scan, true)"
+            )
+        if max_scan_tuples is not None:
+            params["max_scan_tuples"] = str(max_scan_tuples)
+            statement += ", set_config('hnsw.max_scan_tuples', :max_scan_tuples, true)"
+        await db_session.execute(text(statement), params)
+        return top_k <= MAX_EF_SEARCH or iterative_scan is not None
+
+    @staticmethod
+    def filter_conditions(
+            distance: str,
+            params: Dict[str, Any],
+            filters: Optional[Dict[str, Sequence[str]]] = None,
+            similarity_threshold: Optional[float] = None,
+    ) -> str:
+        """
+        The WHERE clause of a vector search for metadata filters and a minimum similarity, with its
+        values added to params.
+
+        Args:
+            distance: The SQL expression of the cosine distance to the query.
+            params: The statement parameters, updated in place.
+            filters: Allowed values per column of FILTER_COLUMNS; empty values do not filter.
+            similarity_threshold: The minimum similarity score, pushed down as a maximum distance.
+        """
+        conditions = ["metadata.cell_embedding IS NOT NULL"]
+        for column, values in (filters or {}).items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported metadata filter: {column}")
+            if values:
+                conditions.append(f"metadata.{column} = ANY(:filter_{column})")
+                params[f"filter_{column}"] = list(values)
+        if similarity_threshold is not None:
+            conditions.append(f"{distance} <= :max_distance")
+            params["max_distance"] = 1 - similarity_threshold
+        return "WHERE " + " AND ".join(conditions)
+
+    @classmethod
+    async def supports_iterative_scan(cls, db_session: AsyncSession) -> bool:
+        """
+        Whether the installed pgvector has iterative index scans. Older versions reserve the hnsw and
+        ivfflat setting prefixes, so setting an unknown parameter under them fails the transaction.
+        The extension version is read once per process.
+        """
+        if cls._iterative_scan_supported is None:
+            result = await db_session.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+            extversion = result.scalar() or ""
+            version = tuple(int(part) for part in re.findall(r"\d+", extversion)[:2])
+            cls._iterative_scan_supported = version >= ITERATIVE_SCAN_VERSION
+            if not cls._iterative_scan_supported:
+                logger.warning(f"pgvector {extversion} has no iterative index scan, oversampling filtered queries")
+        return cls._iterative_scan_supported
+
+    @classmethod
+    async def prepare_search(
+            cls,
+            db_session: AsyncSession,
+            top_k: int,
+            filtered: bool,
+            ef_search: Optional[int],
+            probes: Optional[int],
+            iterative_scan: Optional[str],
+            oversample: int,
+            max_index_top_k: int = MAX_INDEX_TOP_K,
+    ) -> bool:
+        """
+        Set the search parameters of a query, widening the index scan of a filtered query.
+
+        The index yields candidates by distance and the filters drop some of them afterwards, so a
+        selective filter could leave fewer than top_k rows. With an iterative scan the index keeps
+        yielding candidates until top_k rows passed; without it, or on pgvector before 0.8, the
+        candidate list is oversampled.
+
+        An HNSW scan stops after ef_search rows, at most MAX_EF_SEARCH, so a larger top_k is answered
+        by an iterative scan visiting up to SCAN_TUPLES_PER_RESULT candidates per result. Its recall
+        and latency degrade with top_k, so a top_k above max_index_top_k, or above MAX_EF_SEARCH
+        without iterative scan, is answered by an exact scan.
+
+        Returns:
+            False when the query has to be exact.
+        """
+        if top_k > max_index_top_k:
+            return False
+        if (
+            not (filtered or top_k > MAX_EF_SEARCH)
+            or iterative_scan in (None, "off")
+            or not await cls.supports_iterative_scan(db_session)
+        ):
+            iterative_scan = None
+        if filtered and iterative_scan is None and oversample > 1:
+            ef_search = max(ef_search or 0, top_k) * oversample
+            probes = probes * oversample if probes is not None else None
+        max_scan_tuples = None
+        if iterative_scan is not None and top_k > MAX_EF_SEARCH:
+            max_scan_tuples = max(DEFAULT_MAX_SCAN_TUPLES, top_k * SCAN_TUPLES_PER_RESULT)
+        return await cls.set_search_params(db_session, top_k, ef_search, probes, iterative_scan, max_scan_tuples)
+
+    async def get_docs_by_vectors(
             self,
-            embedding: List[float],
+            embeddings: np.ndarray,
             db_session: Optional[AsyncSession] = None,
             top_k: int = 5,
-            similarity_threshold: Optional[float] = None
-    ) -> List[Tuple[MetadataEntity, float]]:
+            similarity_threshold: Optional[float] = None,
+            ef_search: Optional[int] = None,
+            probes: Optional[int] = None,
+            exact: bool = False,
+            filters: Optional[Dict[str, Sequence[str]]] = None,
+            iterative_scan: Optional[str] = None,
+            oversample: int = 1,
+            with_embedding: bool = False,
+            quantization: Optional[str] = None,
+            rerank: int = 4,
+            max_index_top_k: int = MAX_INDEX_TOP_K,
+    ) -> pd.DataFrame:
         """
-        Search for documents based on vector similarity and return with similarity scores.
+        Search the top K documents of many query vectors at once.
+
+        The queries are bound as one vector[] parameter, unnested and joined LATERAL with the index scan
+        of each query, so a batch costs one round trip instead of one per query. Batches are sized to
+        return at most MAX_BATCH_ROWS rows per statement. Only RESULT_COLUMNS and the score are
+        fetched, the 512 floats of cell_embedding only with `with_embedding`.
+
+        With a quantization, the expression index on the half precision or binary quantized cast selects
+        top_k x rerank candidates, which are reranked by their full precision distance; scores and
+        the similarity threshold always use the float32 embeddings.
 
         Args:
-            embedding: The query vector.
+            embeddings: The N x D matrix of query vectors.
             db_session: The database session. If None, uses self.db.session.
-            top_k: Return the top K most similar results. Defaults to 5.
+            top_k: Return the top K most similar results per query. Defaults to 5.
             similarity_threshold: The minimum similarity score (0-1). Defaults to None.
+            ef_search: The HNSW candidate list size, higher is more accurate and slower.
+            probes: The number of IVFFlat lists scanned, higher is more accurate and slower.
+            exact: Scan the whole table instead of the index.
+            filters: Allowed values per column of FILTER_COLUMNS, applied in SQL.
+            iterative_scan: The pgvector iterative scan mode of filtered queries, relaxed_order or off.
+            oversample: Widening of the candidate list of filtered queries without iterative scan.
+            with_embedding: Also return cell_embedding.
+            quantization: None, halfvec or binary, the cast whose index selects the candidates.
+            rerank: Candidates per result of a quantized search.
+            max_index_top_k: The largest number of candidates answered by the index, more are exact.
 
         Returns:
-            List of tuples containing (MetadataEntity, similarity_score)
+            One row per hit with query_idx, the row of the query in embeddings, RESULT_COLUMNS and score,
+            ordered by query_idx then descending score.
         """
         db_session = db_session or self.db.session
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        columns = ["query_idx", *RESULT_COLUMNS, "score"] + (["cell_embedding"] if with_embedding else [])
 
-        # Calculate cosine similarity (1 - normalized L2 distance)
-        # Using raw SQL for better performance with pgvector
-        query = text("""
-            SELECT *, 
-                   1 - (cell_embedding <=> :embedding) AS similarity_score
-            FROM metadata
-            ORDER BY cell_embedding <=> :embedding
-            LIMIT :limit
+        distance = "metadata.cell_embedding <=> q.embedding"
+        filter_params: Dict[str, Any] = {}
+        where = self.filter_conditions(distance, filter_params, filters, similarity_threshold)
+        if quantization is not None and quantization not in QUANTIZED_DISTANCES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        candidates = top_k * max(rerank, 1) if quantization is not None else top_k
+        if len(embeddings) and not exact:
+            exact = not await self.prepare_search(
+                db_session, candidates, bool(filter_params), ef_search, probes, iterative_scan, oversample,
+                max_index_top_k
+            )
+        projection = ", ".join(f"metadata.{column}" for column in RESULT_COLUMNS)
+        if quantization is None or exact:
+            order_by = f"({distance}) + 0" if exact else distance
+            if with_embedding:
+                projection += ", metadata.cell_embedding"
+            lateral = f"""
+                SELECT {projection}, {distance} AS distance
+                FROM metadata
+                {where}
+                ORDER BY {order_by}
+                LIMIT :limit
+            """
+        else:
+            # 量化索引取候选, 再按 float32 距离重排
+            rerank_projection = ", ".join(f"c.{column}" for column in RESULT_COLUMNS)
+            if with_embedding:
+                rerank_projection += ", c.cell_embedding"
+            lateral = f"""
+                SELECT {rerank_projection}, c.cell_embedding <=> q.embedding AS distance
+                FROM (
+                    SELECT {projection}, metadata.cell_embedding
+                    FROM metadata
+                    {where}
+                    ORDER BY {QUANTIZED_DISTANCES[quantization]}
+                    LIMIT :candidates
+                ) AS c
+                ORDER BY distance
+                LIMIT :limit
+            """
+            filter_params["candidates"] = candidates
+        query = text(f"""
+            SELECT q.query_idx - 1 AS query_idx, {", ".join(f"m.{column}" for column in RESULT_COLUMNS)},
+                   1 - m.distance AS score{", m.cell_embedding" if with_embedding else ""}
+            FROM unnest(CAST(:embeddings AS vector[])) WITH ORDINALITY AS q(embedding, query_idx)
+            CROSS JOIN LATERAL ({lateral}) AS m
+            ORDER BY q.query_idx, m.distance
         """)
 
-        # Execute the query with parameters
-        result = await db_session.execute(
-            query,
-            {"embedding": str(embedding), "limit": top_k}
+        rows, batch_starts, batch_ends = [], [], []
+        batch_size = max(1, MAX_BATCH_ROWS // max(top_k, 1))
+        for start in range(0, len(embeddings), batch_size):
+            batch = embeddings[start: start + batch_size]
+            result = await db_session.execute(
+                query,
+                {"embeddings": await self.vectors_param(db_session, batch), "limit": top_k, **filter_params}
+            )
+            rows.extend(result.all())
+            # query_idx 是批内序号
+            batch_starts.append(start)
+            batch_ends.append(len(rows))
+        hits = pd.DataFrame.from_records(rows, columns=columns)
+        hits["query_idx"] = hits["query_idx"].astype(np.int64) + np.repeat(
+            batch_starts, np.diff([0, *batch_ends])
+        ).astype(np.int64)
+        hits["score"] = hits["score"].astype(np.float64)
+        return hits
+
+    async def select_embedding_page(
+            self,
+            after_id: Optional[int] = None,
+            limit: int = 50_000,
+            db_session: Optional[AsyncSession] = None,
+    ) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        One page of the rows with an embedding, in id order, for snapshots of the table.
+
+        Args:
+            after_id: The last id of the previous page, None for the first page.
+            limit: The page size.
+            db_session: The database session. If None, uses self.db.session.
+
+        Returns:
+            Tuple[pd.DataFrame, np.ndarray]: The RESULT_COLUMNS of the rows and their float32 embeddings.
+        """
+        db_session = db_session or self.db.session
+        columns = [getattr(MetadataEntity, column) for column in RESULT_COLUMNS]
+        statement = select(*columns, MetadataEntity.cell_embedding).where(MetadataEntity.cell_embedding.is_not(None))
+        if after_id is not None:
+            statement = statement.where(MetadataEntity.id > after_id)
+        exec_response = await db_session.exec(statement.order_by(MetadataEntity.id).limit(limit))
+        rows = exec_response.all()
+        frame = pd.DataFrame.from_records([row[:-1] for row in rows], columns=list(RESULT_COLUMNS))
+        embeddings = np.array([row[-1] for row in rows], dtype=np.float32)
+        return frame, embeddings
+
+    @staticmethod
+    async def vectors_param(db_session: AsyncSession, embeddings: np.ndarray) -> Any:
+        """
+        The bind value of a vector[] parameter, the binary counterpart of `vector_param` for many queries.
+        """
+        connection = await db_session.connection()
+        if connection.info.get(VECTOR_CODEC_KEY):
+            # 包装为 Vector, 否则 asyncpg 会把二维数组当作多维数组逐个元素编码
+            return [Vector(row) for row in embeddings]
+        return "{" + ",".join(f'"{row.tolist()}"' for row in embeddings) + "}"
+
+    @staticmethod
+    def vector_index_name(
+            index_type: str, partial: Optional[Tuple[str, str]] = None, quantization: Optional[str] = None
+    ) -> str:
+        """
+        The name of a vector index, with the quantized cast it indexes and the column and value of a
+        partial index.
+        """
+        if index_type not in VECTOR_INDEX_NAMES:
+            raise ValueError(f"Unsupported vector index type: {index_type}")
+        if quantization is not None and quantization not in QUANTIZED_INDEXES:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        name = VECTOR_INDEX_NAMES[index_type]
+        if quantization is not None:
+            name = f"ix_metadata_cell_embedding_{QUANTIZED_INDEXES[quantization][0]}_{index_type}"
+        if partial is None:
+            return name
+        column, value = partial
+        slug = re.sub(r"[^a-z0-9]+", "_", value.lower()).strip("_")[:24]
+        return f"{name}_{column}_{slug}"
+
+    @classmethod
+    def build_index_sql(
+            cls,
+            index_type: str,
+            m: int = 16,
+            ef_construction: int = 64,
+            lists: int = 1000,
+            concurrently: bool = True,
+            partial: Optional[Tuple[str, str]] = None,
+            quantization: Optional[str] = None,
+    ) -> str:
+        """
+        The CREATE INDEX statement of an HNSW or IVFFlat index on cell_embedding for cosine distance,
+        or on its half precision or binary quantized cast.
+
+        A partial index covers only the rows where a filter column equals a value; the planner uses it
+        for queries filtering on that value, which then scan a graph of matching rows only.
+        """
+        if index_type == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {int(lists)}"
+        expression, opclass = "cell_embedding", "vector_cosine_ops"
+        if quantization is not None:
+            _, expression, opclass = QUANTIZED_INDEXES[quantization]
+        statement = (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{cls.vector_index_name(index_type, partial, quantization)} "
+            f"ON metadata USING {index_type} ({expression} {opclass}) WITH ({options})"
         )
+        if partial is not None:
+            column, value = partial
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"Unsupported metadata filter: {column}")
+            statement += f" WHERE {column} = '{value.replace(chr(39), chr(39) * 2)}'"
+        return statement
 
-        # Fetch all results with similarity scores
-        results_with_scores = [
-            (MetadataEntity(**dict(row)), row.similarity_score)
-            for row in result.mappings()
-        ]
+    async def count_embeddings(self, db_session: Optional[AsyncSession] = None) -> int:
+        db_session = db_session or self.db.session
+        statement = select(func.count()).select_from(MetadataEntity).where(MetadataEntity.cell_embedding.is_not(None))
+        exec_response = await db_session.exec(statement)
+        return exec_response.one()
 
-        # Apply similarity threshold if provided
-        if similarity_threshold is not None:
-            results_with_scores = [
-                doc for doc, score in results_with_scores
-                if score >= similarity_threshold
-            ]
+    @staticmethod
+    async def list_vector_indexes(connection: AsyncConnection) -> List[Dict[str, str]]:
+        """
+        The indexes on metadata.cell_embedding and its quantized casts with their definition, size and
+        validity.
+        """
+        # 二值量化索引是表达式索引, indkey 中没有列号, 按索引定义匹配
+        result = await connection.execute(text("""
+            SELECT c.relname AS name,
+                   pg_get_indexdef(i.indexrelid) AS definition,
+                   pg_size_pretty(pg_relation_size(i.indexrelid)) AS size,
+                   pg_relation_size(i.indexrelid) AS bytes,
+                   i.indisvalid AS valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'metadata'::regclass AND pg_get_indexdef(i.indexrelid) LIKE '%cell_embedding%'
+            ORDER BY c.relname
+        """))
+        return [dict(row) for row in result.mappings()]
 
-        return results_with_scores
+    @staticmethod
+    async def embedding_sizes(connection: AsyncConnection, sample_percent: float = 1.0) -> Dict[str, float]:
+        """
+        The average bytes of cell_embedding and of its half precision and binary quantized casts, which
+        are what the quantized indexes store per row, over a sample of rows.
+        """
+        result = await connection.execute(text(f"""
+            SELECT avg(pg_column_size(cell_embedding)) AS float32,
+                   avg(pg_column_size(cell_embedding::halfvec({EMBEDDING_DIM}))) AS halfvec,
+                   avg(pg_column_size(binary_quantize(cell_embedding)::bit({EMBEDDING_DIM}))) AS binary
+            FROM metadata TABLESAMPLE SYSTEM ({float(sample_percent)})
+            WHERE cell_embedding IS NOT NULL
+        """))
+        return {name: float(value or 0) for name, value in result.mappings().one().items()}
 
 
-metadataMapper = MetadataMapper(MetadataEntity)
\ No newline at end of file
+metadataMapper = MetadataMapper(MetadataEntity)
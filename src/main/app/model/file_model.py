@@ -40,10 +40,29 @@ class FileBase(SQLModel):
     )
     size: Optional[int] = Field(
         sa_column=Column(
-            Integer,
+            BigInteger,
+            nullable=True,
+            default=None,
+            comment="大小(字节)"
+        )
+    )
+    content_hash: Optional[str] = Field(
+        sa_column=Column(
+            String(64),
             nullable=True,
             default=None,
-            comment="大小(MB)"
+            unique=True,
+            comment="内容哈希(sha256)"
+        )
+    )
+    ref_count: Optional[int] = Field(
+        default=1,
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            default=1,
+            server_default="1",
+            comment="引用次数"
         )
     )
     create_time: Optional[datetime] = Field(
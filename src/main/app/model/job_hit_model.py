@@ -0,0 +1,95 @@
+"""JobHit data object"""
+
+from typing import Optional
+from sqlmodel import (
+    SQLModel,
+    Field,
+    Column,
+    BigInteger,
+    String,
+    Integer,
+    Float,
+    Index,
+)
+
+
+class JobHitBase(SQLModel):
+
+    job_id: int = Field(
+        sa_column=Column(
+            BigInteger,
+            primary_key=True,
+            comment="任务Id"
+        )
+    )
+    row_idx: int = Field(
+        sa_column=Column(
+            BigInteger,
+            primary_key=True,
+            comment="结果文件中的行号"
+        )
+    )
+    query_idx: int = Field(
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            comment="查询细胞序号"
+        )
+    )
+    rank: int = Field(
+        sa_column=Column(
+            Integer,
+            nullable=False,
+            comment="排名"
+        )
+    )
+    hit_id: Optional[int] = Field(
+        sa_column=Column(
+            BigInteger,
+            nullable=True,
+            default=None,
+            comment="命中细胞Id(元数据主键或参考库索引)"
+        )
+    )
+    score: float = Field(
+        sa_column=Column(
+            Float,
+            nullable=False,
+            comment="相似度"
+        )
+    )
+    tissue: str = Field(
+        sa_column=Column(
+            String(255),
+            nullable=False,
+            default="",
+            comment="组织"
+        )
+    )
+    disease: str = Field(
+        sa_column=Column(
+            String(255),
+            nullable=False,
+            default="",
+            comment="疾病"
+        )
+    )
+    cell_type: str = Field(
+        sa_column=Column(
+            String(255),
+            nullable=False,
+            default="",
+            comment="细胞类型"
+        )
+    )
+
+
+class JobHitDO(JobHitBase, table=True):
+    __tablename__ = "job_hit"
+    __table_args__ = (
+        Index("ix_job_hit_score", "job_id", "score", "row_idx"),
+        Index("ix_job_hit_tissue", "job_id", "tissue", "row_idx"),
+        Index("ix_job_hit_disease", "job_id", "disease", "row_idx"),
+        Index("ix_job_hit_cell_type", "job_id", "cell_type", "row_idx"),
+        {"comment": "任务命中表"},
+    )
@@ -10,6 +10,7 @@ from sqlmodel import (
     String,
     Integer,
     DateTime,
+    Text,
 )
 from src.main.app.common.util.snowflake_util import snowflake_id
 
@@ -51,6 +52,7 @@ class JobBase(SQLModel):
             Integer,
             nullable=True,
             default=None,
+            index=True,
             comment="状态"
         )
     )
@@ -62,6 +64,30 @@ class JobBase(SQLModel):
             comment="描述"
         )
     )
+    params: Optional[str] = Field(
+        sa_column=Column(
+            Text,
+            nullable=True,
+            default=None,
+            comment="任务参数"
+        )
+    )
+    heartbeat_at: Optional[datetime] = Field(
+        sa_column=Column(
+            DateTime,
+            nullable=True,
+            default=None,
+            comment="执行心跳时间"
+        )
+    )
+    attempts: Optional[int] = Field(
+        sa_column=Column(
+            Integer,
+            nullable=True,
+            default=None,
+            comment="执行次数"
+        )
+    )
     creat_time: Optional[datetime] = Field(
         sa_column=Column(
             DateTime,
@@ -42,6 +42,7 @@ class MetadataBase(SQLModel):
             String(255),
             nullable=True,
             default=None,
+            index=True,
             comment="测序平台"
         )
     )
@@ -51,6 +52,7 @@ class MetadataBase(SQLModel):
             String(255),
             nullable=True,
             default=None,
+            index=True,
             comment="物种"
         )
     )
@@ -69,6 +71,7 @@ class MetadataBase(SQLModel):
             String(255),
             nullable=True,
             default=None,
+            index=True,
             comment="组织类型"
         )
     )
@@ -78,6 +81,7 @@ class MetadataBase(SQLModel):
             String(255),
             nullable=True,
             default=None,
+            index=True,
             comment="疾病状态"
         )
     )
@@ -96,6 +100,7 @@ class MetadataBase(SQLModel):
             String(255),
             nullable=True,
             default=None,
+            index=True,
             comment="细胞类型"
         )
     )
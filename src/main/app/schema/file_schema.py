@@ -83,11 +83,34 @@ class FileDetail(BaseModel):
     name: Optional[str] = None
     # 地址
     path: Optional[str] = None
-    # 大小(MB)
+    # 大小(字节)
     size: Optional[int] = None
+    # 内容哈希
+    content_hash: Optional[str] = None
+    # 引用次数
+    ref_count: Optional[int] = None
     # 创建时间
     create_time: Optional[datetime] = None
 
 class UploadResponse(BaseModel):
     file_id: int
-    barcode_list: List[str]
\ No newline at end of file
+    barcode_list: List[str]
+
+class UploadInit(BaseModel):
+    """
+    分片上传初始化
+    """
+    # 文件名
+    file_name: str
+    # 文件大小(字节)
+    size: int = Field(..., gt=0)
+
+class UploadSession(BaseModel):
+    """
+    分片上传状态
+    """
+    upload_id: str
+    # 已接收字节数
+    received: int
+    # 文件大小(字节)
+    size: int
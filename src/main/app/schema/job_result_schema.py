@@ -2,11 +2,12 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
 from pydantic import BaseModel, Field
 from src.main.app.schema.common_schema import PageBase
 
 class CellEmbResult(BaseModel):
+    query_id: Optional[str] = None
     index: Optional[int] = None
     study: Optional[str] = None
     sample: Optional[str] = None
@@ -14,8 +15,10 @@ class CellEmbResult(BaseModel):
     tissue: Optional[str] = None
     cell_line: Optional[bool] = None
     disease: Optional[str] = None
+    score: Optional[float] = None
 
 class GeneformerEmbResult(BaseModel):
+    query_id: Optional[str] = None
     sample_id: Optional[str] = None
     assay: Optional[str] = None
     organism: Optional[str] = None
@@ -24,6 +27,32 @@ class GeneformerEmbResult(BaseModel):
     disease: Optional[str] = None
     sex: Optional[str] = None
     cell_type: Optional[str] = None
+    score: Optional[float] = None
+
+class JobHitQuery(BaseModel):
+    """
+    任务结果查询参数
+    """
+    # 任务Id
+    job_id: int
+    # 页码, 未提供游标时使用
+    current: int = Field(1, ge=1)
+    # 每页条数
+    page_size: int = Field(10, ge=1, le=1000)
+    # 组织
+    tissue: Optional[str] = None
+    # 疾病
+    disease: Optional[str] = None
+    # 细胞类型
+    cell_type: Optional[str] = None
+    # 最低相似度
+    min_score: Optional[float] = None
+    # 排序字段
+    sort_by: Literal["row", "score", "tissue", "disease", "cell_type"] = "row"
+    # 排序方向
+    sort_order: Literal["asc", "desc"] = "asc"
+    # 上一页返回的游标
+    cursor: Optional[str] = None
 
 class JobResultPage(BaseModel):
     """
@@ -10,6 +10,7 @@ class JobStatus(Enum):
     WAITING = 1
     EXECUTING = 2
     COMPLETED = 3
+    FAILED = 4
 
 class JobPage(BaseModel):
     """
@@ -58,6 +59,21 @@ class JobCreate(BaseModel):
     # 错误信息
     err_msg: Optional[str] = Field(None, alias="errMsg")
 
+class MetadataFilter(BaseModel):
+    """
+    检索结果的元数据过滤条件, 每列为允许的取值
+    """
+    # 组织类型
+    tissue: Optional[List[str]] = None
+    # 疾病状态
+    disease: Optional[List[str]] = None
+    # 细胞类型
+    cell_type: Optional[List[str]] = None
+    # 物种
+    organism: Optional[List[str]] = None
+    # 测序平台
+    assay: Optional[List[str]] = None
+
 class JobSubmit(BaseModel):
     """
     任务新增
@@ -71,10 +87,20 @@ class JobSubmit(BaseModel):
     file_info: str
     # 物种信息
     species: int
-    # 细胞的索引
+    # 细胞的索引, 单个整数索引或以逗号/换行分隔的多个 barcode
     cell_index: Union[str, int] = None
+    # 以文件中的全部细胞作为查询
+    query_all: Optional[bool] = False
     # 每个细胞返回的结果数
     result_cell_count: Optional[int] = 1
+    # HNSW 检索的候选集大小, 越大召回率越高、越慢, 默认取配置 vector.ef_search
+    ef_search: Optional[int] = Field(None, ge=1, le=1000)
+    # IVFFlat 检索的聚类数, 默认取配置 vector.probes
+    probes: Optional[int] = Field(None, ge=1)
+    # 只返回满足元数据条件的细胞
+    metadata_filter: Optional[MetadataFilter] = None
+    # 最小相似度
+    min_score: Optional[float] = Field(None, ge=-1, le=1)
     # 父任务号
     parent_job_id: Optional[int] = None
     # 状态
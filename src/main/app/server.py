@@ -33,6 +33,7 @@ from src.main.app.common.session.db_session_middleware import SQLAlchemyMiddlewa
 from src.main.app.common.util.security_util import get_user_id
 from src.main.app.common.util.work_path_util import resource_dir
 from src.main.app.router.router import create_router
+from src.main.app.worker.job_dispatcher import jobDispatcher
 
 random.seed(2025)
 np.random.seed(2025)
@@ -61,6 +62,16 @@ logger.add(
     format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
 )
 
+@app.on_event("startup")
+async def start_job_dispatcher():
+    await jobDispatcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_dispatcher():
+    await jobDispatcher.stop()
+
+
 router = create_router()
 app.include_router(router, prefix=server_config.api_version)
 
@@ -5,9 +5,11 @@ from abc import ABC, abstractmethod
 from typing import Optional, List
 from fastapi import UploadFile, Request
 from starlette.responses import StreamingResponse
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.model.file_model import FileDO
 from src.main.app.schema.common_schema import PageResult
-from src.main.app.schema.file_schema import FileQuery, FileDetail, FileCreate, UploadResponse
+from src.main.app.schema.file_schema import FileQuery, FileDetail, FileCreate, UploadResponse, UploadInit, \
+    UploadSession
 from src.main.app.service.service_base import ServiceBase
 
 
@@ -20,7 +22,9 @@ class FileService(ServiceBase[FileDO], ABC):
     async def fetch_file_detail(self, *, id: int, request: Request) -> Optional[FileDetail]:...
 
     @abstractmethod
-    async def export_file_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:...
+    async def export_file_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:...
 
     @abstractmethod
     async def create_file(self, *, file_create: FileCreate, request: Request) -> FileDO:...
@@ -34,5 +38,22 @@ class FileService(ServiceBase[FileDO], ABC):
     @abstractmethod
     async def upload_file(self, file: UploadFile, request: Request) -> UploadResponse:...
 
+    @abstractmethod
+    async def init_upload(self, upload_init: UploadInit) -> UploadSession:...
+
+    @abstractmethod
+    async def upload_chunk(self, upload_id: str, offset: int, chunk: UploadFile) -> UploadSession:...
+
+    @abstractmethod
+    async def get_upload_status(self, upload_id: str) -> UploadSession:...
+
+    @abstractmethod
+    async def complete_upload(self, upload_id: str) -> UploadResponse:...
+
     @abstractmethod
     async def get_barcode(self, sample_id: int) -> List[str]:...
+
+    @abstractmethod
+    async def page_barcode(
+        self, *, file_id: Optional[int], sample_id: Optional[int], prefix: str, current: int, page_size: int
+    ) -> PageResult:...
@@ -1,9 +1,10 @@
-import torch
 import datetime
 import os
 import pickle
 import random
 import traceback
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 import loompy
 import numpy as np
@@ -11,6 +12,7 @@ import pandas as pd
 from anndata import AnnData
 from loguru import logger
 
+from src.main.app.common.cell_emb_search.model_registry import model_registry
 from src.main.app.common.config.config_manager import load_config
 from src.main.app.model.job_model import JobDO
 from ..geneformer import EmbExtractor
@@ -26,48 +28,63 @@ def generate_random_str():
     random_str = ''.join(random.choice('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz') for _ in range(8))
     return date_str + random_str
 
+@lru_cache
+def load_gene_info() -> Tuple[Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    Load gene name -> ensembl id, gene name -> gene type and ensembl id -> gene type mappings.
+    """
+    gene_info_path = str(load_config().server.model_dir) + os.sep + "geneformer" + os.sep + "gene_info_table.csv"
+    gene_info = pd.read_csv(gene_info_path)
+    gene_name_id_combine_dict = gene_info.set_index("gene_name")["ensembl_id"].to_dict()
+    gene_name_type_dict = gene_info.set_index("gene_name")["gene_type"].to_dict()
+    gene_id_type_dict = gene_info.set_index("ensembl_id")["gene_type"].to_dict()
+    return gene_name_id_combine_dict, gene_name_type_dict, gene_id_type_dict
+
+
+@lru_cache
+def get_tokenizer() -> TranscriptomeTokenizer:
+    return TranscriptomeTokenizer()
+
+
+def select_token_genes(adata: AnnData) -> Tuple[AnnData, List[str], List[str]]:
+    """
+    Keep the genes covered by the token dictionary and resolve their ensembl ids and gene types.
+    """
+    gene_name_id_combine_dict, gene_name_type_dict, gene_id_type_dict = load_gene_info()
+    gene_type_arr = []
+    ensembl_id_arr = []
+    pretrain_uncover_gene_arr = []
+    for var_info in adata.var_names:
+        if (
+                var_info in gene_name_type_dict
+                and gene_name_id_combine_dict[var_info] in gene_token_info
+        ):
+            gene_type_arr.append(gene_name_type_dict[var_info])
+            ensembl_id_arr.append(gene_name_id_combine_dict[var_info])
+        elif str(var_info).startswith("ENSG") and var_info in gene_token_info:
+            gene_type_arr.append(gene_id_type_dict[var_info])
+            ensembl_id_arr.append(var_info)
+        else:
+            pretrain_uncover_gene_arr.append(var_info)
+    if len(pretrain_uncover_gene_arr) != 0:
+        logger.warning(f"Gene not in token file will be remove")
+        adata = adata[:, adata.var_names.drop(pretrain_uncover_gene_arr)]
+    if adata.n_obs == 0 or adata.n_vars == 0:
+        raise Exception("Anndata.var_names should be gene name")
+    return adata, ensembl_id_arr, gene_type_arr
+
+
 def preprocess(adata: AnnData, job: JobDO) -> str:
     """
     Preprocess for h5ad
     """
     try:
-        gene_info_path = str(load_config().server.model_dir) + os.sep + "geneformer" + os.sep + "gene_info_table.csv"
-        gene_info = pd.read_csv(gene_info_path)
-        gene_name_id_combine_dict = gene_info.set_index("gene_name")["ensembl_id"].to_dict()
-        gene_name_type_dict = gene_info.set_index("gene_name")["gene_type"].to_dict()
-        gene_id_type_dict = gene_info.set_index("ensembl_id")["gene_type"].to_dict()
-        func_gene_list = [
-            i
-            for i in gene_info[
-                (gene_info["gene_type"] == "protein_coding")
-                | (gene_info["gene_type"] == "miRNA")
-                ]["ensembl_id"]
-        ]
         job_id = str(job.id)
         task_dir = str(load_config().server.output_dir) + os.sep + job_id
         if not os.path.exists(task_dir):
             os.makedirs(task_dir)
         file_name = job_id
-        gene_type_arr = []
-        ensembl_id_arr = []
-        pretrain_uncover_gene_arr = []
-        for var_info in adata.var_names:
-            if (
-                    var_info in gene_name_type_dict
-                    and gene_name_id_combine_dict[var_info] in gene_token_info
-            ):
-                gene_type_arr.append(gene_name_type_dict[var_info])
-                ensembl_id_arr.append(gene_name_id_combine_dict[var_info])
-            elif str(var_info).startswith("ENSG") and var_info in gene_token_info:
-                gene_type_arr.append(gene_id_type_dict[var_info])
-                ensembl_id_arr.append(var_info)
-            else:
-                pretrain_uncover_gene_arr.append(var_info)
-        if len(pretrain_uncover_gene_arr) != 0:
-            logger.warning(f"Gene not in token file will be remove")
-            adata = adata[:, adata.var_names.drop(pretrain_uncover_gene_arr)]
-        if adata.n_obs == 0:
-            raise Exception("Anndata.var_names should be gene name")
+        adata, ensembl_id_arr, gene_type_arr = select_token_genes(adata)
         total_genes_per_row = adata.X.sum(axis=1)
         filename = f"{task_dir}/{file_name}.loom"
         loompy.create(
@@ -86,7 +103,10 @@ def preprocess(adata: AnnData, job: JobDO) -> str:
         logger.error(f"{traceback.print_exc()}")
         raise e
 
-def get_and_save_cell_embedding(input_data_path: str, pretrain_model_path: str, output_directory: str, suffix: str):
+def get_and_save_cell_embedding(
+    input_data_path: str, pretrain_model_path: str, output_directory: str, suffix: str, model=None
+):
+    model_config = load_config().model
     emb_extractor = EmbExtractor(model_type="Pretrained",
                          num_classes=0,
                          filter_data=None,
@@ -94,29 +114,59 @@ def get_and_save_cell_embedding(input_data_path: str, pretrain_model_path: str,
                          emb_layer=-1,
                          emb_label=None,
                          labels_to_plot=None,
-                         forward_batch_size=1,
+                         forward_batch_size=model_config.geneformer_batch_cells,
+                         forward_batch_tokens=model_config.geneformer_batch_tokens,
                          nproc=1)
 
     embs = emb_extractor.extract_embs(pretrain_model_path,
                               input_data_path,
                               output_directory,
-                              suffix)
+                              suffix,
+                              model=model)
     logger.info(f"cell embedding generate in {os.path.join(output_directory, suffix)}")
     logger.info(embs)
     return embs
 
-def process_embeddings(raw_cell_emb):
-    linear_layer = torch.nn.Linear(len(raw_cell_emb[0]), 128)
-    emb_data = torch.tensor(raw_cell_emb[0])
-    result =  linear_layer(emb_data)
-    logger.info(f"细胞的维度: {result.shape}")
-    # 将结果转换为 NumPy 数组
-    if result.is_cuda:
-        result = result.cpu()
-    result_np = result.detach().numpy()
+def process_embeddings(raw_cell_emb) -> np.ndarray:
+    """
+    Project the Geneformer embeddings of all query cells with the persisted projection head.
+    """
+    result_np = model_registry.get_projection().project(raw_cell_emb)
+    logger.info(f"细胞的维度: {result_np.shape}")
     return result_np
 
-def generate_cell_embedding(adata: AnnData, job: JobDO):
+def embed_in_memory(adata: AnnData, model) -> pd.DataFrame:
+    """
+    Tokenize and embed cells straight from the AnnData matrix, without intermediate files.
+
+    Returns:
+        pd.DataFrame: One embedding row per cell, indexed by barcode.
+    """
+    adata, ensembl_id_arr, _ = select_token_genes(adata)
+    tk = get_tokenizer()
+    logger.info("Tokenize data start")
+    tokenized_cells = tk.tokenize_matrix(adata.X, ensembl_id_arr)
+    logger.info("Tokenize data end")
+    empty_cells = [barcode for barcode, input_ids in zip(adata.obs_names, tokenized_cells) if len(input_ids) == 0]
+    if len(empty_cells) != 0:
+        raise Exception(f"No expressed gene in token file for cells: {empty_cells[:10]}")
+    model_config = load_config().model
+    emb_extractor = EmbExtractor(model_type="Pretrained",
+                         num_classes=0,
+                         filter_data=None,
+                         max_ncells=None,
+                         emb_layer=-1,
+                         emb_label=None,
+                         labels_to_plot=None,
+                         forward_batch_size=model_config.geneformer_batch_cells,
+                         forward_batch_tokens=model_config.geneformer_batch_tokens,
+                         nproc=1)
+    embs = emb_extractor.extract_embs_from_tokens(tokenized_cells, model)
+    embs.index = adata.obs_names
+    return embs
+
+
+def generate_cell_embedding_on_disk(adata: AnnData, job: JobDO, model=None):
     task_dir = preprocess(adata=adata, job=job)
     tk = TranscriptomeTokenizer(custom_attr_name_dict={"barcode": "barcode"})
     output_prefix="rank_value_encoding"
@@ -129,7 +179,14 @@ def generate_cell_embedding(adata: AnnData, job: JobDO):
     output_dir = server_config.output_dir
     suffix = str(job.id)
     model_dir = server_config.model_dir + os.sep + "geneformer"
-    raw_cell_emb =  get_and_save_cell_embedding(rank_value_encoding_path, model_dir, output_dir, suffix)
+    raw_cell_emb =  get_and_save_cell_embedding(rank_value_encoding_path, model_dir, output_dir, suffix, model=model)
     return raw_cell_emb
 
 
+def generate_cell_embedding(adata: AnnData, job: Optional[JobDO] = None, model=None):
+    # 调试模式: 保留 loom、dataset 和 csv 中间文件, 离线索引等没有 job 的调用仍在内存中完成
+    if load_config().model.geneformer_on_disk and job is not None:
+        return generate_cell_embedding_on_disk(adata, job, model=model)
+    if model is None:
+        model = model_registry.get_geneformer()
+    return embed_in_memory(adata, model)
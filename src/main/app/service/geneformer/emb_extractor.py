@@ -12,17 +12,20 @@ Geneformer embedding extractor.
 # imports
 import logging
 import pickle
+import queue
+import threading
 from collections import Counter
 from pathlib import Path
 
 import anndata
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import scanpy as sc
 import seaborn as sns
 import torch
 from tdigest import TDigest
-from tqdm.auto import trange
+from tqdm.auto import tqdm, trange
 
 from . import perturber_utils as pu
 from .tokenizer import TOKEN_DICTIONARY_FILE
@@ -31,6 +34,130 @@ logger = logging.getLogger(__name__)
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# group cells of similar length so that padded batches stay within a token budget
+def length_bucketed_batches(lengths, max_tokens, max_batch_size=None):
+    """
+    Split cell indices into batches of similar length, longest first.
+
+    A batch is closed as soon as adding the next cell would make its padded size
+    (number of cells x longest cell) exceed max_tokens, so short cells are packed
+    many to a batch while long cells get small batches.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    order = np.argsort(-lengths, kind="stable")
+    batches = []
+    batch_start = 0
+    for pos in range(1, len(order) + 1):
+        if pos == len(order):
+            batches.append(order[batch_start:pos])
+            break
+        n_cells = pos - batch_start + 1
+        too_many_tokens = n_cells * max(lengths[order[batch_start]], 1) > max_tokens
+        too_many_cells = max_batch_size is not None and n_cells > max_batch_size
+        if too_many_tokens or too_many_cells:
+            batches.append(order[batch_start:pos])
+            batch_start = pos
+    return batches
+
+
+def collate_batch(input_ids, lengths, batch_indices, pad_token_id, model_input_size):
+    """
+    Pad the rank value encodings of one batch into input_ids and attention_mask tensors.
+    """
+    batch_lengths = [min(int(lengths[i]), model_input_size) for i in batch_indices]
+    max_len = max(batch_lengths)
+    input_data_minibatch = torch.full(
+        (len(batch_indices), max_len), pad_token_id, dtype=torch.long
+    )
+    for j, i in enumerate(batch_indices):
+        input_data_minibatch[j, : batch_lengths[j]] = torch.as_tensor(
+            input_ids[i][: batch_lengths[j]], dtype=torch.long
+        )
+    original_lens = torch.tensor(batch_lengths)
+    attention_mask = (torch.arange(max_len) < original_lens.unsqueeze(1)).long()
+    return {
+        "indices": batch_indices,
+        "input_ids": input_data_minibatch,
+        "attention_mask": attention_mask,
+        "length": original_lens,
+        "max_len": max_len,
+    }
+
+
+def prefetch(items, depth=2):
+    """
+    Iterate over items produced by a background thread, keeping up to depth items ready.
+
+    Collation runs in the thread while the model runs the previous batch; exceptions
+    raised while producing are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        buffer.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put((done, None))
+        except BaseException as e:
+            buffer.put((done, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_batches(
+    input_ids,
+    lengths,
+    pad_token_id,
+    model_input_size,
+    forward_batch_size,
+    forward_batch_tokens=None,
+):
+    """
+    Schedule length-bucketed batches and collate them in a background thread.
+
+    With forward_batch_tokens, batches hold up to that many padded tokens and at most
+    forward_batch_size cells. Without it, the token budget is forward_batch_size full
+    length cells, i.e. the largest padded batch the fixed-size batching could produce.
+    """
+    if forward_batch_tokens is None:
+        max_tokens, max_batch_size = forward_batch_size * model_input_size, None
+    else:
+        max_tokens, max_batch_size = forward_batch_tokens, forward_batch_size
+    batches = length_bucketed_batches(
+        np.minimum(lengths, model_input_size), max_tokens, max_batch_size
+    )
+    collated = (
+        collate_batch(input_ids, lengths, batch_indices, pad_token_id, model_input_size)
+        for batch_indices in batches
+    )
+    return batches, prefetch(collated)
+
+
+def release_cuda_cache():
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+
+
 # extract embeddings
 def get_embs(
     model,
@@ -41,9 +168,9 @@ def get_embs(
     forward_batch_size,
     summary_stat=None,
     silent=False,
+    forward_batch_tokens=None,
 ):
     model_input_size = pu.get_model_input_size(model)
-    total_batch_length = len(filtered_input_data)
 
     if summary_stat is None:
         embs_list = []
@@ -68,26 +195,27 @@ def get_embs(
                 k: [TDigest() for _ in range(emb_dims)] for k in gene_set
             }
 
-    overall_max_len = 0
-
-    for i in trange(0, total_batch_length, forward_batch_size, leave=(not silent)):
-        max_range = min(i + forward_batch_size, total_batch_length)
-
-        minibatch = filtered_input_data.select([i for i in range(i, max_range)])
+    input_ids = filtered_input_data["input_ids"]
+    lengths = np.asarray(filtered_input_data["length"])
+    batches, batch_iter = iter_batches(
+        input_ids,
+        lengths,
+        pad_token_id,
+        model_input_size,
+        forward_batch_size,
+        forward_batch_tokens,
+    )
 
-        max_len = int(max(minibatch["length"]))
-        original_lens = torch.tensor(minibatch["length"], device=device)
-        minibatch.set_format(type="torch")
+    overall_max_len = 0
 
-        input_data_minibatch = minibatch["input_ids"]
-        input_data_minibatch = pu.pad_tensor_list(
-            input_data_minibatch, max_len, pad_token_id, model_input_size
-        )
+    for minibatch in tqdm(batch_iter, total=len(batches), leave=(not silent)):
+        max_len = minibatch["max_len"]
+        original_lens = minibatch["length"].to(device)
 
         with torch.no_grad():
             outputs = model(
-                input_ids=input_data_minibatch.to(device),
-                attention_mask=pu.gen_attention_mask(minibatch),
+                input_ids=minibatch["input_ids"].to(device),
+                attention_mask=minibatch["attention_mask"].to(device),
             )
 
         embs_i = outputs.hidden_states[layer_to_quant]
@@ -104,9 +232,10 @@ def get_embs(
             if summary_stat is None:
                 embs_list.append(embs_i)
             elif summary_stat is not None:
-                for h in trange(len(minibatch)):
-                    length_h = minibatch[h]["length"]
-                    input_ids_h = minibatch[h]["input_ids"][0:length_h]
+                for h in trange(len(minibatch["indices"])):
+                    cell_index = minibatch["indices"][h]
+                    length_h = int(minibatch["length"][h])
+                    input_ids_h = input_ids[cell_index][0:length_h]
 
                     # double check dimensions before unsqueezing
                     embs_i_dim = embs_i.dim()
@@ -126,14 +255,15 @@ def get_embs(
         overall_max_len = max(overall_max_len, max_len)
         del outputs
         del minibatch
-        del input_data_minibatch
         del embs_i
 
-        torch.cuda.empty_cache()
+        release_cuda_cache()
 
     if summary_stat is None:
+        # batches were scheduled by length, put the embeddings back in input order
+        restore_order = torch.as_tensor(np.argsort(np.concatenate(batches)))
         if emb_mode == "cell":
-            embs_stack = torch.cat(embs_list, dim=0)
+            embs_stack = torch.cat(embs_list, dim=0)[restore_order.to(device)]
         elif emb_mode == "gene":
             embs_stack = pu.pad_tensor_list(
                 embs_list,
@@ -142,7 +272,7 @@ def get_embs(
                 model_input_size,
                 1,
                 pu.pad_3d_tensor,
-            )
+            )[restore_order.to(device)]
 
     # calculate summary stat embs from approximated tdigests
     elif summary_stat is not None:
@@ -168,6 +298,45 @@ def get_embs(
     return embs_stack
 
 
+# extract cell embeddings from in-memory rank value encodings, keeping input order
+def get_cell_embs_from_tokens(
+    model,
+    tokenized_cells,
+    layer_to_quant,
+    pad_token_id,
+    forward_batch_size,
+    silent=False,
+    forward_batch_tokens=None,
+):
+    model_input_size = pu.get_model_input_size(model)
+    lengths = np.array([len(input_ids) for input_ids in tokenized_cells], dtype=np.int64)
+    batches, batch_iter = iter_batches(
+        tokenized_cells,
+        lengths,
+        pad_token_id,
+        model_input_size,
+        forward_batch_size,
+        forward_batch_tokens,
+    )
+
+    embs_list = []
+    for minibatch in tqdm(batch_iter, total=len(batches), leave=(not silent)):
+        with torch.no_grad():
+            outputs = model(
+                input_ids=minibatch["input_ids"].to(device),
+                attention_mask=minibatch["attention_mask"].to(device),
+            )
+
+        embs_i = outputs.hidden_states[layer_to_quant]
+        embs_list.append(pu.mean_nonpadding_embs(embs_i, minibatch["length"].to(device)))
+        del outputs
+        del embs_i
+        release_cuda_cache()
+
+    restore_order = torch.as_tensor(np.argsort(np.concatenate(batches)))
+    return torch.cat(embs_list, dim=0)[restore_order.to(device)]
+
+
 def accumulate_tdigests(embs_tdigests, mean_embs, emb_dims):
     # note: tdigest batch update known to be slow so updating serially
     [
@@ -364,6 +533,7 @@ class EmbExtractor:
         "emb_label": {None, list},
         "labels_to_plot": {None, list},
         "forward_batch_size": {int},
+        "forward_batch_tokens": {None, int},
         "nproc": {int},
         "summary_stat": {None, "mean", "median", "exact_mean", "exact_median"},
     }
@@ -381,6 +551,7 @@ class EmbExtractor:
         emb_label=None,
         labels_to_plot=None,
         forward_batch_size=100,
+        forward_batch_tokens=None,
         nproc=4,
         summary_stat=None,
         token_dictionary_file=TOKEN_DICTIONARY_FILE,
@@ -425,6 +596,11 @@ class EmbExtractor:
             | Plotting umap requires labels to plot.
         forward_batch_size : int
             | Batch size for forward pass.
+            | With forward_batch_tokens, the maximum number of cells per batch instead.
+        forward_batch_tokens : None, int
+            | Budget of padded tokens per forward pass batch.
+            | Cells are grouped by length, so batches of short cells hold more cells.
+            | If None, the budget is forward_batch_size cells at the model input size.
         nproc : int
             | Number of CPU processes to use.
         summary_stat : {None, "mean", "median", "exact_mean", "exact_median"}
@@ -450,6 +626,7 @@ class EmbExtractor:
         self.emb_label = emb_label
         self.labels_to_plot = labels_to_plot
         self.forward_batch_size = forward_batch_size
+        self.forward_batch_tokens = forward_batch_tokens
         self.nproc = nproc
         if (summary_stat is not None) and ("exact" in summary_stat):
             self.summary_stat = None
@@ -506,6 +683,7 @@ class EmbExtractor:
         output_prefix,
         output_torch_embs=False,
         cell_state=None,
+        model=None,
     ):
         """
         Extract embeddings from input data and save as results in output_directory.
@@ -525,6 +703,8 @@ class EmbExtractor:
             | Note, if true, will output embeddings as both dataframe and tensor.
         cell_state : dict
             | Cell state key and value for state embedding extraction.
+        model : None, transformers.PreTrainedModel
+            | Already loaded model in eval mode to use instead of loading from model_directory.
 
         **Examples:**
 
@@ -545,9 +725,10 @@ class EmbExtractor:
                 filtered_input_data, cell_state, self.nproc
             )
         downsampled_data = pu.downsample_and_sort(filtered_input_data, self.max_ncells)
-        model = pu.load_model(
-            self.model_type, self.num_classes, model_directory, mode="eval"
-        )
+        if model is None:
+            model = pu.load_model(
+                self.model_type, self.num_classes, model_directory, mode="eval"
+            )
         layer_to_quant = pu.quant_layers(model) + self.emb_layer
         embs = get_embs(
             model,
@@ -557,6 +738,7 @@ class EmbExtractor:
             self.pad_token_id,
             self.forward_batch_size,
             self.summary_stat,
+            forward_batch_tokens=self.forward_batch_tokens,
         )
 
         if self.emb_mode == "cell":
@@ -596,6 +778,36 @@ class EmbExtractor:
             else:
                 return embs_df
 
+    def extract_embs_from_tokens(self, tokenized_cells, model):
+        """
+        Extract cell embeddings from in-memory rank value encodings without reading or writing files.
+
+        **Parameters:**
+
+        tokenized_cells : list of numpy.ndarray
+            | Truncated rank value encoding of each cell, e.g. from TranscriptomeTokenizer.tokenize_matrix.
+        model : transformers.PreTrainedModel
+            | Loaded model in eval mode.
+
+        **Returns:**
+
+        pandas.DataFrame
+            | One row of cell embedding per input cell, in input order.
+        """
+        if self.emb_mode != "cell":
+            logger.error("In-memory extraction only supports emb_mode 'cell'.")
+            raise
+        layer_to_quant = pu.quant_layers(model) + self.emb_layer
+        embs = get_cell_embs_from_tokens(
+            model,
+            tokenized_cells,
+            layer_to_quant,
+            self.pad_token_id,
+            self.forward_batch_size,
+            forward_batch_tokens=self.forward_batch_tokens,
+        )
+        return label_cell_embs(embs, None, None)
+
     def get_state_embs(
         self,
         cell_states_to_model,
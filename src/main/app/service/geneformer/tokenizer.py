@@ -76,6 +76,84 @@ def tokenize_cell(gene_vector, gene_tokens):
     return rank_genes(gene_vector[nonzero_mask], gene_tokens[nonzero_mask])
 
 
+def tokenize_csr(X_norm, gene_tokens, max_len=None, block_size=512):
+    """
+    Convert a normalized cells x genes CSR matrix to rank value encodings for all cells at once.
+
+    Rows are handled in blocks: the non-zeros of a block are scattered into a padded
+    (cells x longest cell) array and ranked with one row-wise sort, so there is no
+    per-cell Python loop and each sort stays small enough to be cache friendly.
+
+    **Parameters:**
+
+    X_norm : scipy.sparse.csr_matrix
+        | Median-scaled expression, cells as rows.
+    gene_tokens : numpy.ndarray
+        | Token of each column of X_norm.
+    max_len : None, int
+        | Keep at most this many top ranked genes per cell.
+    block_size : int
+        | Number of cells ranked per row-wise sort.
+
+    **Returns:**
+
+    tokens : numpy.ndarray
+        | Flat buffer with the rank value encodings of all cells back to back.
+    offsets : numpy.ndarray
+        | Cell i spans tokens[offsets[i]:offsets[i + 1]].
+    """
+    X_norm = sp.csr_matrix(X_norm)
+    X_norm.eliminate_zeros()
+    gene_tokens = np.asarray(gene_tokens)
+    indptr = X_norm.indptr.astype(np.int64)
+    row_lengths = np.diff(indptr)
+    out_lengths = row_lengths if max_len is None else np.minimum(row_lengths, max_len)
+    offsets = np.concatenate(([0], np.cumsum(out_lengths))).astype(np.int64)
+    tokens = np.empty(offsets[-1], dtype=gene_tokens.dtype)
+
+    for start in range(0, X_norm.shape[0], block_size):
+        stop = min(start + block_size, X_norm.shape[0])
+        lengths = row_lengths[start:stop]
+        width = int(lengths.max()) if lengths.size > 0 else 0
+        if width == 0:
+            continue
+        lo, hi = indptr[start], indptr[stop]
+        row_starts = indptr[start:stop] - lo
+        local_rows = np.repeat(np.arange(stop - start), lengths)
+        cols = np.arange(hi - lo) - row_starts[local_rows]
+        # negated values so an ascending sort ranks genes high to low, padding sorts last
+        padded = np.full((stop - start, width), np.inf)
+        padded[local_rows, cols] = -X_norm.data[lo:hi]
+        order = np.argsort(padded, axis=1)
+        keep = np.arange(width) < out_lengths[start:stop, None]
+        nnz_pos = lo + (order + row_starts[:, None])[keep]
+        tokens[offsets[start] : offsets[stop]] = gene_tokens[X_norm.indices[nnz_pos]]
+    return tokens, offsets
+
+
+def add_special_tokens(tokens, offsets, cls_token, sep_token):
+    """
+    Wrap every cell of a flat token buffer with CLS and SEP tokens.
+    """
+    row_lengths = np.diff(offsets)
+    row_ids = np.repeat(np.arange(row_lengths.size), row_lengths)
+    new_offsets = np.concatenate(([0], np.cumsum(row_lengths + 2)))
+    new_tokens = np.empty(new_offsets[-1], dtype=tokens.dtype)
+    new_tokens[new_offsets[:-1]] = cls_token
+    new_tokens[new_offsets[1:] - 1] = sep_token
+    new_tokens[np.arange(tokens.size) + 2 * row_ids + 1] = tokens
+    return new_tokens, new_offsets
+
+
+def split_tokens(tokens, offsets):
+    """
+    Split a flat token buffer into one array (a view) per cell.
+    """
+    if len(offsets) <= 1:
+        return []
+    return np.split(tokens, offsets[1:-1])
+
+
 class TranscriptomeTokenizer:
     def __init__(
         self,
@@ -86,6 +164,7 @@ class TranscriptomeTokenizer:
         special_token=False,
         gene_median_file=GENE_MEDIAN_FILE,
         token_dictionary_file=TOKEN_DICTIONARY_FILE,
+        tokenize_engine: Literal["vectorized", "per_cell"] = "vectorized",
     ):
         """
         Initialize tokenizer.
@@ -109,6 +188,9 @@ class TranscriptomeTokenizer:
             | gene expression values across Genecorpus-30M.
         token_dictionary_file : Path
             | Path to pickle file containing token dictionary (Ensembl IDs:token).
+        tokenize_engine : {"vectorized", "per_cell"}
+            | "vectorized" ranks all cells of a chunk with one segmented sort over the sparse matrix.
+            | "per_cell" ranks cells one by one (original implementation).
 
         """
         # dictionary of custom attributes {output dataset column name: input .loom column name}
@@ -126,6 +208,15 @@ class TranscriptomeTokenizer:
         # add CLS and SEP tokens
         self.special_token = special_token
 
+        # engine that turns normalized expression into rank value encodings
+        if tokenize_engine not in ("vectorized", "per_cell"):
+            logger.error(
+                "Invalid option for tokenize_engine. "
+                'Valid options: {"vectorized", "per_cell"}'
+            )
+            raise
+        self.tokenize_engine = tokenize_engine
+
         # load dictionary of gene normalization factors
         # (non-zero median value of expression across Genecorpus-30M)
         with open(gene_median_file, "rb") as f:
@@ -261,10 +352,7 @@ class TranscriptomeTokenizer:
             X_norm = X_view / n_counts * target_sum / norm_factor_vector
             X_norm = sp.csr_matrix(X_norm)
 
-            tokenized_cells += [
-                rank_genes(X_norm[i].data, coding_miRNA_tokens[X_norm[i].indices])
-                for i in range(X_norm.shape[0])
-            ]
+            tokenized_cells += self.rank_csr(X_norm, coding_miRNA_tokens)
 
             # add custom attributes for subview to dict
             if self.custom_attr_name_dict is not None:
@@ -330,10 +418,15 @@ class TranscriptomeTokenizer:
                     / norm_factor_vector[:, None]
                 )
                 # tokenize subview gene vectors
-                tokenized_cells += [
-                    tokenize_cell(subview_norm_array[:, i], coding_miRNA_tokens)
-                    for i in range(subview_norm_array.shape[1])
-                ]
+                if self.tokenize_engine == "vectorized":
+                    tokenized_cells += self.rank_csr(
+                        sp.csr_matrix(subview_norm_array.T), coding_miRNA_tokens
+                    )
+                else:
+                    tokenized_cells += [
+                        tokenize_cell(subview_norm_array[:, i], coding_miRNA_tokens)
+                        for i in range(subview_norm_array.shape[1])
+                    ]
 
                 # add custom attributes for subview to dict
                 if self.custom_attr_name_dict is not None:
@@ -344,6 +437,126 @@ class TranscriptomeTokenizer:
 
         return tokenized_cells, file_cell_metadata
 
+    def rank_csr(self, X_norm, gene_tokens, max_len=None):
+        """
+        Rank value encode every row of a normalized CSR matrix with the configured engine.
+        """
+        if self.tokenize_engine == "vectorized":
+            return split_tokens(*tokenize_csr(X_norm, gene_tokens, max_len))
+        X_norm = sp.csr_matrix(X_norm)
+        X_norm.eliminate_zeros()
+        tokenized_cells = [
+            rank_genes(X_norm[i].data, gene_tokens[X_norm[i].indices])
+            for i in range(X_norm.shape[0])
+        ]
+        if max_len is not None:
+            tokenized_cells = [input_ids[0:max_len] for input_ids in tokenized_cells]
+        return tokenized_cells
+
+    def normalize_matrix(self, X, ensembl_ids, n_counts=None, target_sum=10_000):
+        """
+        Select token genes of a cells x genes count matrix and scale them by total counts and gene medians.
+
+        **Returns:**
+
+        X_norm : scipy.sparse.csr_matrix
+            | Median-scaled expression of the token genes.
+        gene_tokens : numpy.ndarray
+            | Token of each column of X_norm.
+        """
+        ensembl_ids = np.asarray(ensembl_ids)
+        coding_miRNA_loc = np.where(
+            [self.genelist_dict.get(i, False) for i in ensembl_ids]
+        )[0]
+        norm_factor_vector = np.array(
+            [self.gene_median_dict[i] for i in ensembl_ids[coding_miRNA_loc]]
+        )
+        coding_miRNA_tokens = np.array(
+            [self.gene_token_dict[i] for i in ensembl_ids[coding_miRNA_loc]]
+        )
+
+        X = sp.csr_matrix(X)
+        if n_counts is None:
+            n_counts = np.asarray(X.sum(axis=1)).ravel()
+        n_counts = np.asarray(n_counts, dtype=np.float64).ravel()
+        # cells without counts have no detected genes, avoid dividing by zero
+        n_counts[n_counts == 0] = 1
+
+        X_norm = sp.csr_matrix(
+            sp.diags(target_sum / n_counts)
+            @ X[:, coding_miRNA_loc]
+            @ sp.diags(1 / norm_factor_vector)
+        )
+        return X_norm, coding_miRNA_tokens
+
+    def tokenize_matrix_flat(self, X, ensembl_ids, n_counts=None, target_sum=10_000):
+        """
+        Tokenize an in-memory count matrix into a flat token buffer plus per-cell offsets.
+
+        Always uses the vectorized engine. Encodings are truncated to the model input size
+        and wrapped with CLS and SEP tokens if special_token is set.
+
+        **Returns:**
+
+        tokens : numpy.ndarray
+            | Rank value encodings of all cells back to back.
+        offsets : numpy.ndarray
+            | Cell i spans tokens[offsets[i]:offsets[i + 1]].
+        """
+        X_norm, gene_tokens = self.normalize_matrix(X, ensembl_ids, n_counts, target_sum)
+        if self.special_token:
+            tokens, offsets = tokenize_csr(X_norm, gene_tokens, self.model_input_size - 2)
+            return add_special_tokens(
+                tokens,
+                offsets,
+                self.gene_token_dict.get("<cls>"),
+                self.gene_token_dict.get("<sep>"),
+            )
+        return tokenize_csr(X_norm, gene_tokens, self.model_input_size)
+
+    def tokenize_matrix(self, X, ensembl_ids, n_counts=None, target_sum=10_000):
+        """
+        Tokenize an in-memory cells x genes count matrix without going through a .loom file.
+
+        **Parameters:**
+
+        X : numpy.ndarray, scipy.sparse.spmatrix
+            | Raw counts with cells as rows and genes as columns.
+        ensembl_ids : array-like
+            | Ensembl ID of each column of X.
+        n_counts : None, array-like
+            | Total read counts of each cell. Defaults to the row sums of X.
+        target_sum : int
+            | Total counts each cell is normalized to.
+
+        **Returns:**
+
+        list of numpy.ndarray
+            | Rank value encoding of each cell, truncated to the model input size.
+        """
+        if self.tokenize_engine == "vectorized":
+            return split_tokens(
+                *self.tokenize_matrix_flat(X, ensembl_ids, n_counts, target_sum)
+            )
+        X_norm, gene_tokens = self.normalize_matrix(X, ensembl_ids, n_counts, target_sum)
+        tokenized_cells = self.rank_csr(X_norm, gene_tokens)
+        return [self.truncate_input_ids(input_ids) for input_ids in tokenized_cells]
+
+    def truncate_input_ids(self, input_ids):
+        """
+        Truncate a rank value encoding to the model input size, adding CLS and SEP tokens if enabled.
+        """
+        if self.special_token:
+            # truncate to leave space for CLS and SEP token
+            input_ids = input_ids[0 : self.model_input_size - 2]
+            input_ids = np.insert(input_ids, 0, self.gene_token_dict.get("<cls>"))
+            input_ids = np.insert(
+                input_ids, len(input_ids), self.gene_token_dict.get("<sep>")
+            )
+        else:
+            input_ids = input_ids[0 : self.model_input_size]
+        return input_ids
+
     def create_dataset(
         self,
         tokenized_cells,
@@ -375,21 +588,7 @@ class TranscriptomeTokenizer:
                 example["length_uncropped"] = len(example["input_ids"])
 
             # Truncate/Crop input_ids to input size
-            if self.special_token:
-                example["input_ids"] = example["input_ids"][
-                    0 : self.model_input_size - 2
-                ]  # truncate to leave space for CLS and SEP token
-                example["input_ids"] = np.insert(
-                    example["input_ids"], 0, self.gene_token_dict.get("<cls>")
-                )
-                example["input_ids"] = np.insert(
-                    example["input_ids"],
-                    len(example["input_ids"]),
-                    self.gene_token_dict.get("<sep>"),
-                )
-            else:
-                # Truncate/Crop input_ids to input size
-                example["input_ids"] = example["input_ids"][0 : self.model_input_size]
+            example["input_ids"] = self.truncate_input_ids(example["input_ids"])
             example["length"] = len(example["input_ids"])
 
             return example
@@ -1,31 +1,50 @@
 """File domain service impl"""
 
 from __future__ import annotations
+import hashlib
 import io
 import os
 import uuid
-import scanpy as sc
 from pathlib import Path
 from typing import Optional, List
 from typing import Union
 import pandas as pd
 from fastapi import UploadFile, Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import StreamingResponse
 
 from src.main.app.common.config.config_manager import load_config
-from src.main.app.common.enums.enum import FilterOperators
-from src.main.app.common.exception.exception import ParameterException
+from src.main.app.common.datasource.barcode_index import BarcodeIndex, barcode_index_cache
+from src.main.app.common.datasource.h5ad_source import h5ad_source
+from src.main.app.common.enums.enum import FilterOperators, ResponseCode, ExportFormat
+from src.main.app.common.exception.exception import ParameterException, SystemException
 from src.main.app.common.util.excel_util import export_excel
+from src.main.app.common.util.upload_util import is_hdf5_header, resumable_upload_store, stream_to_file
 from src.main.app.common.util.validate_util import ValidateService
 from src.main.app.mapper.file_mapper import FileMapper
 from src.main.app.mapper.sample_mapper import sampleMapper
 from src.main.app.model.file_model import FileDO
 from src.main.app.model.sample_model import SampleDO
 from src.main.app.schema.common_schema import PageResult
-from src.main.app.schema.file_schema import FileQuery, FilePage, FileDetail, FileCreate, UploadResponse
+from src.main.app.schema.file_schema import FileQuery, FilePage, FileDetail, FileCreate, UploadResponse, \
+    UploadInit, UploadSession
 from src.main.app.service.impl.service_base_impl import ServiceBaseImpl
 from src.main.app.service.file_service import FileService
 
+# 会话中等待提交后删除的文件名
+_PENDING_REMOVALS = "pending_file_removals"
+
+
+def _remove_pending_files(session: Session) -> None:
+    for file_name in session.info.pop(_PENDING_REMOVALS, []):
+        FileServiceImpl.remove_stored_file(file_name)
+
+
+def _discard_pending_files(session: Session) -> None:
+    session.info.pop(_PENDING_REMOVALS, None)
+
 
 class FileServiceImpl(ServiceBaseImpl[FileMapper, FileDO], FileService):
     """
@@ -89,14 +108,16 @@ class FileServiceImpl(ServiceBaseImpl[FileMapper, FileDO], FileService):
             return None
         return FileDetail(**file_do.model_dump())
 
-    async def export_file_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:
+    async def export_file_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:
         if ids is None or len(ids) == 0:
             return None
         file_list: List[FileDO] = await self.retrieve_by_ids(ids = ids)
         if file_list is None or len(file_list) == 0:
             return None
         file_page_list = [FilePage(**file.model_dump()) for file in file_list]
-        return await export_excel(schema=FilePage, file_name="file_data_export", data_list=file_page_list)
+        return await export_excel(schema=FilePage, file_name="file_data_export", data_list=file_page_list, export_format=export_format)
 
     async def create_file(self, file_create: FileCreate, request: Request) -> FileDO:
         file: FileDO = FileDO(**file_create.model_dump())
@@ -141,28 +162,139 @@ class FileServiceImpl(ServiceBaseImpl[FileMapper, FileDO], FileService):
         home_dir = Path(str(load_config().server.customer_dir))
         if not os.path.exists(home_dir):
             os.makedirs(home_dir)
-        save_file_name = uuid.uuid4().hex + ".h5ad"
-        h5ad_path = home_dir / save_file_name
+        part_path = str(home_dir / uuid.uuid4().hex) + ".h5ad.part"
+        # 分块写入磁盘并同时计算哈希, 不在内存中保留整个文件
+        sha256 = hashlib.sha256()
         try:
-            with open(h5ad_path, "wb") as f:
-                contents = await file.read()
-                f.write(contents)
+            size, head = await stream_to_file(file, part_path, sha256)
         except Exception as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
             raise Exception(f"Error writing file: {e}")
-        adata = sc.read_h5ad(h5ad_path)
-        file_data = FileDO(name=file_name, path=save_file_name, size=file.size)
-        await self.save(data=file_data)
-        return UploadResponse(file_id=file_data.id, barcode_list=list(adata.obs_names))
+        if not is_hdf5_header(head):
+            os.remove(part_path)
+            raise ValueError(f"{file_name} is not an HDF5 file")
+        return await self.save_upload(part_path, file_name, size, sha256.hexdigest())
+
+    async def init_upload(self, upload_init: UploadInit) -> UploadSession:
+        if not upload_init.file_name.endswith(".h5ad"):
+            raise ParameterException
+        upload_id = resumable_upload_store.init(upload_init.file_name, upload_init.size)
+        return UploadSession(upload_id=upload_id, received=0, size=upload_init.size)
+
+    async def upload_chunk(self, upload_id: str, offset: int, chunk: UploadFile) -> UploadSession:
+        received = await resumable_upload_store.append(upload_id, offset, chunk)
+        return UploadSession(upload_id=upload_id, received=received, size=resumable_upload_store.meta(upload_id)["size"])
+
+    async def get_upload_status(self, upload_id: str) -> UploadSession:
+        return UploadSession(
+            upload_id=upload_id, received=resumable_upload_store.received(upload_id), size=resumable_upload_store.meta(upload_id)["size"]
+        )
+
+    async def complete_upload(self, upload_id: str) -> UploadResponse:
+        part_path, file_name, size, content_hash = await run_in_threadpool(resumable_upload_store.complete, upload_id)
+        response = await self.save_upload(part_path, file_name, size, content_hash)
+        resumable_upload_store.discard(upload_id)
+        return response
+
+    async def save_upload(self, part_path: str, file_name: str, size: int, content_hash: str) -> UploadResponse:
+        customer_dir = load_config().server.customer_dir
+        existing: Optional[FileDO] = await self.mapper.select_by_content_hash(content_hash=content_hash)
+        save_file_name = content_hash + ".h5ad"
+        if existing is not None and os.path.exists(os.path.join(customer_dir, existing.path)):
+            # 相同内容已上传过: 增加引用计数, 直接复用已有文件及其 barcode 索引
+            if await self.mapper.add_reference(id=existing.id) == 1:
+                os.remove(part_path)
+                barcode_index = await run_in_threadpool(
+                    barcode_index_cache.get, os.path.join(customer_dir, existing.path)
+                )
+                return UploadResponse(file_id=existing.id, barcode_list=barcode_index.all_barcodes())
+            # 记录已被并发删除, 其文件正在移除: 另存为新文件, 避免被删除
+            existing = None
+            save_file_name = f"{content_hash}_{uuid.uuid4().hex[:8]}.h5ad"
+        elif existing is not None:
+            # 已有记录但文件丢失时恢复到原路径
+            save_file_name = existing.path
+        h5ad_path = os.path.join(customer_dir, save_file_name)
+        os.replace(part_path, h5ad_path)
+        try:
+            # 在线程池中读取 barcode 并写入索引, 不阻塞事件循环
+            barcode_index = await run_in_threadpool(barcode_index_cache.build, h5ad_path)
+        except Exception as e:
+            os.remove(h5ad_path)
+            raise ValueError(f"{file_name} is not a readable h5ad file: {e}")
+        if existing is not None and await self.mapper.add_reference(id=existing.id) == 1:
+            file_data = existing
+        else:
+            file_data = await self.mapper.insert_or_reference(
+                record=FileDO(name=file_name, path=save_file_name, size=size, content_hash=content_hash)
+            )
+            if file_data.path != save_file_name:
+                # 并发上传的相同内容已入库, 保留其文件
+                await run_in_threadpool(self.remove_stored_file, save_file_name)
+        return UploadResponse(file_id=file_data.id, barcode_list=barcode_index.all_barcodes())
+
+    async def remove_by_id(self, *, id: int) -> None:
+        file_record: FileDO = await self.mapper.select_by_id(id=id)
+        ref_count = await self.mapper.release_reference(id=id)
+        if file_record is None or ref_count is None:
+            raise SystemException(ResponseCode.PARAMETER_ERROR.code, ResponseCode.PARAMETER_ERROR.msg)
+        # 最后一个引用被删除时才删除文件本身, 且在请求的会话提交之后, 回滚时文件仍在
+        if ref_count == 0 and file_record.path:
+            self.remove_after_commit(file_record.path)
+
+    async def batch_remove_by_ids(self, *, ids: List[int]) -> None:
+        # 所有删除在同一个会话中提交, 任一 id 失败时整批回滚, 文件都保留
+        for id in dict.fromkeys(ids):
+            await self.remove_by_id(id=id)
+
+    def remove_after_commit(self, file_name: str) -> None:
+        """
+        Remove a stored file once the request's session commits, or keep it if the session rolls back.
+        """
+        session = self.mapper.db.session.sync_session
+        if _PENDING_REMOVALS not in session.info:
+            session.info[_PENDING_REMOVALS] = []
+            if not event.contains(session, "after_commit", _remove_pending_files):
+                event.listen(session, "after_commit", _remove_pending_files)
+                event.listen(session, "after_rollback", _discard_pending_files)
+        session.info[_PENDING_REMOVALS].append(file_name)
 
+    @staticmethod
+    def remove_stored_file(file_name: str) -> None:
+        h5ad_path = os.path.join(load_config().server.customer_dir, file_name)
+        h5ad_source.close(h5ad_path)
+        for path in (h5ad_path, *BarcodeIndex.sidecar_paths(h5ad_path)):
+            if os.path.exists(path):
+                os.remove(path)
 
     async def get_barcode(self, sample_id: int) -> List[str]:
-        sample_record: SampleDO = await sampleMapper.select_by_id(id=sample_id)
-        home_dir = Path(str(load_config().server.built_in_dir))
-        file_name = f"{sample_record.sample_id}.h5ad"
-        file_path = os.path.join(home_dir, file_name)
+        file_path = await self.get_h5ad_path(sample_id=sample_id)
+        return barcode_index_cache.get(file_path).all_barcodes()
+
+    async def page_barcode(
+        self, *, file_id: Optional[int], sample_id: Optional[int], prefix: str, current: int, page_size: int
+    ) -> PageResult:
+        file_path = await self.get_h5ad_path(file_id=file_id, sample_id=sample_id)
+        records, total = barcode_index_cache.get(file_path).page(prefix, current, page_size)
+        return PageResult(records=records, total=total)
+
+    async def get_h5ad_path(self, *, file_id: Optional[int] = None, sample_id: Optional[int] = None) -> str:
+        server_config = load_config().server
+        if sample_id is not None:
+            sample_record: SampleDO = await sampleMapper.select_by_id(id=sample_id)
+            if sample_record is None:
+                raise ValueError(f"sample {sample_id} not exists")
+            file_name = f"{sample_record.sample_id}.h5ad"
+            file_path = os.path.join(server_config.built_in_dir, file_name)
+        elif file_id is not None:
+            file_record: FileDO = await self.mapper.select_by_id(id=file_id)
+            if file_record is None:
+                raise ValueError(f"file {file_id} not exists")
+            file_name = file_record.path
+            file_path = os.path.join(server_config.customer_dir, file_name)
+        else:
+            raise ParameterException
         if not os.path.exists(file_path):
             raise ValueError(f"{file_name} not exists")
-        adata = sc.read_h5ad(file_path)
-        obs_names = adata.obs_names
-        return list(obs_names)
-        
\ No newline at end of file
+        return file_path
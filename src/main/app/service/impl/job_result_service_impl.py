@@ -8,7 +8,7 @@ import pandas as pd
 from fastapi import UploadFile, Request
 from fastapi.exceptions import ResponseValidationError
 from starlette.responses import StreamingResponse
-from src.main.app.common.enums.enum import FilterOperators
+from src.main.app.common.enums.enum import FilterOperators, ExportFormat
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.common.util.validate_util import ValidateService
 from src.main.app.mapper.job_result_mapper import JobResultMapper
@@ -77,14 +77,16 @@ class JobResultServiceImpl(ServiceBaseImpl[JobResultMapper, JobResultDO], JobRes
             return None
         return JobResultDetail(**job_result_do.model_dump())
 
-    async def export_job_result_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:
+    async def export_job_result_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:
         if ids is None or len(ids) == 0:
             return None
         job_result_list: List[JobResultDO] = await self.retrieve_by_ids(ids = ids)
         if job_result_list is None or len(job_result_list) == 0:
             return None
         job_result_page_list = [JobResultPage(**job_result.model_dump()) for job_result in job_result_list]
-        return await export_excel(schema=JobResultPage, file_name="job_result_data_export", data_list=job_result_page_list)
+        return await export_excel(schema=JobResultPage, file_name="job_result_data_export", data_list=job_result_page_list, export_format=export_format)
 
     async def create_job_result(self, job_result_create: JobResultCreate, request: Request) -> JobResultDO:
         job_result: JobResultDO = JobResultDO(**job_result_create.model_dump())
@@ -2,39 +2,53 @@
 
 from __future__ import annotations
 
+import functools
 import io
+import json
 import os
 import re
-from typing import Optional, List, Tuple
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from typing import Union
 import traceback
 
+import numpy as np
 import pandas as pd
-import scanpy as sc
-from fastapi import UploadFile, Request, BackgroundTasks
+from anndata import AnnData
+from fastapi import UploadFile, Request
 from loguru import logger
 from scimilarity.utils import lognorm_counts, align_dataset
-from starlette.responses import StreamingResponse
-
-from src.main.app.common.cell_emb_search.cell_search_model import CellQuerySingleton
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+from src.main.app.common.cache.embedding_cache import embedding_cache, read_file_digest
+from src.main.app.common.cache.result_cache import ResultEntry, result_cache
+from src.main.app.common.cell_emb_search.model_registry import model_registry
+from src.main.app.common.cell_emb_search.sample_embedding_store import sample_embedding_store
+from src.main.app.common.cell_emb_search.vector_backend import vector_backend
 from src.main.app.common.config.config_manager import load_config
-from src.main.app.common.enums.enum import FilterOperators
-from src.main.app.common.util.excel_util import export_excel
+from src.main.app.common.datasource.barcode_index import barcode_index_cache
+from src.main.app.common.datasource.h5ad_source import h5ad_source
+from src.main.app.common.datasource.result_store import RESULT_SUFFIX, export_result_excel, read_result_page, \
+    iter_result_rows, read_result_rows, result_columns, result_num_rows, write_result
+from src.main.app.common.enums.enum import FilterOperators, ExportFormat
+from src.main.app.common.exception.exception import ParameterException
+from src.main.app.common.util.download_util import file_download
+from src.main.app.common.util.excel_util import export_excel, stream_rows
 from src.main.app.common.util.validate_util import ValidateService
 from src.main.app.mapper.file_mapper import fileMapper
+from src.main.app.mapper.job_hit_mapper import jobHitMapper
 from src.main.app.mapper.job_mapper import JobMapper, jobMapper
 from src.main.app.mapper.job_result_mapper import jobResultMapper
-from src.main.app.mapper.metadata_mapper import metadataMapper
 from src.main.app.mapper.sample_mapper import sampleMapper
 from src.main.app.model.file_model import FileDO
 from src.main.app.model.job_model import JobDO
 from src.main.app.model.job_result_model import JobResultDO
-from src.main.app.model.metadata_model import MetadataEntity
 from src.main.app.model.sample_model import SampleDO
 from src.main.app.schema.common_schema import PageResult
-from src.main.app.schema.job_result_schema import CellEmbResult, GeneformerEmbResult
+from src.main.app.schema.job_result_schema import CellEmbResult, GeneformerEmbResult, JobHitQuery
 from src.main.app.schema.job_schema import JobQuery, JobPage, JobDetail, JobCreate, JobSubmit, JobStatus
-from src.main.app.service.geneformer.cell_embedding import generate_cell_embedding, process_embeddings
+from src.main.app.service.geneformer.cell_embedding import generate_cell_embedding
 from src.main.app.service.impl.service_base_impl import ServiceBaseImpl
 from src.main.app.service.job_service import JobService
 
@@ -99,24 +113,228 @@ class JobServiceImpl(ServiceBaseImpl[JobMapper, JobDO], JobService):
             return None
         return JobDetail(**job_do.model_dump())
 
-    async def export_job_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:
+    async def export_job_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:
         if ids is None or len(ids) == 0:
             return None
         job_list: List[JobDO] = await self.retrieve_by_ids(ids=ids)
         if job_list is None or len(job_list) == 0:
             return None
         job_page_list = [JobPage(**job.model_dump()) for job in job_list]
-        return await export_excel(schema=JobPage, file_name="job_data_export", data_list=job_page_list)
+        return await export_excel(schema=JobPage, file_name="job_data_export", data_list=job_page_list, export_format=export_format)
 
     async def create_job(self, job_create: JobCreate, request: Request) -> JobDO:
         job: JobDO = JobDO(**job_create.model_dump())
         return await self.save(data=job)
 
-    async def generate_search_result(self, job_submit: JobSubmit, job: JobDO):
+    @staticmethod
+    def select_query_cells(adata: AnnData, job_submit: JobSubmit, h5ad_path: str) -> AnnData:
+        """
+        Select the query cells of a job: every cell with query_all, one integer cell index, or a list
+        of barcodes separated by commas, full-width commas or line breaks. Barcodes are resolved to
+        rows through the file's barcode index.
+
+        Raises:
+            ValueError: If neither cell_index nor query_all is given, the index is out of range, no
+                        barcode matches, or the selection exceeds job.max_query_cells.
+        """
+        cell_index = job_submit.cell_index
+        if job_submit.query_all:
+            selected = adata
+        elif cell_index is None or not str(cell_index).strip():
+            raise ValueError("未指定查询细胞: 需要 cell_index 或 query_all")
+        elif re.match(r'^-?\d+$', str(cell_index).strip()):
+            cell_index = int(str(cell_index).strip())
+            if cell_index < 0 or cell_index >= adata.n_obs:
+                raise ValueError(f"细胞索引 {cell_index} 超出范围 [0, {adata.n_obs})")
+            selected = adata[cell_index, :]
+        else:
+            barcodes = [barcode.strip() for barcode in re.split(r"[,，\s]+", str(cell_index)) if barcode.strip()]
+            barcodes = list(dict.fromkeys(barcodes))
+            rows = barcode_index_cache.get(h5ad_path).lookup(barcodes)
+            found = rows >= 0
+            if not found.any():
+                logger.error(f"不能够找到Barcode: {barcodes[:10]}")
+                raise ValueError(f"不能够找到Barcode: {barcodes[:10]}")
+            if int(found.sum()) < len(barcodes):
+                missing = [barcode for barcode, hit in zip(barcodes, found) if not hit]
+                logger.warning(f"{len(missing)} 个Barcode不存在: {missing[:10]}")
+            # 按文件中的行顺序读取, backed 模式只支持递增的行索引
+            selected = adata[np.sort(rows[found])]
+        max_query_cells = load_config().job.max_query_cells
+        if selected.n_obs > max_query_cells:
+            raise ValueError(f"查询细胞数 {selected.n_obs} 超过上限 {max_query_cells}")
+        return selected
+
+    @staticmethod
+    def get_query_embedding(
+        adata: AnnData,
+        embed: Callable[[AnnData], np.ndarray],
+        model_name: str,
+        file_hash: Optional[str],
+        sample_id: Optional[str] = None,
+    ) -> np.ndarray:
+        """
+        Return the embeddings of the selected query cells, running the model only for cells that are
+        neither in the built-in sample store nor in the embedding cache.
+
+        Args:
+            adata: The selected query cells, backed or in memory.
+            embed: Computes the embeddings of in-memory cells, one row per cell.
+            model_name: ModelRegistry name of the model behind `embed`.
+            file_hash: sha256 of the h5ad file, or None when it is unknown or the embedding cache is disabled.
+            sample_id: SampleDO.sample_id for built-in samples, or None.
+
+        Returns:
+            np.ndarray: One embedding per query cell, in query order.
+        """
+        barcodes = [str(barcode) for barcode in adata.obs_names]
+        model_version = model_registry.version(model_name)
+        lookups = []
+        if adata.obs_names.is_unique:
+            if sample_id is not None and load_config().cache.sample_store_enable:
+                lookups.append(functools.partial(sample_embedding_store.lookup, model_name, sample_id, model_version))
+            if file_hash is not None:
+                lookups.append(functools.partial(embedding_cache.get, file_hash, model_version))
+
+        embeddings: List[Optional[np.ndarray]] = [None] * len(barcodes)
+        pending = np.arange(len(barcodes))
+        for lookup in lookups:
+            if len(pending) == 0:
+                break
+            hit_mask, found = lookup([barcodes[i] for i in pending])
+            for i, embedding in zip(pending[hit_mask], found if found is not None else []):
+                embeddings[i] = embedding
+            pending = pending[~hit_mask]
+        logger.info(f"embedding lookup hit {len(barcodes) - len(pending)}, compute {len(pending)}")
+
+        if len(pending) > 0:
+            missing = adata[pending] if len(pending) < len(barcodes) else adata
+            missing = h5ad_source.materialize(missing) if missing.isbacked else missing.copy()
+            computed = np.asarray(embed(missing), dtype=np.float32)
+            if lookups and file_hash is not None:
+                embedding_cache.put(file_hash, model_version, [barcodes[i] for i in pending], computed)
+            for i, embedding in zip(pending, computed):
+                embeddings[i] = embedding
+        return np.stack(embeddings).astype(np.float32, copy=False)
+
+    @staticmethod
+    def embed_scimilarity(adata: AnnData) -> np.ndarray:
+        cq = model_registry.get_scimilarity()
+        adata.var_names = [name.upper() for name in adata.var_names]
+        adata.var_names_make_unique()
+        if "counts" not in adata.layers:
+            adata.layers['counts'] = adata.X.copy()
+        adata = align_dataset(adata, cq.gene_order)
+        adata = lognorm_counts(adata)
+        return cq.get_embeddings(adata.X)
+
+    @staticmethod
+    def embed_geneformer(adata: AnnData, job: Optional[JobDO] = None) -> np.ndarray:
+        adata.var_names = [name.upper() for name in adata.var_names]
+        adata.var_names_make_unique()
+        if "gene_name" in adata.var.columns:
+            # 将gene_name设置为var的索引
+            adata.var.index = list(adata.var["gene_name"])
+        adata.var.index = [str(i).upper() for i in  adata.var.index]
+        adata.var_names_make_unique()
+        query_embedding_df = generate_cell_embedding(adata, job, model=model_registry.get_geneformer())
+        return query_embedding_df.values
+
+    @staticmethod
+    def filter_hits(
+        results_metadata: pd.DataFrame,
+        hit_counts: List[int],
+        hit_ids: np.ndarray,
+        metadata_filter: Dict[str, List[str]],
+        min_score: Optional[float],
+    ) -> Tuple[pd.DataFrame, List[int], np.ndarray]:
+        """
+        Apply metadata filters and a minimum score to the top k hits of an in-process search, which
+        cannot filter while searching. SCimilarity results give the cell type as `prediction`; a
+        filter on any other column missing from the result is rejected instead of being ignored.
+        """
+        keep = np.ones(len(results_metadata), dtype=bool)
+        if min_score is not None:
+            keep &= results_metadata["score"].to_numpy() >= min_score
+        for column, values in metadata_filter.items():
+            if not values:
+                continue
+            # SCimilarity 的细胞类型列名为 prediction, 与 build_job_hits 一致
+            if column == "cell_type" and column not in results_metadata.columns:
+                column = "prediction"
+            if column not in results_metadata.columns:
+                raise ValueError(f"检索结果不支持按 {column} 过滤")
+            keep &= results_metadata[column].isin(values).to_numpy()
+        if keep.all():
+            return results_metadata, hit_counts, hit_ids
+        query_idx = np.repeat(np.arange(len(hit_counts)), hit_counts)
+        hit_counts = np.bincount(query_idx[keep], minlength=len(hit_counts)).tolist()
+        return results_metadata[keep].reset_index(drop=True), hit_counts, np.asarray(hit_ids)[keep]
+
+    @staticmethod
+    def parse_cursor(cursor: str, sort_by: str) -> Tuple[Any, int]:
+        """
+        Decode the (sort value, row_idx) cursor returned with the previous page, checking that the
+        sort value has the type of the sort column. Raises ValueError for anything else.
+        """
+        decoded = json.loads(cursor)
+        if not isinstance(decoded, list) or len(decoded) != 2:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        value, row_idx = decoded
+
+        def is_int(item: Any) -> bool:
+            return isinstance(item, int) and not isinstance(item, bool)
+
+        if sort_by == "row":
+            valid = is_int(value)
+        elif sort_by == "score":
+            valid = is_int(value) or isinstance(value, float)
+        else:
+            valid = isinstance(value, str)
+        if not valid or not is_int(row_idx):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return value, row_idx
+
+    @staticmethod
+    def build_job_hits(
+        job_id: int, results_metadata: pd.DataFrame, hit_counts: List[int], hit_ids: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        Column-wise rows of the job_hit table for a result frame ordered by query cell, then rank.
+        """
+        total = len(results_metadata)
+        hit_counts = np.asarray(hit_counts, dtype=np.int64)
+        query_starts = np.concatenate([[0], np.cumsum(hit_counts)[:-1]]).astype(np.int64)
+        query_idx = np.repeat(np.arange(len(hit_counts), dtype=np.int64), hit_counts)
+        if "prediction" in results_metadata.columns and "cell_type" not in results_metadata.columns:
+            cell_type = results_metadata["prediction"]
+        else:
+            cell_type = results_metadata.get("cell_type", pd.Series([""] * total))
+
+        def text_column(column: pd.Series) -> np.ndarray:
+            return column.astype(object).where(column.notna(), "").astype(str).str.slice(0, 255).to_numpy()
+
+        return {
+            "job_id": np.full(total, job_id, dtype=np.int64),
+            "row_idx": np.arange(total, dtype=np.int64),
+            "query_idx": query_idx,
+            "rank": np.arange(total, dtype=np.int64) - np.repeat(query_starts, hit_counts),
+            "hit_id": np.asarray(hit_ids, dtype=np.int64),
+            "score": results_metadata["score"].to_numpy(dtype=np.float64) if total else np.array([], dtype=np.float64),
+            "tissue": text_column(results_metadata.get("tissue", pd.Series([""] * total))),
+            "disease": text_column(results_metadata.get("disease", pd.Series([""] * total))),
+            "cell_type": text_column(cell_type),
+        }
+
+    async def generate_search_result(
+        self, job_submit: JobSubmit, job: JobDO, db_session: Optional[AsyncSession] = None
+    ):
         logger.info(job_submit)
-        session = self.mapper.db.session
+        session = db_session or self.mapper.db.session
         job_id = job.id
-        file_name = str(job_id) + ".xlsx"
+        file_name = str(job_id) + RESULT_SUFFIX
         server_config = load_config().server
         output_dir = server_config.output_dir
         output_path = os.path.join(output_dir, file_name)
@@ -124,99 +342,101 @@ class JobServiceImpl(ServiceBaseImpl[JobMapper, JobDO], JobService):
             h5ad_path: str = ""
             file_info = job_submit.file_info
 
+            sample_record: Optional[SampleDO] = None
+            # 嵌入缓存的文件键: 上传文件用入库时的内容哈希, 内置文件用预先写好的 .sha256 文件
+            file_hash: Optional[str] = None
             # 本地文件上传
             if job_submit.job_type == 1:
                 customer_dir = server_config.customer_dir
                 file_record: FileDO = await fileMapper.select_by_id(id=int(file_info), db_session=session)
                 file_path = file_record.path
                 h5ad_path = os.path.join(customer_dir, file_path)
+                file_hash = file_record.content_hash
             # 内置文件
             elif job_submit.job_type == 2:
                 built_in_dir = server_config.built_in_dir
-                sample_record: SampleDO = await sampleMapper.select_by_id(id=int(file_info), db_session=session)
+                sample_record = await sampleMapper.select_by_id(id=int(file_info), db_session=session)
                 file_path = sample_record.sample_id + ".h5ad"
                 h5ad_path = os.path.join(built_in_dir, file_path)
+                file_hash = read_file_digest(h5ad_path)
 
-            adata = sc.read_h5ad(h5ad_path)
+            if not load_config().cache.embedding_enable:
+                file_hash = None
+            # backed 模式打开, 只有需要计算的细胞才载入内存
+            adata = h5ad_source.open(h5ad_path)
             logger.info(f"read h5ad file {h5ad_path}")
 
-            cell_index = job_submit.cell_index
+            adata = self.select_query_cells(adata, job_submit, h5ad_path)
+            query_ids = np.array([str(barcode) for barcode in adata.obs_names])
+            logger.info(f"查询细胞数: {len(query_ids)}")
             result_cell_count = job_submit.result_cell_count
-
-            if cell_index is None:
-                cell_index = 1
-                adata = adata[cell_index, :]
-            else:
-                try:
-                    pattern = r'^-?\d+$'
-                    num = bool(re.match(pattern, cell_index))
-                    if num:
-                        cell_index = int(cell_index)
-                        if cell_index< 0 or cell_index > adata.n_obs:
-                            cell_index = 1
-                        adata = adata[cell_index, :]
-                    else:
-                        cell_index = cell_index.replace("，", ",")
-                        cell_index = [index for index in cell_index.split(",")]
-                        adata = adata[adata.obs_names.isin(cell_index)]
-                except:
-                    logger.error(f"不能够找到Barcode: {cell_index}")
-                    raise
-            adata.var_names = [name.upper() for name in adata.var_names]
-            adata.var_names_make_unique()
             if result_cell_count is None or result_cell_count < 1 or result_cell_count > 10000:
                 result_cell_count = 10000
-            model_dir = load_config().server.model_dir
             # 人类
             if job_submit.species == 1:
-                logger.info(f"开始加载scimilarity模型")
-                cq = CellQuerySingleton(model_dir)
-                logger.info(f"模型加载完成")
-                if "counts" not in adata.layers:
-                    adata.layers['counts'] = adata.X.copy()
-                adata = align_dataset(adata, cq.gene_order)
-                adata = lognorm_counts(adata)
-                adata.obsm["X_scimilarity"] = cq.get_embeddings(adata.X)
-                query_embedding = adata.obsm["X_scimilarity"]
-                df = pd.DataFrame(query_embedding)
-                nn_idxs, nn_dists, results_metadata = cq.search_nearest(query_embedding, k=result_cell_count)
+                model_name = model_registry.SCIMILARITY
+                embed = self.embed_scimilarity
             else:
                 # 小鼠
                 logger.info(f"使用geneformer模型")
-                if "gene_name" in adata.var.columns:
-                    # 将gene_name设置为var的索引
-                    adata.var.index = list(adata.var["gene_name"])
-                adata.var.index = [str(i).upper() for i in  adata.var.index]
-                adata.var_names_make_unique()
-                query_embedding_df = generate_cell_embedding(adata, job)
-
-                df = query_embedding_df
-                query_embedding = query_embedding_df.values.flatten().tolist()
-                logger.info(f"query_embedding: {type(query_embedding)}")
-                metadata_records: List[Tuple[MetadataEntity, float]] =  await metadataMapper.get_docs_by_vector(embedding=query_embedding, top_k=job_submit.result_cell_count)
-                logger.info(f"metadata_records: {metadata_records}")
-                data = [
-                    {**vars(metadata), "score": score}  # 假设metadata是对象，使用vars()转换为字典
-                    if hasattr(metadata, '__dict__') else
-                    {**metadata, "score": score}  # 如果metadata已经是字典
-                    for metadata, score in metadata_records
-                ]
-                results_metadata = pd.DataFrame(data)
-                columns_to_drop = ["_sa_instance_state", "create_time", "update_time", "cell_embedding"]
-                results_metadata = results_metadata.drop(columns=columns_to_drop, errors="ignore")
-            # 将结果保存到 Excel 文件
-            results_metadata.to_excel(output_path, index=False)
-            emb_output_path = output_path.replace(".xlsx", "_emb.xlsx")
-            df.to_excel(emb_output_path, index=False)
-
-
-            # 更新任务状态
-            job.status = 3
-            await jobMapper.update_by_id(record=job, db_session=session)
+                model_name = model_registry.GENEFORMER
+                embed = functools.partial(self.embed_geneformer, job=job)
+            sample_id = sample_record.sample_id if job_submit.job_type == 2 else None
+            query_embedding = self.get_query_embedding(adata, embed, model_name, file_hash, sample_id)
+            df = pd.DataFrame(query_embedding, columns=[str(i) for i in range(query_embedding.shape[1])])
+            df.insert(0, "query_id", query_ids)
+
+            metadata_filter = job_submit.metadata_filter.model_dump(exclude_none=True) \
+                if job_submit.metadata_filter is not None else {}
+            if job_submit.species == 1:
+                cq = model_registry.get_scimilarity()
+                # 一次检索全部查询细胞
+                nn_idxs, nn_dists, results_metadata = cq.search_nearest(query_embedding, k=result_cell_count)
+                hit_counts = [len(nn_idx) for nn_idx in nn_idxs]
+                results_metadata.insert(0, "query_id", np.repeat(query_ids, hit_counts))
+                # 余弦距离转换为相似度, 与 geneformer 结果一致
+                results_metadata["score"] = 1 - np.concatenate(nn_dists).astype(np.float64)
+                hit_ids = np.concatenate(nn_idxs)
+                results_metadata, hit_counts, hit_ids = self.filter_hits(
+                    results_metadata, hit_counts, hit_ids, metadata_filter, job_submit.min_score
+                )
+            else:
+                vector_config = load_config().vector
+                ef_search = job_submit.ef_search or vector_config.ef_search
+                probes = job_submit.probes or vector_config.probes
+                # 全部查询细胞批量检索, 检索后端 (pgvector 或本地索引) 由 vector.backend 配置
+                results_metadata = await vector_backend.search(
+                    query_embedding, result_cell_count, db_session=session, ef_search=ef_search, probes=probes,
+                    filters=metadata_filter, similarity_threshold=job_submit.min_score
+                )
+                logger.info(f"metadata_records: {len(results_metadata)}")
+                query_idx = results_metadata.pop("query_idx").to_numpy()
+                hit_counts = np.bincount(query_idx, minlength=len(query_ids)).tolist()
+                results_metadata.insert(0, "query_id", query_ids[query_idx])
+                hit_ids = results_metadata["id"].to_numpy(dtype=np.int64)
+            # 结果以 parquet 保存, 分页时只读取对应的 row group, Excel 在下载时生成
+            result_size = await run_in_threadpool(write_result, results_metadata, output_path)
+            emb_output_path = os.path.join(output_dir, f"{job_id}_emb{RESULT_SUFFIX}")
+            await run_in_threadpool(write_result, df, emb_output_path, 256)
+            # 命中记录写入 job_hit 表, 用于结果的过滤、排序与分页
+            hit_columns = self.build_job_hits(job_id, results_metadata, hit_counts, hit_ids)
+            await jobHitMapper.bulk_insert(columns=hit_columns, db_session=session)
+            logger.info(f"命中记录已保存: {len(results_metadata)}")
+
+            # 更新任务状态, 只在任务仍为执行中时完成; 已被超时回收或由其他 worker 完成的任务不覆盖
+            updated = await jobMapper.update_status(
+                id=job_id, status=JobStatus.COMPLETED.value, expected_status=JobStatus.EXECUTING.value,
+                db_session=session
+            )
+            if updated == 0:
+                await session.rollback()
+                logger.warning(f"job {job_id} 已不在执行中, 丢弃本次结果")
+                return
+            job.status = JobStatus.COMPLETED.value
             logger.info(f"job已完成{job}")
 
             # 保存文件记录
-            file_data = FileDO(name=file_name, path=file_name, size=os.path.getsize(output_path))
+            file_data = FileDO(name=file_name, path=file_name, size=result_size)
             await fileMapper.insert(record=file_data, db_session=session)
             logger.info(f"文件记录已保存{file_data}")
 
@@ -229,23 +449,27 @@ class JobServiceImpl(ServiceBaseImpl[JobMapper, JobDO], JobService):
         except Exception as e:
             logger.error(f"{e}")
             traceback.print_stack()
-            job.status = 4
-            await jobMapper.update_by_id(record=job, db_session=session)
+            await session.rollback()
+            await jobMapper.update_status(
+                id=job_id, status=JobStatus.FAILED.value, expected_status=JobStatus.EXECUTING.value,
+                db_session=session
+            )
             await session.commit()
+            logger.info(f"job已失败{job_id}")
             raise
-            logger.info(f"job已失败{job}")
 
-    async def submit_job(self, job_submit: JobSubmit, request: Request, background_tasks: BackgroundTasks) -> JobDO:
+    async def submit_job(self, job_submit: JobSubmit, request: Request) -> JobDO:
+        # 未指定查询细胞的任务直接拒绝, 不进入队列
+        if not job_submit.query_all and (job_submit.cell_index is None or not str(job_submit.cell_index).strip()):
+            raise ParameterException
         job: JobDO = JobDO(**job_submit.model_dump())
-        # 正在进行中
-        job.status=2
+        # 等待执行, 由 JobDispatcher 领取后交给工作进程
+        job.status = JobStatus.WAITING.value
+        job.params = job_submit.model_dump_json(by_alias=True)
 
         await self.save(data=job)
         logger.info(f"job已保存{job}")
 
-        # 异步执行 generate_search_result
-        background_tasks.add_task(self.generate_search_result, job_submit, job)
-
         return job
 
     async def batch_create_job(self, *, job_create_list: List[JobCreate], request: Request) -> List[int]:
@@ -279,18 +503,29 @@ class JobServiceImpl(ServiceBaseImpl[JobMapper, JobDO], JobService):
 
         return job_create_list
 
-    async def get_result(self, job_id: int, request: Request, current: int = 1, page_size: int = 10):
+    async def get_result_entry(self, job_id: int) -> Tuple[int, Optional[ResultEntry]]:
+        """
+        The status of a job and, once completed, where its result lives, served from the result cache.
+        """
+        cache_enable = load_config().cache.result_enable
+        entry = result_cache.get(job_id) if cache_enable else None
+        if entry is None and cache_enable:
+            # 共享内存段的拷贝与解码在线程池中执行, 不阻塞事件循环
+            entry = await run_in_threadpool(result_cache.get_shared, job_id)
+        if entry is not None:
+            return JobStatus.COMPLETED.value, entry
         job_record: JobDO = await self.mapper.select_by_id(id=job_id)
-        status = job_record.status
-        if status != JobStatus.COMPLETED.value:
-            return {"status": status, "records": [], "total": 0}
+        if job_record is None:
+            raise ParameterException
+        if job_record.status != JobStatus.COMPLETED.value:
+            return job_record.status, None
         eq = {"job_id": job_record.id}
         filters = {
             FilterOperators.EQ: eq,
         }
         records, total_count = await jobResultMapper.select_by_page(**filters)
         if total_count == 0:
-            return PageResult(records=[], total=total_count)
+            return job_record.status, None
         record: JobResultDO = records[0]
         file_id = record.file_id
         file_record: FileDO = await fileMapper.select_by_id(id=file_id)
@@ -298,37 +533,118 @@ class JobServiceImpl(ServiceBaseImpl[JobMapper, JobDO], JobService):
         output_dir = load_config().server.output_dir
         output_file_path = os.path.join(output_dir, file_path)
         logger.info(f"output_file_path: {output_file_path}")
-        df = pd.read_excel(output_file_path)
-        df = df.fillna("-")
-        start = (current - 1) * page_size
-        if start >= len(df):
-            return {"status": status, "records": [], "total": len(df)}
-        end = start + page_size
-        paginated_df = df.iloc[start:end]
+        has_hits = file_path.endswith(RESULT_SUFFIX) and await jobHitMapper.exists(job_id=job_record.id)
+        frame = await run_in_threadpool(result_cache.load_frame, output_file_path) if cache_enable else None
+        entry = ResultEntry(output_file_path, job_record.species, has_hits, frame)
+        if cache_enable:
+            await run_in_threadpool(result_cache.put, job_id, entry)
+        return job_record.status, entry
+
+    async def get_result(self, hit_query: JobHitQuery, request: Request):
+        status, entry = await self.get_result_entry(hit_query.job_id)
+        if status != JobStatus.COMPLETED.value:
+            return {"status": status, "records": [], "total": 0}
+        if entry is None:
+            return PageResult(records=[], total=0)
+        output_file_path = entry.path
+        page_size = hit_query.page_size
+        start = (hit_query.current - 1) * page_size
+        next_cursor = None
+        if entry.has_hits:
+            # 在 job_hit 表中过滤、排序并按游标分页, 再从结果文件读取这一页的行
+            hit_filters = {
+                "tissue": hit_query.tissue,
+                "disease": hit_query.disease,
+                "cell_type": hit_query.cell_type,
+                "min_score": hit_query.min_score,
+            }
+            try:
+                cursor = self.parse_cursor(hit_query.cursor, hit_query.sort_by) if hit_query.cursor else None
+            except ValueError:
+                raise ParameterException
+            hits = await jobHitMapper.select_page(
+                job_id=hit_query.job_id,
+                filters=hit_filters,
+                sort_by=hit_query.sort_by,
+                descending=hit_query.sort_order == "desc",
+                cursor=cursor,
+                offset=start,
+                limit=page_size,
+            )
+            if any(value not in (None, "") for value in hit_filters.values()):
+                total = await jobHitMapper.count(job_id=hit_query.job_id, filters=hit_filters)
+            elif entry.frame is not None:
+                total = len(entry.frame)
+            else:
+                total = await run_in_threadpool(result_num_rows, output_file_path)
+            if len(hits) == page_size:
+                row_idx, value = hits[-1]
+                next_cursor = json.dumps([value, row_idx])
+            row_idxs = [row_idx for row_idx, _ in hits]
+            if entry.frame is not None:
+                paginated_df = entry.frame.iloc[row_idxs]
+            else:
+                paginated_df = await run_in_threadpool(read_result_rows, output_file_path, row_idxs)
+        elif entry.frame is not None:
+            paginated_df, total = entry.frame.iloc[start:start + page_size], len(entry.frame)
+        elif output_file_path.endswith(RESULT_SUFFIX):
+            paginated_df, total = await run_in_threadpool(
+                read_result_page, output_file_path, start, start + page_size
+            )
+        else:
+            # 旧任务的结果仍为 Excel 文件
+            df = pd.read_excel(output_file_path)
+            paginated_df, total = df.iloc[start:start + page_size], len(df)
+        if len(paginated_df) == 0:
+            return {"status": status, "records": [], "total": total}
+        paginated_df = paginated_df.fillna("-")
         data_dicts = paginated_df.to_dict(orient="records")
-        species = job_record.species
+        species = entry.species
         if species == 1:
             emb_results: List[CellEmbResult] = [CellEmbResult(**item) for item in data_dicts]
         else:
             emb_results: List[GeneformerEmbResult] = [GeneformerEmbResult(**item) for item in data_dicts]
-        return {"status": status, "records": emb_results, "total": len(df), "species": species}
-
-    @staticmethod
-    async def export_result(job_id: int, request: Request, emb: bool):
-        output_dir = load_config().server.output_dir
-        file_name = str(job_id) + ".xlsx"
+        return {
+            "status": status, "records": emb_results, "total": total, "species": species, "next_cursor": next_cursor
+        }
 
-        download_file_name = "cell_emb_" + file_name
-        if emb:
-            download_file_name = download_file_name.replace(".xlsx", "_emb.xlsx")
-            file_name = file_name.replace(".xlsx", "_emb.xlsx")
-        result_path = os.path.join(output_dir, file_name)
-        def file_iterator(file_path, chunk_size=1024 * 1024):
-            with open(file_path, "rb") as f:
-                while chunk := f.read(chunk_size):
-                    yield chunk
+    async def remove_by_id(self, *, id: int) -> None:
+        await jobHitMapper.delete_by_job_ids(job_ids=[id])
+        await super().remove_by_id(id=id)
+        result_cache.invalidate(id)
 
-        headers = {"Content-Disposition": f"attachment; filename={download_file_name}"}
+    async def batch_remove_by_ids(self, *, ids: List[int]) -> None:
+        await jobHitMapper.delete_by_job_ids(job_ids=ids)
+        await super().batch_remove_by_ids(ids=ids)
+        for id in ids:
+            result_cache.invalidate(id)
 
-        return StreamingResponse(file_iterator(result_path), media_type="application/octet-stream", headers=headers)
+    @staticmethod
+    async def export_result(
+        job_id: int, request: Request, emb: bool, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Response:
+        output_dir = load_config().server.output_dir
+        file_name = str(job_id) + ("_emb" if emb else "")
+        download_name = "cell_emb_" + file_name
+        result_path = os.path.join(output_dir, file_name + ".xlsx")
+        parquet_path = os.path.join(output_dir, file_name + RESULT_SUFFIX)
+        has_parquet = os.path.exists(parquet_path)
+        if export_format == ExportFormat.parquet and has_parquet:
+            result_path, download_file_name = parquet_path, download_name + RESULT_SUFFIX
+        elif export_format == ExportFormat.xlsx:
+            # 首次下载时由 parquet 结果生成 Excel, 之后直接复用
+            if has_parquet and (
+                not os.path.exists(result_path) or os.path.getmtime(result_path) < os.path.getmtime(parquet_path)
+            ):
+                await run_in_threadpool(export_result_excel, parquet_path, result_path)
+            download_file_name = download_name + ".xlsx"
+        else:
+            # CSV 边读取 row group 边输出; 旧任务只有 Excel 结果时先读取再转换
+            if has_parquet:
+                columns, rows = result_columns(parquet_path), iter_result_rows(parquet_path)
+            else:
+                df = await run_in_threadpool(pd.read_excel, result_path)
+                columns, rows = list(df.columns), df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            return await stream_rows(columns, rows, download_name, export_format)
+        return file_download(result_path, download_file_name, request)
 
@@ -8,7 +8,7 @@ import pandas as pd
 from fastapi import UploadFile, Request
 from fastapi.exceptions import ResponseValidationError
 from starlette.responses import StreamingResponse
-from src.main.app.common.enums.enum import FilterOperators
+from src.main.app.common.enums.enum import FilterOperators, ExportFormat
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.common.util.validate_util import ValidateService
 from src.main.app.mapper.metadata_mapper import MetadataMapper
@@ -93,14 +93,16 @@ class MetadataServiceImpl(ServiceBaseImpl[MetadataMapper, MetadataEntity], Metad
             return None
         return MetadataDetail(**metadata_do.model_dump())
 
-    async def export_metadata_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:
+    async def export_metadata_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:
         if ids is None or len(ids) == 0:
             return None
         metadata_list: List[MetadataEntity] = await self.retrieve_by_ids(ids = ids)
         if metadata_list is None or len(metadata_list) == 0:
             return None
         metadata_page_list = [MetadataPage(**metadata.model_dump()) for metadata in metadata_list]
-        return await export_excel(schema=MetadataPage, file_name="metadata_data_export", data_list=metadata_page_list)
+        return await export_excel(schema=MetadataPage, file_name="metadata_data_export", data_list=metadata_page_list, export_format=export_format)
 
     async def create_metadata(self, metadata_create: MetadataCreate, request: Request) -> MetadataEntity:
         metadata: MetadataEntity = MetadataEntity(**metadata_create.model_dump())
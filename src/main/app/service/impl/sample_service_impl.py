@@ -9,10 +9,11 @@ from typing import Union
 
 import pandas as pd
 from fastapi import UploadFile, Request
-from starlette.responses import StreamingResponse, FileResponse
+from starlette.responses import Response, StreamingResponse
 
 from src.main.app.common.config.config_manager import load_config
-from src.main.app.common.enums.enum import FilterOperators
+from src.main.app.common.enums.enum import FilterOperators, ExportFormat
+from src.main.app.common.util.download_util import file_download
 from src.main.app.common.util.excel_util import export_excel
 from src.main.app.common.util.validate_util import ValidateService
 from src.main.app.mapper.sample_mapper import SampleMapper
@@ -96,7 +97,9 @@ class SampleServiceImpl(ServiceBaseImpl[SampleMapper, SampleDO], SampleService):
             return None
         return SampleDetail(**sample_do.model_dump())
 
-    async def export_sample_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:
+    async def export_sample_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:
         if ids is None or len(ids) == 0:
             return None
         sample_list: List[SampleDO] = await self.retrieve_by_ids(ids=ids)
@@ -109,9 +112,9 @@ class SampleServiceImpl(ServiceBaseImpl[SampleMapper, SampleDO], SampleService):
             if "species" in sample_data:
                 sample_data["species"] = species_mapping.get(sample_data["species"], sample_data["species"])
             sample_page_list.append(SampleExport(**sample_data))
-        return await export_excel(schema=SampleExport, file_name="sample_data_export", data_list=sample_page_list)
+        return await export_excel(schema=SampleExport, file_name="sample_data_export", data_list=sample_page_list, export_format=export_format)
 
-    async def download_sample_page(self, id: int, request: Request):
+    async def download_sample_page(self, id: int, request: Request) -> Optional[Response]:
         sample_record: SampleDO = await self.retrieve_by_id(id=id)
         if sample_record is None:
             return sample_record
@@ -120,15 +123,7 @@ class SampleServiceImpl(ServiceBaseImpl[SampleMapper, SampleDO], SampleService):
         built_in_dir = server_config.built_in_dir
         file_name = sample_record.sample_id + ".h5ad"
         source_path = os.path.join(built_in_dir, file_name)
-
-        def file_iterator(file_path, chunk_size=1024 * 1024):
-            with open(file_path, "rb") as f:
-                while chunk := f.read(chunk_size):
-                    yield chunk
-
-        headers = {"Content-Disposition": f"attachment; filename={file_name}"}
-
-        return StreamingResponse(file_iterator(source_path), media_type="application/octet-stream", headers=headers)
+        return file_download(source_path, file_name, request)
 
     async def create_sample(self, sample_create: SampleCreate, request: Request) -> SampleDO:
         sample: SampleDO = SampleDO(**sample_create.model_dump())
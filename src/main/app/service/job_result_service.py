@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from typing import Optional, List
 from fastapi import UploadFile, Request
 from starlette.responses import StreamingResponse
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.model.job_result_model import JobResultDO
 from src.main.app.schema.common_schema import PageResult
 from src.main.app.schema.job_result_schema import JobResultQuery, JobResultDetail, JobResultCreate
@@ -20,7 +21,9 @@ class JobResultService(ServiceBase[JobResultDO], ABC):
     async def fetch_job_result_detail(self, *, id: int, request: Request) -> Optional[JobResultDetail]:...
 
     @abstractmethod
-    async def export_job_result_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:...
+    async def export_job_result_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:...
 
     @abstractmethod
     async def create_job_result(self, *, job_result_create: JobResultCreate, request: Request) -> JobResultDO:...
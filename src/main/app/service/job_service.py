@@ -3,10 +3,12 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Optional, List
-from fastapi import UploadFile, Request, BackgroundTasks
-from starlette.responses import StreamingResponse
+from fastapi import UploadFile, Request
+from starlette.responses import Response, StreamingResponse
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.model.job_model import JobDO
 from src.main.app.schema.common_schema import PageResult
+from src.main.app.schema.job_result_schema import JobHitQuery
 from src.main.app.schema.job_schema import JobQuery, JobDetail, JobCreate, JobSubmit
 from src.main.app.service.service_base import ServiceBase
 
@@ -20,13 +22,15 @@ class JobService(ServiceBase[JobDO], ABC):
     async def fetch_job_detail(self, *, id: int, request: Request) -> Optional[JobDetail]:...
 
     @abstractmethod
-    async def export_job_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:...
+    async def export_job_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:...
 
     @abstractmethod
     async def create_job(self, *, job_create: JobCreate, request: Request) -> JobDO:...
 
     @abstractmethod
-    async def submit_job(self, *, job_submit: JobSubmit, request: Request, background_tasks: BackgroundTasks) -> JobDO:...
+    async def submit_job(self, *, job_submit: JobSubmit, request: Request) -> JobDO:...
 
     @abstractmethod
     async def batch_create_job(self, *, job_create_list: List[JobCreate], request: Request) -> List[int]:...
@@ -35,8 +39,10 @@ class JobService(ServiceBase[JobDO], ABC):
     async def import_job(self, *, file: UploadFile, request: Request) -> List[JobCreate]:...
 
     @abstractmethod
-    async def get_result(self, job_id: int, request: Request, current: int , page_size: int ):...
+    async def get_result(self, hit_query: JobHitQuery, request: Request):...
 
     @abstractmethod
-    async def export_result(self, job_id: int, request: Request, emb: bool):
+    async def export_result(
+        self, job_id: int, request: Request, emb: bool, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Response:
         pass
\ No newline at end of file
@@ -5,6 +5,7 @@ from abc import ABC, abstractmethod
 from typing import Optional, List
 from fastapi import UploadFile, Request
 from starlette.responses import StreamingResponse
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.model.metadata_model import MetadataEntity
 from src.main.app.schema.common_schema import PageResult
 from src.main.app.schema.metadata_schema import MetadataQuery, MetadataDetail, MetadataCreate
@@ -20,7 +21,9 @@ class MetadataService(ServiceBase[MetadataEntity], ABC):
     async def fetch_metadata_detail(self, *, id: int, request: Request) -> Optional[MetadataDetail]:...
 
     @abstractmethod
-    async def export_metadata_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:...
+    async def export_metadata_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:...
 
     @abstractmethod
     async def create_metadata(self, *, metadata_create: MetadataCreate, request: Request) -> MetadataEntity:...
@@ -4,7 +4,8 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Optional, List
 from fastapi import UploadFile, Request
-from starlette.responses import StreamingResponse
+from starlette.responses import Response, StreamingResponse
+from src.main.app.common.enums.enum import ExportFormat
 from src.main.app.model.sample_model import SampleDO
 from src.main.app.schema.common_schema import PageResult
 from src.main.app.schema.sample_schema import SampleQuery, SampleDetail, SampleCreate
@@ -20,7 +21,9 @@ class SampleService(ServiceBase[SampleDO], ABC):
     async def fetch_sample_detail(self, *, id: int, request: Request) -> Optional[SampleDetail]:...
 
     @abstractmethod
-    async def export_sample_page(self, *, ids: List[int], request: Request) -> Optional[StreamingResponse]:...
+    async def export_sample_page(
+        self, *, ids: List[int], request: Request, export_format: ExportFormat = ExportFormat.xlsx
+    ) -> Optional[StreamingResponse]:...
 
     @abstractmethod
     async def create_sample(self, *, sample_create: SampleCreate, request: Request) -> SampleDO:...
@@ -32,7 +35,7 @@ class SampleService(ServiceBase[SampleDO], ABC):
     async def import_sample(self, *, file: UploadFile, request: Request) -> List[SampleCreate]:...
 
     @abstractmethod
-    async def download_sample_page(self, id: int, request: Request):...
+    async def download_sample_page(self, id: int, request: Request) -> Optional[Response]:...
 
     @abstractmethod
     async def fetch_all_sample_by_species(self, species: str, request: Request): ...
\ No newline at end of file
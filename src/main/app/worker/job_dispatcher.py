@@ -0,0 +1,190 @@
+"""Dispatch pending search jobs to the worker process pool"""
+
+import asyncio
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.main.app.common.config.config import JobConfig
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.session.db_engine import get_async_engine
+from src.main.app.mapper.job_mapper import jobMapper
+from src.main.app.schema.job_schema import JobStatus
+from src.main.app.worker.job_worker import init_worker, ping, run_job
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+except ImportError:
+    from sqlalchemy.orm import sessionmaker as async_sessionmaker
+
+
+class JobDispatcher:
+    """
+    Polls the job table for waiting jobs, claims them and runs them in a process pool.
+
+    The job table itself is the durable queue: a job stays WAITING until a dispatcher
+    claims it, so submitted jobs survive a server restart. While a job is EXECUTING its
+    dispatcher refreshes the job's heartbeat on every poll; jobs whose heartbeat is older than
+    `heartbeat_timeout`, left behind by a server worker that died or was redeployed, are moved
+    back to WAITING, or to FAILED after `max_attempts` claims. Stale jobs are recovered on
+    start and then every `heartbeat_timeout` seconds by any running dispatcher.
+    """
+
+    def __init__(self, job_config: JobConfig):
+        self.job_config = job_config
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._session_maker: Optional[async_sessionmaker] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[int, asyncio.Future] = {}
+        self._watchers: Set[asyncio.Task] = set()
+        self._next_recovery = 0.0
+        self._stopped: Optional[asyncio.Event] = None
+        self._pool_broken = False
+        self._mp_context = multiprocessing.get_context(self.job_config.mp_start_method)
+        self._status_queue: Optional[Any] = None
+        self._model_states: Dict[int, Dict[str, str]] = {}
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # States of the replaced pool's workers are stale
+        self._model_states.clear()
+        return ProcessPoolExecutor(
+            max_workers=self.job_config.max_workers,
+            mp_context=self._mp_context,
+            initializer=init_worker,
+            initargs=(self._status_queue,),
+        )
+
+    def _drain_model_states(self) -> None:
+        if self._status_queue is None:
+            return
+        while True:
+            try:
+                pid, name, state = self._status_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._model_states.setdefault(pid, {})[name] = state
+
+    def model_status(self) -> Dict[int, Dict[str, str]]:
+        """
+        Return the model load states reported by each worker process, keyed by pid.
+        """
+        self._drain_model_states()
+        return {pid: dict(states) for pid, states in self._model_states.items()}
+
+    async def start(self) -> None:
+        self._status_queue = self._mp_context.Queue()
+        self._executor = self._create_executor()
+        self._executor.submit(ping)
+        self._session_maker = async_sessionmaker(get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+        self._stopped = asyncio.Event()
+        try:
+            await self._recover_stale_jobs()
+        except Exception as e:
+            logger.error(f"Recover stale jobs failed: {e}")
+        self._task = asyncio.create_task(self._poll_loop())
+        logger.info(f"Job dispatcher started with {self.job_config.max_workers} worker(s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("Job dispatcher stopped")
+
+    async def _poll_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._drain_model_states()
+                await self._heartbeat()
+                if asyncio.get_running_loop().time() >= self._next_recovery:
+                    await self._recover_stale_jobs()
+                await self._dispatch()
+            except Exception as e:
+                logger.error(f"Job dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.job_config.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat(self) -> None:
+        if not self._running:
+            return
+        async with self._session_maker() as session:
+            await jobMapper.touch_jobs(ids=list(self._running), status=JobStatus.EXECUTING.value, db_session=session)
+            await session.commit()
+
+    async def _recover_stale_jobs(self) -> None:
+        self._next_recovery = asyncio.get_running_loop().time() + self.job_config.heartbeat_timeout
+        async with self._session_maker() as session:
+            retried, failed = await jobMapper.recover_stale_jobs(
+                status=JobStatus.EXECUTING.value,
+                stale_before=datetime.now() - timedelta(seconds=self.job_config.heartbeat_timeout),
+                max_attempts=self.job_config.max_attempts,
+                retry_status=JobStatus.WAITING.value,
+                failed_status=JobStatus.FAILED.value,
+                db_session=session,
+            )
+            await session.commit()
+        if retried or failed:
+            logger.warning(f"Recovered stale executing jobs: {retried} requeued, {failed} failed")
+
+    async def _dispatch(self) -> None:
+        free_slots = self.job_config.max_workers - len(self._running)
+        if free_slots <= 0:
+            return
+        if self._pool_broken:
+            logger.warning("Job worker pool is broken, recreating it")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+            self._pool_broken = False
+        async with self._session_maker() as session:
+            job_ids = await jobMapper.claim_jobs(
+                from_status=JobStatus.WAITING.value,
+                to_status=JobStatus.EXECUTING.value,
+                limit=free_slots,
+                db_session=session,
+            )
+            await session.commit()
+        loop = asyncio.get_running_loop()
+        for job_id in job_ids:
+            logger.info(f"job {job_id} dispatched to worker pool")
+            future = loop.run_in_executor(self._executor, run_job, job_id)
+            self._running[job_id] = future
+            # 保留任务引用, 避免被垃圾回收
+            watcher = asyncio.create_task(self._watch_job(job_id, future))
+            self._watchers.add(watcher)
+            watcher.add_done_callback(self._watchers.discard)
+
+    async def _watch_job(self, job_id: int, future: asyncio.Future) -> None:
+        try:
+            await future
+        except Exception as e:
+            await self._on_job_failed(job_id, e)
+        else:
+            logger.info(f"job {job_id} finished")
+        finally:
+            self._running.pop(job_id, None)
+
+    async def _on_job_failed(self, job_id: int, exc: BaseException) -> None:
+        logger.error(f"job {job_id} failed in worker: {exc!r}")
+        # The worker marks its own failures; this covers a worker that died mid-job
+        async with self._session_maker() as session:
+            await jobMapper.update_status(
+                id=job_id,
+                status=JobStatus.FAILED.value,
+                expected_status=JobStatus.EXECUTING.value,
+                db_session=session,
+            )
+            await session.commit()
+        if isinstance(exc, BrokenProcessPool):
+            self._pool_broken = True
+
+
+jobDispatcher = JobDispatcher(load_config().job)
@@ -0,0 +1,95 @@
+"""Search job execution inside a worker process"""
+
+import asyncio
+import os
+import random
+from typing import Any, Optional
+
+import numpy as np
+import torch
+from loguru import logger
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.main.app.common.cell_emb_search.model_registry import ModelState, model_registry
+from src.main.app.common.config.config_manager import load_config
+from src.main.app.common.session.db_engine import get_async_engine
+from src.main.app.mapper.job_mapper import jobMapper
+from src.main.app.model.job_model import JobDO
+from src.main.app.schema.job_schema import JobSubmit
+from src.main.app.service.impl.job_service_impl import JobServiceImpl
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+except ImportError:
+    from sqlalchemy.orm import sessionmaker as async_sessionmaker
+
+# Each worker process keeps one event loop and one engine for its whole lifetime,
+# so connections in the pool stay bound to the loop that created them.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_session_maker: Optional[async_sessionmaker] = None
+_job_service: Optional[JobServiceImpl] = None
+
+
+def init_worker(status_queue: Optional[Any] = None) -> None:
+    """
+    Initialize a worker process of the job pool and warm up its models.
+
+    Args:
+        status_queue: A multiprocessing queue receiving (pid, model name, state) events.
+    """
+    global _loop, _session_maker, _job_service
+    random.seed(2025)
+    np.random.seed(2025)
+    torch.manual_seed(2025)
+    torch.cuda.manual_seed_all(2025)
+
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _session_maker = async_sessionmaker(get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+    _job_service = JobServiceImpl(mapper=jobMapper)
+
+    if status_queue is not None:
+        pid = os.getpid()
+
+        def report_state(name: str, state: ModelState) -> None:
+            status_queue.put((pid, name, state.value))
+
+        model_registry.add_listener(report_state)
+        for name, state in model_registry.status().items():
+            status_queue.put((pid, name, state))
+    if load_config().model.preload:
+        model_registry.warm_up()
+    logger.info("Job worker initialized")
+
+
+def ping() -> int:
+    """
+    No-op task used to make the pool spawn, and so warm up, its worker processes.
+    """
+    return os.getpid()
+
+
+def run_job(job_id: int) -> int:
+    """
+    Execute a claimed search job to completion.
+
+    Args:
+        job_id: The ID of a job already moved to the executing status.
+
+    Returns:
+        The ID of the executed job.
+    """
+    if _loop is None:
+        init_worker()
+    _loop.run_until_complete(_run_job(job_id))
+    return job_id
+
+
+async def _run_job(job_id: int) -> None:
+    async with _session_maker() as session:
+        job: JobDO = await jobMapper.select_by_id(id=job_id, db_session=session)
+        if job is None:
+            logger.warning(f"job {job_id} not found, skip")
+            return
+        job_submit = JobSubmit.model_validate_json(job.params)
+        await _job_service.generate_search_result(job_submit, job, db_session=session)
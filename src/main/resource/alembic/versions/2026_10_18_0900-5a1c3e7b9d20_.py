@@ -0,0 +1,26 @@
+"""add job params
+
+Revision ID: 5a1c3e7b9d20
+Revises: 89581cb48fc7
+Create Date: 2026-10-18 09:00:12.418376
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1c3e7b9d20'
+down_revision = '89581cb48fc7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('job', sa.Column('params', sa.Text(), nullable=True, comment='任务参数'))
+    op.create_index('ix_job_status', 'job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_status', table_name='job')
+    op.drop_column('job', 'params')
@@ -0,0 +1,36 @@
+"""file content hash and bigint size
+
+Revision ID: 7c2e4a9f1b36
+Revises: 5a1c3e7b9d20
+Create Date: 2026-10-18 10:00:41.207512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e4a9f1b36'
+down_revision = '5a1c3e7b9d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file') as batch_op:
+        batch_op.alter_column('size', existing_type=sa.Integer(), type_=sa.BigInteger(),
+                              existing_nullable=True, comment='大小(字节)', existing_comment='大小(MB)')
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True, comment='内容哈希(sha256)'))
+        batch_op.create_index('ix_file_content_hash', ['content_hash'], unique=False)
+    # 已有记录的大小由 MB 换算为字节
+    op.execute("UPDATE file SET size = size * 1024 * 1024 WHERE size IS NOT NULL")
+
+
+def downgrade():
+    # 先换算回 MB, 再缩小为 Integer
+    op.execute("UPDATE file SET size = size / (1024 * 1024) WHERE size IS NOT NULL")
+    with op.batch_alter_table('file') as batch_op:
+        batch_op.drop_index('ix_file_content_hash')
+        batch_op.drop_column('content_hash')
+        batch_op.alter_column('size', existing_type=sa.BigInteger(), type_=sa.Integer(),
+                              existing_nullable=True, comment='大小(MB)', existing_comment='大小(字节)')
@@ -0,0 +1,30 @@
+"""file ref count and unique content hash
+
+Revision ID: b3f8d1e6a4c7
+Revises: 7c2e4a9f1b36
+Create Date: 2026-10-18 11:00:12.583904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f8d1e6a4c7'
+down_revision = '7c2e4a9f1b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file') as batch_op:
+        batch_op.add_column(sa.Column('ref_count', sa.Integer(), server_default='1', nullable=False, comment='引用次数'))
+        batch_op.drop_index('ix_file_content_hash')
+        batch_op.create_index('ix_file_content_hash', ['content_hash'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('file') as batch_op:
+        batch_op.drop_index('ix_file_content_hash')
+        batch_op.create_index('ix_file_content_hash', ['content_hash'], unique=False)
+        batch_op.drop_column('ref_count')
@@ -0,0 +1,44 @@
+"""add job hit table
+
+Revision ID: e5a9c2d7f813
+Revises: b3f8d1e6a4c7
+Create Date: 2026-10-18 12:00:27.904115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c2d7f813'
+down_revision = 'b3f8d1e6a4c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_hit',
+    sa.Column('job_id', sa.BigInteger(), nullable=False, comment='任务Id'),
+    sa.Column('row_idx', sa.BigInteger(), nullable=False, comment='结果文件中的行号'),
+    sa.Column('query_idx', sa.Integer(), nullable=False, comment='查询细胞序号'),
+    sa.Column('rank', sa.Integer(), nullable=False, comment='排名'),
+    sa.Column('hit_id', sa.BigInteger(), nullable=True, comment='命中细胞Id(元数据主键或参考库索引)'),
+    sa.Column('score', sa.Float(), nullable=False, comment='相似度'),
+    sa.Column('tissue', sa.String(length=255), nullable=False, comment='组织'),
+    sa.Column('disease', sa.String(length=255), nullable=False, comment='疾病'),
+    sa.Column('cell_type', sa.String(length=255), nullable=False, comment='细胞类型'),
+    sa.PrimaryKeyConstraint('job_id', 'row_idx'),
+    comment='任务命中表'
+    )
+    op.create_index('ix_job_hit_score', 'job_hit', ['job_id', 'score', 'row_idx'], unique=False)
+    op.create_index('ix_job_hit_tissue', 'job_hit', ['job_id', 'tissue', 'row_idx'], unique=False)
+    op.create_index('ix_job_hit_disease', 'job_hit', ['job_id', 'disease', 'row_idx'], unique=False)
+    op.create_index('ix_job_hit_cell_type', 'job_hit', ['job_id', 'cell_type', 'row_idx'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_job_hit_cell_type', table_name='job_hit')
+    op.drop_index('ix_job_hit_disease', table_name='job_hit')
+    op.drop_index('ix_job_hit_tissue', table_name='job_hit')
+    op.drop_index('ix_job_hit_score', table_name='job_hit')
+    op.drop_table('job_hit')
@@ -0,0 +1,34 @@
+"""add hnsw index on metadata cell embedding
+
+Revision ID: a7d3f5c1e924
+Revises: e5a9c2d7f813
+Create Date: 2026-10-18 13:00:41.518302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f5c1e924'
+down_revision = 'e5a9c2d7f813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 向量索引只在 PostgreSQL (pgvector) 上创建
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # CONCURRENTLY 不能在事务中执行, 建索引期间 metadata 仍可写入
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metadata_cell_embedding_hnsw "
+            "ON metadata USING hnsw (cell_embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_metadata_cell_embedding_hnsw")
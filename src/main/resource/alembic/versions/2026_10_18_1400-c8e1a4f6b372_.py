@@ -0,0 +1,36 @@
+"""add metadata filter indexes
+
+Revision ID: c8e1a4f6b372
+Revises: a7d3f5c1e924
+Create Date: 2026-10-18 14:00:12.370845
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e1a4f6b372'
+down_revision = 'a7d3f5c1e924'
+branch_labels = None
+depends_on = None
+
+FILTER_COLUMNS = ('tissue', 'disease', 'cell_type', 'organism', 'assay')
+
+
+def upgrade():
+    # 向量检索的元数据过滤列, 过滤条件选择性高时按 B-tree 索引取行后精确排序
+    if op.get_bind().dialect.name != "postgresql":
+        for column in FILTER_COLUMNS:
+            op.create_index(f'ix_metadata_{column}', 'metadata', [column], unique=False)
+        return
+    with op.get_context().autocommit_block():
+        for column in FILTER_COLUMNS:
+            op.create_index(
+                f'ix_metadata_{column}', 'metadata', [column], unique=False,
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade():
+    for column in reversed(FILTER_COLUMNS):
+        op.drop_index(f'ix_metadata_{column}', table_name='metadata', if_exists=True)
@@ -0,0 +1,41 @@
+"""add quantized hnsw indexes on metadata cell embedding
+
+Revision ID: d4b7e2a9c615
+Revises: c8e1a4f6b372
+Create Date: 2026-10-18 15:00:27.914063
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b7e2a9c615'
+down_revision = 'c8e1a4f6b372'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 量化索引只在 PostgreSQL (pgvector 0.7+) 上创建
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # 表达式索引建在 cell_embedding 的类型转换上, 不新增列也不重写表
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metadata_cell_embedding_half_hnsw "
+            "ON metadata USING hnsw ((cell_embedding::halfvec(512)) halfvec_cosine_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metadata_cell_embedding_bit_hnsw "
+            "ON metadata USING hnsw ((binary_quantize(cell_embedding)::bit(512)) bit_hamming_ops) "
+            "WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_metadata_cell_embedding_bit_hnsw")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_metadata_cell_embedding_half_hnsw")
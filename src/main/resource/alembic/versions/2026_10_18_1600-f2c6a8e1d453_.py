@@ -0,0 +1,28 @@
+"""job heartbeat and attempts
+
+Revision ID: f2c6a8e1d453
+Revises: d4b7e2a9c615
+Create Date: 2026-10-18 16:00:08.261437
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a8e1d453'
+down_revision = 'd4b7e2a9c615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True, comment='执行心跳时间'))
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=True, comment='执行次数'))
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.app.common.datasource import barcode_index as barcode_index_module
+from src.main.app.common.datasource.barcode_index import BarcodeIndex
+
+BARCODES = ["CCT-1", "AAAA", "AAAB", "AAB-9", "细胞-2", "AB", "AAAA-1", "B"]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch) -> BarcodeIndex:
+    h5ad_path = tmp_path / "sample.h5ad"
+    h5ad_path.write_bytes(b"")
+    monkeypatch.setattr(barcode_index_module.h5ad_source, "read_obs_names", lambda path: pd.Index(BARCODES))
+    BarcodeIndex.build(str(h5ad_path))
+    # 从 sidecar 文件重新打开
+    return BarcodeIndex.load(str(h5ad_path))
+
+
+def matches(index: BarcodeIndex, prefix: str):
+    start, stop = index.prefix_range(prefix)
+    return [barcode.decode("utf-8") for barcode in index.barcodes[start:stop].tolist()]
+
+
+def test_prefix_range(index):
+    assert matches(index, "AAA") == ["AAAA", "AAAA-1", "AAAB"]
+    assert matches(index, "AAAA") == ["AAAA", "AAAA-1"]
+    assert matches(index, "AAAA-1") == ["AAAA-1"]
+    assert matches(index, "AAAA-12") == []
+    assert matches(index, "细胞") == ["细胞-2"]
+    assert matches(index, "Z") == []
+    assert index.prefix_range("") == (0, len(BARCODES))
+
+
+def test_lookup(index):
+    rows = index.lookup(["AB", "missing", "CCT-1", "细胞-2", ""])
+    np.testing.assert_array_equal(rows, [5, -1, 0, 4, -1])
+
+
+def test_page(index):
+    assert index.page("", current=1, page_size=3) == (BARCODES[:3], len(BARCODES))
+    assert index.page("", current=3, page_size=3) == (BARCODES[6:], len(BARCODES))
+    assert index.page("AA", current=2, page_size=2) == (["AAAB", "AAB-9"], 4)
+    assert index.page("AA", current=3, page_size=2) == ([], 4)
+    assert index.all_barcodes() == BARCODES
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import FileResponse
+
+from src.main.app.common.util.download_util import file_download
+
+
+def make_request(**headers) -> Request:
+    raw_headers = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/download", "headers": raw_headers})
+
+
+@pytest.fixture
+def result_file(tmp_path) -> str:
+    path = tmp_path / "result.csv"
+    path.write_bytes(b"id,score\n1,0.5\n")
+    return str(path)
+
+
+def test_download_sets_validators(result_file):
+    response = file_download(result_file, "result.csv", make_request())
+    assert isinstance(response, FileResponse)
+    assert response.headers["etag"] and response.headers["last-modified"]
+    assert 'filename="result.csv"' in response.headers["content-disposition"]
+
+
+def test_matching_validators_return_not_modified(result_file):
+    etag = file_download(result_file, "result.csv").headers["etag"]
+    last_modified = file_download(result_file, "result.csv").headers["last-modified"]
+
+    for headers in ({"if_none_match": f'"other", W/{etag}'}, {"if_none_match": "*"},
+                    {"if_modified_since": last_modified}):
+        response = file_download(result_file, "result.csv", make_request(**headers))
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag and not response.body
+
+    # If-None-Match 优先于 If-Modified-Since
+    response = file_download(
+        result_file, "result.csv", make_request(if_none_match='"other"', if_modified_since=last_modified)
+    )
+    assert response.status_code == 200
+    response = file_download(result_file, "result.csv", make_request(if_modified_since="not a date"))
+    assert response.status_code == 200
+
+
+def test_temporary_export_is_removed_after_sending(result_file):
+    response = file_download(result_file, "result.csv", make_request(if_none_match="*"), remove_after=True)
+    # 临时文件不参与条件请求
+    assert response.status_code == 200
+    asyncio.run(response.background())
+    with pytest.raises(FileNotFoundError):
+        open(result_file)
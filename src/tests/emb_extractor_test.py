@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from src.main.app.service.geneformer.emb_extractor import length_bucketed_batches, prefetch
+
+
+def test_batches_stay_within_token_budget():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(1, 2048, size=500)
+    batches = length_bucketed_batches(lengths, max_tokens=8192, max_batch_size=64)
+
+    # 每个细胞恰好出现一次, 按长度降序
+    order = np.concatenate(batches)
+    assert sorted(order.tolist()) == list(range(500))
+    assert (np.diff(lengths[order]) <= 0).all()
+    for batch in batches:
+        assert len(batch) <= 64
+        assert len(batch) == 1 or len(batch) * lengths[batch].max() <= 8192
+
+
+def test_short_cells_share_batches():
+    batches = length_bucketed_batches([100, 2048, 100, 100, 2048], max_tokens=4096)
+    assert [sorted(batch.tolist()) for batch in batches] == [[1, 4], [0, 2, 3]]
+    # 单个细胞超出预算时独占一个批次
+    assert [batch.tolist() for batch in length_bucketed_batches([5000, 10], max_tokens=100)] == [[0], [1]]
+    assert length_bucketed_batches([], max_tokens=100) == []
+
+
+def test_prefetch_yields_in_order_and_reraises():
+    assert list(prefetch(iter(range(10)), depth=2)) == list(range(10))
+
+    def failing():
+        yield 1
+        raise RuntimeError("collate failed")
+
+    items = prefetch(failing())
+    assert next(items) == 1
+    with pytest.raises(RuntimeError):
+        next(items)
@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+
+from src.main.app.common.cache.embedding_cache import EmbeddingCache, read_file_digest, write_file_digest
+
+VERSION = "geneformer-0123456789abcdef"
+
+
+def embeddings(n_cells: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n_cells, 8)).astype(np.float32)
+
+
+def test_get_returns_hits_in_query_order(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_memory_bytes=1 << 20, max_disk_bytes=1 << 30)
+    values = embeddings(3)
+    cache.put("a" * 64, VERSION, ["c1", "c2", "c3"], values)
+
+    hit_mask, found = cache.get("a" * 64, VERSION, ["c3", "missing", "c1"])
+    np.testing.assert_array_equal(hit_mask, [True, False, True])
+    np.testing.assert_array_equal(found, values[[2, 0]])
+    # 模型版本或文件不同则不命中
+    assert cache.get("a" * 64, "geneformer-other", ["c1"])[1] is None
+    assert cache.get("b" * 64, VERSION, ["c1"])[1] is None
+
+
+def test_disk_tier_is_shared_by_new_instances(tmp_path):
+    values = embeddings(4)
+    EmbeddingCache(str(tmp_path), 1 << 20, 1 << 30).put("a" * 64, VERSION, ["c1", "c2", "c3", "c4"], values)
+
+    cache = EmbeddingCache(str(tmp_path), 1 << 20, 1 << 30)
+    hit_mask, found = cache.get("a" * 64, VERSION, ["c4", "c2"])
+    assert hit_mask.all()
+    np.testing.assert_array_equal(found, values[[3, 1]])
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    row_bytes = embeddings(1).nbytes
+    cache = EmbeddingCache(str(tmp_path), max_memory_bytes=2 * row_bytes, max_disk_bytes=1 << 30)
+    cache.put("a" * 64, VERSION, ["c1", "c2", "c3"], embeddings(3))
+    stats = cache.stats()
+    assert stats["memory_entries"] == 2 and stats["memory_bytes"] == 2 * row_bytes
+
+
+def test_disk_tier_evicts_oldest_shards(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), 1 << 20, 1 << 30)
+    cache.put("1" * 64, VERSION, ["c1"], embeddings(1, seed=1))
+    shard_bytes = cache._disk_bytes
+    cache.max_disk_bytes = 2 * shard_bytes
+    # 第一个分片最旧
+    old = time.time() - 3600
+    for _, path, _ in cache._scan_shards():
+        os.utime(path, (old, old))
+    cache.put("2" * 64, VERSION, ["c1"], embeddings(1, seed=2))
+    cache.put("3" * 64, VERSION, ["c1"], embeddings(1, seed=3))
+
+    assert cache._disk_bytes <= 2 * shard_bytes
+    fresh = EmbeddingCache(str(tmp_path), 1 << 20, 1 << 30)
+    assert fresh.get("1" * 64, VERSION, ["c1"])[1] is None
+    np.testing.assert_array_equal(fresh.get("3" * 64, VERSION, ["c1"])[1], embeddings(1, seed=3))
+
+
+def test_file_digest_sidecar(tmp_path):
+    path = str(tmp_path / "sample.h5ad")
+    with open(path, "wb") as f:
+        f.write(b"\x89HDF\r\n\x1a\n" + b"0" * 1000)
+    assert read_file_digest(path) is None
+
+    digest = write_file_digest(path)
+    assert len(digest) == 64 and read_file_digest(path) == digest
+    # 文件在摘要之后被替换, 摘要作废
+    later = os.stat(path + ".sha256").st_mtime + 10
+    os.utime(path, (later, later))
+    assert read_file_digest(path) is None
@@ -0,0 +1,68 @@
+import asyncio
+import os
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.main.app.common.enums.enum import ExportFormat
+from src.main.app.common.util import excel_util
+from src.main.app.common.util.excel_util import (
+    EXPORT_BATCH_SIZE, iter_csv, stream_rows, write_excel_rows, write_parquet, write_xlsx
+)
+
+COLUMNS = ["id", "cell_type", "status"]
+
+
+def make_rows(n_rows: int):
+    return ([i, f"类型-{i}", ExportFormat.csv] for i in range(n_rows))
+
+
+def test_iter_csv_yields_one_chunk_per_batch():
+    chunks = list(iter_csv(COLUMNS, make_rows(2 * EXPORT_BATCH_SIZE + 1)))
+    assert len(chunks) == 3
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("\ufeffid,cell_type,status\r\n0,类型-0,csv\r\n")
+    assert text.count("\r\n") == 2 * EXPORT_BATCH_SIZE + 2
+
+
+def test_write_xlsx(tmp_path):
+    path = str(tmp_path / "rows.xlsx")
+    write_xlsx(path, COLUMNS + ["created_at"], ([*row, datetime(2026, 1, 2)] for row in make_rows(3)), "细胞")
+    sheet = openpyxl.load_workbook(path)["细胞"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == ("id", "cell_type", "status", "created_at")
+    # 枚举写入其值
+    assert rows[3] == (2, "类型-2", "csv", datetime(2026, 1, 2))
+
+
+def test_write_excel_rows_writes_missing_values_as_empty(tmp_path):
+    path = str(tmp_path / "rows.xlsx")
+    batches = [pd.DataFrame({"id": [1, 2], "score": [0.5, None]}), pd.DataFrame({"id": [3], "score": [0.1]})]
+    write_excel_rows(path, ["id", "score"], batches)
+    rows = list(openpyxl.load_workbook(path).active.iter_rows(values_only=True))
+    assert rows[1:] == [(1, 0.5), (2, None), (3, 0.1)]
+    assert os.listdir(tmp_path) == ["rows.xlsx"]
+
+
+def test_write_parquet(tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_util, "EXPORT_BATCH_SIZE", 1)
+    path = str(tmp_path / "rows.parquet")
+    write_parquet(path, COLUMNS, make_rows(25))
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.metadata.num_row_groups == 3
+    frame = parquet_file.read().to_pandas()
+    assert frame["id"].tolist() == list(range(25)) and frame["status"].unique().tolist() == ["csv"]
+
+    write_parquet(path, COLUMNS, [])
+    assert pq.read_table(path).column_names == COLUMNS
+
+
+def test_stream_rows_removes_temporary_export():
+    response = asyncio.run(stream_rows(COLUMNS, make_rows(3), "cells", ExportFormat.parquet))
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert 'filename="cells.parquet"' in response.headers["content-disposition"]
+    assert os.path.exists(response.path)
+    asyncio.run(response.background())
+    assert not os.path.exists(response.path)
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import anndata
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.app.schema.job_schema import JobSubmit
+from src.main.app.service.impl import job_service_impl
+from src.main.app.service.impl.job_service_impl import JobServiceImpl
+
+
+def test_parse_cursor():
+    assert JobServiceImpl.parse_cursor("[0.5, 3]", "score") == (0.5, 3)
+    assert JobServiceImpl.parse_cursor("[1, 3]", "score") == (1, 3)
+    assert JobServiceImpl.parse_cursor('["lung", 3]', "tissue") == ("lung", 3)
+    assert JobServiceImpl.parse_cursor("[7, 7]", "row") == (7, 7)
+
+
+@pytest.mark.parametrize(
+    "cursor, sort_by",
+    [
+        ("5", "row"),
+        ("null", "row"),
+        ('"x"', "row"),
+        ('{"value": 1}', "row"),
+        ("[1]", "row"),
+        ("[1, 2, 3]", "row"),
+        ("[true, 1]", "row"),
+        ("[1.5, 2]", "row"),
+        ('[0.5, "2"]', "score"),
+        ("[1, 1]", "tissue"),
+        ("not json", "score"),
+    ],
+)
+def test_parse_cursor_rejects_malformed(cursor, sort_by):
+    with pytest.raises(ValueError):
+        JobServiceImpl.parse_cursor(cursor, sort_by)
+
+
+def scimilarity_hits():
+    # SCimilarity 结果的细胞类型列为 prediction, 两个查询细胞各 3 个命中
+    frame = pd.DataFrame({
+        "query_id": ["q0"] * 3 + ["q1"] * 3,
+        "prediction": ["T cell", "B cell", "T cell", "NK cell", "T cell", "B cell"],
+        "tissue": ["lung", "lung", "blood", "blood", "lung", "lung"],
+        "score": [0.9, 0.8, 0.7, 0.95, 0.6, 0.5],
+    })
+    return frame, [3, 3], np.arange(100, 106)
+
+
+def test_filter_hits_maps_cell_type_to_prediction():
+    frame, hit_counts, hit_ids = scimilarity_hits()
+    filtered, counts, ids = JobServiceImpl.filter_hits(frame, hit_counts, hit_ids, {"cell_type": ["T cell"]}, None)
+    assert filtered["prediction"].tolist() == ["T cell", "T cell", "T cell"]
+    assert counts == [2, 1]
+    np.testing.assert_array_equal(ids, [100, 102, 104])
+
+
+def test_filter_hits_combines_filters_and_min_score():
+    frame, hit_counts, hit_ids = scimilarity_hits()
+    filtered, counts, ids = JobServiceImpl.filter_hits(
+        frame, hit_counts, hit_ids, {"cell_type": ["T cell", "B cell"], "tissue": ["lung"], "disease": []}, 0.55
+    )
+    np.testing.assert_array_equal(ids, [100, 101, 104])
+    assert counts == [2, 1]
+    assert filtered.index.tolist() == [0, 1, 2]
+
+
+def test_filter_hits_without_filters_keeps_everything():
+    frame, hit_counts, hit_ids = scimilarity_hits()
+    filtered, counts, ids = JobServiceImpl.filter_hits(frame, hit_counts, hit_ids, {}, None)
+    assert filtered is frame and counts == hit_counts
+
+
+def test_filter_hits_rejects_columns_missing_from_results():
+    frame, hit_counts, hit_ids = scimilarity_hits()
+    with pytest.raises(ValueError):
+        JobServiceImpl.filter_hits(frame, hit_counts, hit_ids, {"organism": ["Homo sapiens"]}, None)
+
+
+@pytest.fixture
+def query_adata(monkeypatch) -> anndata.AnnData:
+    adata = anndata.AnnData(np.zeros((5, 2), dtype=np.float32))
+    adata.obs_names = [f"BC{i}" for i in range(5)]
+    rows = {barcode: row for row, barcode in enumerate(adata.obs_names)}
+    index = SimpleNamespace(lookup=lambda barcodes: np.array([rows.get(barcode, -1) for barcode in barcodes]))
+    monkeypatch.setattr(job_service_impl.barcode_index_cache, "get", lambda path: index)
+    monkeypatch.setattr(
+        job_service_impl, "load_config", lambda: SimpleNamespace(job=SimpleNamespace(max_query_cells=4))
+    )
+    return adata
+
+
+def submit(**kwargs) -> JobSubmit:
+    return JobSubmit(model=1, job_type=1, file_info="file", species=1, **kwargs)
+
+
+def test_select_query_cells(query_adata):
+    assert JobServiceImpl.select_query_cells(query_adata, submit(cell_index=" 2 "), "x.h5ad").obs_names[0] == "BC2"
+    selected = JobServiceImpl.select_query_cells(query_adata, submit(cell_index="BC3，BC1\nmissing,BC3"), "x.h5ad")
+    # 按文件中的行顺序返回, 重复的 barcode 只取一次
+    assert selected.obs_names.tolist() == ["BC1", "BC3"]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"cell_index": " "}, {"cell_index": 5}, {"cell_index": "-1"}, {"cell_index": "nope"}, {"query_all": True}],
+)
+def test_select_query_cells_rejects(query_adata, options):
+    # 未指定查询细胞时不再默认使用第一个细胞; query_all 选中的 5 个细胞超过上限 4
+    with pytest.raises(ValueError):
+        JobServiceImpl.select_query_cells(query_adata, submit(**options), "x.h5ad")
@@ -0,0 +1,166 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.main.app.common.session.db_engine import VECTOR_CODEC_KEY
+from src.main.app.mapper import metadata_mapper
+from src.main.app.mapper.metadata_mapper import RESULT_COLUMNS, MetadataMapper, metadataMapper
+
+
+class FakeSession:
+    """
+    Records the statements of a search instead of running them.
+    """
+
+    def __init__(self, extversion: str = "0.8.0", codec: bool = False):
+        self.extversion = extversion
+        self.codec = codec
+        self.statements = []
+
+    async def connection(self):
+        return SimpleNamespace(info={VECTOR_CODEC_KEY: True} if self.codec else {})
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), dict(params or {})))
+        return SimpleNamespace(scalar=lambda: self.extversion, all=lambda: self.hits(params or {}))
+
+    @staticmethod
+    def hits(params: dict) -> list:
+        # 每个查询返回 limit 个命中, query_idx 为批内序号; 查询以编解码器的 Vector 列表绑定
+        if "embeddings" not in params:
+            return []
+        return [
+            (query_idx, hit, *[None] * (len(RESULT_COLUMNS) - 1), 1.0 - 0.1 * hit)
+            for query_idx in range(len(params["embeddings"]))
+            for hit in range(params["limit"])
+        ]
+
+    def settings(self) -> dict:
+        # 最后一条语句为 set_config
+        return self.statements[-1][1]
+
+
+@pytest.fixture(autouse=True)
+def reset_extension_version(monkeypatch):
+    monkeypatch.setattr(MetadataMapper, "_iterative_scan_supported", None)
+
+
+def prepare(session: FakeSession, top_k: int, filtered: bool, **kwargs) -> bool:
+    options = {"ef_search": 100, "probes": 10, "iterative_scan": "relaxed_order", "oversample": 4, **kwargs}
+    return asyncio.run(MetadataMapper.prepare_search(session, top_k, filtered, **options))
+
+
+def test_filtered_search_uses_iterative_scan():
+    session = FakeSession("0.8.0")
+    assert prepare(session, 10, True)
+    assert session.settings()["iterative_scan"] == "relaxed_order"
+    assert session.settings()["ef_search"] == "100"
+
+
+def test_iterative_scan_is_skipped_on_old_pgvector():
+    session = FakeSession("0.7.4")
+    assert prepare(session, 10, True)
+    assert "iterative_scan" not in session.settings()
+    # 没有迭代扫描时放大候选列表
+    assert session.settings()["ef_search"] == "400" and session.settings()["probes"] == "40"
+
+    # 扩展版本只查询一次
+    prepare(session, 10, True)
+    assert sum("pg_extension" in statement for statement, _ in session.statements) == 1
+
+
+def test_unfiltered_search_does_not_set_iterative_scan():
+    session = FakeSession("0.8.0")
+    assert prepare(session, 10, False)
+    assert "iterative_scan" not in session.settings()
+    assert not any("pg_extension" in statement for statement, _ in session.statements)
+
+
+def test_filter_conditions():
+    params = {}
+    where = MetadataMapper.filter_conditions("d", params, {"tissue": ["lung"], "disease": []}, 0.8)
+    assert where == (
+        "WHERE metadata.cell_embedding IS NOT NULL AND metadata.tissue = ANY(:filter_tissue) AND d <= :max_distance"
+    )
+    assert params["filter_tissue"] == ["lung"]
+    assert params["max_distance"] == pytest.approx(0.2)
+    with pytest.raises(ValueError):
+        MetadataMapper.filter_conditions("d", {}, {"barcode": ["x"]})
+
+
+def test_large_top_k_uses_iterative_index_scan():
+    session = FakeSession("0.8.1")
+    assert prepare(session, 8000, False)
+    settings = session.settings()
+    assert settings["iterative_scan"] == "relaxed_order"
+    assert settings["ef_search"] == "1000"
+    assert settings["max_scan_tuples"] == "32000"
+
+
+@pytest.mark.parametrize(
+    "extversion, top_k, options",
+    [
+        ("0.7.4", 5000, {}),
+        ("0.8.0", 5000, {"iterative_scan": "off"}),
+        ("0.8.0", 20000, {}),
+        ("0.8.0", 5000, {"max_index_top_k": 1000}),
+    ],
+)
+def test_large_top_k_falls_back_to_exact(extversion, top_k, options):
+    assert not prepare(FakeSession(extversion), top_k, False, **options)
+
+
+def test_build_quantized_index_sql():
+    # 与迁移 d4b7e2a9c615 创建的索引一致
+    assert MetadataMapper.build_index_sql("hnsw", quantization="halfvec") == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_metadata_cell_embedding_half_hnsw ON metadata USING hnsw "
+        "((cell_embedding::halfvec(512)) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"
+    )
+    assert MetadataMapper.build_index_sql("hnsw", concurrently=False, quantization="binary") == (
+        "CREATE INDEX IF NOT EXISTS ix_metadata_cell_embedding_bit_hnsw ON metadata USING hnsw "
+        "((binary_quantize(cell_embedding)::bit(512)) bit_hamming_ops) WITH (m = 16, ef_construction = 64)"
+    )
+    assert MetadataMapper.vector_index_name("hnsw", ("tissue", "Lung"), "halfvec") == (
+        "ix_metadata_cell_embedding_half_hnsw_tissue_lung"
+    )
+    with pytest.raises(ValueError):
+        MetadataMapper.vector_index_name("hnsw", quantization="int8")
+
+
+def test_vector_params_use_binary_codec_when_registered():
+    embeddings = np.arange(6, dtype=np.float64).reshape(2, 3)
+    vector = asyncio.run(MetadataMapper.vector_param(FakeSession(codec=True), embeddings[0]))
+    assert vector.dtype == np.float32
+    vectors = asyncio.run(MetadataMapper.vectors_param(FakeSession(codec=True), embeddings.astype(np.float32)))
+    np.testing.assert_array_equal(vectors[1].to_numpy(), [3, 4, 5])
+
+    # 未注册编解码器时使用文本形式
+    assert asyncio.run(MetadataMapper.vector_param(FakeSession(), [1, 2])) == "[1.0, 2.0]"
+    assert asyncio.run(MetadataMapper.vectors_param(FakeSession(), np.ones((2, 2), dtype=np.float32))) == (
+        '{"[1.0, 1.0]","[1.0, 1.0]"}'
+    )
+
+
+def test_batched_search_offsets_query_idx(monkeypatch):
+    monkeypatch.setattr(metadata_mapper, "MAX_BATCH_ROWS", 6)
+    session = FakeSession(codec=True)
+    hits = asyncio.run(metadataMapper.get_docs_by_vectors(np.zeros((5, 512)), session, top_k=3, exact=True))
+
+    # 每条语句最多 6 行, 5 个查询分 3 批执行
+    searches = [params for statement, params in session.statements if "LATERAL" in statement]
+    assert [len(params["embeddings"]) for params in searches] == [2, 2, 1]
+    assert hits["query_idx"].tolist() == [query_idx for query_idx in range(5) for _ in range(3)]
+    assert hits.columns.tolist() == ["query_idx", *RESULT_COLUMNS, "score"]
+    assert hits["score"].tolist()[:3] == pytest.approx([1.0, 0.9, 0.8])
+
+
+def test_quantized_search_reranks_candidates():
+    session = FakeSession("0.8.0")
+    asyncio.run(metadataMapper.get_docs_by_vectors(np.zeros((1, 512)), session, top_k=10, quantization="binary"))
+    statement, params = session.statements[-1]
+    assert "binary_quantize(metadata.cell_embedding)" in statement
+    assert params["candidates"] == 40 and params["limit"] == 10
+    with pytest.raises(ValueError):
+        asyncio.run(metadataMapper.get_docs_by_vectors(np.zeros((1, 512)), session, quantization="int8"))
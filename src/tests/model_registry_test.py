@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from src.main.app.common.cell_emb_search.model_registry import ModelRegistry, ModelState
+
+
+@pytest.fixture
+def registry() -> ModelRegistry:
+    registry = ModelRegistry()
+    registry.loads = {name: 0 for name in registry.status()}
+
+    def loader(name: str):
+        def load():
+            registry.loads[name] += 1
+            if name == ModelRegistry.GENEFORMER:
+                raise RuntimeError("checkpoint missing")
+            return f"{name}-model"
+
+        return load
+
+    registry._loaders = {name: loader(name) for name in registry.status()}
+    return registry
+
+
+def test_models_start_unloaded(registry):
+    assert set(registry.status().values()) == {ModelState.unloaded.value}
+
+
+def test_get_loads_once_and_reports_states(registry):
+    events = []
+    registry.add_listener(lambda name, state: events.append((name, state)))
+
+    threads = [threading.Thread(target=registry.get_scimilarity) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.get_scimilarity() == "scimilarity-model"
+    assert registry.loads[ModelRegistry.SCIMILARITY] == 1
+    assert events == [
+        (ModelRegistry.SCIMILARITY, ModelState.loading),
+        (ModelRegistry.SCIMILARITY, ModelState.loaded),
+    ]
+
+
+def test_failed_load_is_reported_and_retried(registry):
+    with pytest.raises(RuntimeError):
+        registry.get_geneformer()
+    assert registry.status()[ModelRegistry.GENEFORMER] == ModelState.failed.value
+    with pytest.raises(RuntimeError):
+        registry.get_geneformer()
+    assert registry.loads[ModelRegistry.GENEFORMER] == 2
+
+
+def test_warm_up_loads_preloaded_models_only(registry):
+    registry.add_listener(lambda name, state: 1 / 0)
+    registry.warm_up()
+    status = registry.status()
+    assert status[ModelRegistry.SCIMILARITY] == ModelState.loaded.value
+    assert status[ModelRegistry.GENEFORMER] == ModelState.failed.value
+    assert status[ModelRegistry.PROJECTION] == ModelState.unloaded.value
+    assert not ModelRegistry.is_ready(status)
+
+    registry.warm_up([ModelRegistry.PROJECTION])
+    assert registry.status()[ModelRegistry.PROJECTION] == ModelState.loaded.value
@@ -0,0 +1,54 @@
+import asyncio
+import http
+from types import SimpleNamespace
+
+import pytest
+
+from src.main.app.common.cell_emb_search.model_registry import ModelRegistry
+from src.main.app.controller import probe_controller
+
+LOADED = {
+    ModelRegistry.SCIMILARITY: "loaded",
+    ModelRegistry.GENEFORMER: "loaded",
+    # 投影头不预加载, 不影响就绪状态
+    ModelRegistry.PROJECTION: "unloaded",
+}
+
+
+@pytest.fixture
+def model_status(monkeypatch):
+    def configure(status, preload=True):
+        monkeypatch.setattr(probe_controller.jobDispatcher, "model_status", lambda: status)
+        monkeypatch.setattr(
+            probe_controller, "load_config", lambda: SimpleNamespace(model=SimpleNamespace(preload=preload))
+        )
+
+    return configure
+
+
+def status_code(response) -> int:
+    return getattr(response, "status_code", http.HTTPStatus.OK)
+
+
+def test_readiness_with_preloaded_models(model_status):
+    model_status({101: dict(LOADED), 102: dict(LOADED)})
+    assert status_code(asyncio.run(probe_controller.readiness())) == http.HTTPStatus.OK
+
+
+def test_readiness_waits_for_preloaded_models(model_status):
+    model_status({101: dict(LOADED), 102: {**LOADED, ModelRegistry.GENEFORMER: "loading"}})
+    assert status_code(asyncio.run(probe_controller.readiness())) == http.HTTPStatus.SERVICE_UNAVAILABLE
+    # 尚无 worker 上报
+    model_status({})
+    assert status_code(asyncio.run(probe_controller.readiness())) == http.HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def test_readiness_without_preload(model_status):
+    model_status({}, preload=False)
+    assert status_code(asyncio.run(probe_controller.readiness())) == http.HTTPStatus.OK
+
+
+def test_warm_up_models_gate_readiness():
+    assert ModelRegistry.is_ready(LOADED)
+    assert not ModelRegistry.is_ready({ModelRegistry.SCIMILARITY: "loaded"})
+    assert not ModelRegistry.is_ready({**LOADED, ModelRegistry.SCIMILARITY: "failed"})
@@ -0,0 +1,84 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.main.app.common.cache.result_cache import ResultCache, ResultEntry
+
+
+def make_entry(job_id: int, n_rows: int = 10) -> ResultEntry:
+    frame = pd.DataFrame({"hit_id": range(n_rows), "cell_type": [f"type-{i}" for i in range(n_rows)]})
+    return ResultEntry(f"/output/{job_id}.parquet", 1, True, frame)
+
+
+@pytest.fixture
+def job_ids():
+    # 共享内存段按 job id 命名, 避免与并行运行的测试冲突
+    base = os.getpid() * 1000
+    ids = [base + i for i in range(4)]
+    caches = []
+    yield ids, caches
+    for cache in caches:
+        for job_id in ids:
+            cache.invalidate(job_id)
+
+
+def shared_cache(caches, max_shared_bytes: int = 1 << 20) -> ResultCache:
+    cache = ResultCache(1 << 20, 1 << 20, shared_memory=True, max_shared_bytes=max_shared_bytes)
+    caches.append(cache)
+    return cache
+
+
+def test_memory_tier_is_bounded():
+    cache = ResultCache(max_memory_bytes=3 * 1024 + 100, max_frame_bytes=10)
+    for job_id in range(4):
+        cache.put(job_id, ResultEntry(f"/output/{job_id}.parquet", 1, False))
+    assert cache.get(0) is None
+    assert cache.get(3).path == "/output/3.parquet"
+
+    # 超出 max_frame_bytes 的结果只保留位置
+    cache.put(9, make_entry(9))
+    assert cache.get(9).frame is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_oversized_result_hits_from_memory(job_ids):
+    (job_id, *_), caches = job_ids
+    cache = shared_cache(caches, max_shared_bytes=64)
+    cache.put(job_id, make_entry(job_id))
+
+    entry = cache.get(job_id)
+    assert entry is not None and not entry.shared
+    assert len(entry.frame) == 10
+    assert cache.stats()["memory_hits"] == 1
+    assert shared_cache(caches).get_shared(job_id) is None
+
+
+def test_shared_tier_across_workers(job_ids):
+    (job_id, *_), caches = job_ids
+    owner, other = shared_cache(caches), shared_cache(caches)
+    owner.put(job_id, make_entry(job_id))
+
+    assert other.get(job_id) is None
+    entry = other.get_shared(job_id)
+    pd.testing.assert_frame_equal(entry.frame, make_entry(job_id).frame)
+    assert other.get(job_id) is entry
+    assert other.stats()["shared_hits"] == 1 and other.stats()["memory_hits"] == 1
+
+    # 删除任务后其他 worker 不再命中
+    owner.invalidate(job_id)
+    assert other.get(job_id) is None
+    assert other.get_shared(job_id) is None
+
+
+def test_evicted_segment_keeps_memory_entry(job_ids):
+    (first, second, *_), caches = job_ids
+    owner, other = shared_cache(caches), shared_cache(caches)
+    owner.put(first, make_entry(first))
+    owner.max_shared_bytes = owner.stats()["shared_bytes"] * 3 // 2
+    owner.put(second, make_entry(second))
+
+    # 容量淘汰了第一个段, 本进程内存中的条目仍然命中
+    assert other.get_shared(first) is None
+    assert owner.get(first) is not None
+    assert other.get_shared(second) is not None
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.main.app.common.datasource.result_store import (
+    read_result_page,
+    read_result_rows,
+    result_num_rows,
+    write_result,
+)
+
+
+def make_result(n_rows: int = 1000) -> pd.DataFrame:
+    return pd.DataFrame({
+        "hit_id": np.arange(n_rows, dtype=np.int64),
+        "score": np.linspace(1, 0, n_rows),
+        "cell_type": [f"type-{i % 7}" for i in range(n_rows)],
+    })
+
+
+def test_read_result_rows_in_given_order(tmp_path):
+    df = make_result()
+    path = str(tmp_path / "result.parquet")
+    write_result(df, path, row_group_size=64)
+
+    # 跨多个 row group, 乱序且有重复
+    rows = [999, 0, 63, 64, 500, 63, 128, 1]
+    expected = df.iloc[rows].reset_index(drop=True)
+    pd.testing.assert_frame_equal(read_result_rows(path, rows), expected)
+    with pa.memory_map(path) as source:
+        pd.testing.assert_frame_equal(read_result_rows(source, np.array(rows)), expected)
+
+
+def test_read_result_rows_empty(tmp_path):
+    path = str(tmp_path / "result.parquet")
+    write_result(make_result(10), path, row_group_size=4)
+
+    rows = read_result_rows(path, [])
+    assert len(rows) == 0
+    assert list(rows.columns) == ["hit_id", "score", "cell_type"]
+
+
+def test_read_result_page(tmp_path):
+    df = make_result(300)
+    path = str(tmp_path / "result.parquet")
+    write_result(df, path, row_group_size=50)
+
+    page, total = read_result_page(path, 45, 120)
+    assert total == 300 == result_num_rows(path)
+    pd.testing.assert_frame_equal(page, df.iloc[45:120].reset_index(drop=True))
+    page, _ = read_result_page(path, 290, 400)
+    assert page["hit_id"].tolist() == list(range(290, 300))
+    assert len(read_result_page(path, 300, 310)[0]) == 0
@@ -0,0 +1,101 @@
+import pickle
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from src.main.app.service.geneformer.tokenizer import (
+    TranscriptomeTokenizer,
+    add_special_tokens,
+    split_tokens,
+    tokenize_cell,
+    tokenize_csr,
+)
+
+
+def random_csr(n_cells: int = 50, n_genes: int = 200, density: float = 0.1, seed: int = 0) -> sp.csr_matrix:
+    rng = np.random.default_rng(seed)
+    # 连续值没有并列, 排序结果唯一
+    matrix = sp.random(n_cells, n_genes, density=density, format="csr", random_state=seed, dtype=np.float64)
+    matrix.data = rng.random(matrix.nnz) + 0.01
+    return matrix
+
+
+def test_tokenize_csr_matches_per_cell_ranking():
+    matrix = random_csr()
+    gene_tokens = np.arange(100, 300)
+
+    tokens, offsets = tokenize_csr(matrix, gene_tokens, block_size=7)
+    cells = split_tokens(tokens, offsets)
+    assert len(cells) == matrix.shape[0]
+    for i, cell in enumerate(cells):
+        expected = tokenize_cell(matrix[i].toarray().ravel(), gene_tokens)
+        np.testing.assert_array_equal(cell, expected)
+
+
+def test_tokenize_csr_truncates_and_keeps_empty_cells():
+    matrix = random_csr(n_cells=10, density=0.3).tolil()
+    matrix[3, :] = 0
+    matrix[4, 5] = 0.0
+    matrix = matrix.tocsr()
+    gene_tokens = np.arange(200)
+
+    tokens, offsets = tokenize_csr(matrix, gene_tokens, max_len=8, block_size=4)
+    lengths = np.diff(offsets)
+    assert lengths[3] == 0
+    assert (lengths <= 8).all()
+    for i, cell in enumerate(split_tokens(tokens, offsets)):
+        expected = tokenize_cell(matrix[i].toarray().ravel(), gene_tokens)[:8]
+        np.testing.assert_array_equal(cell, expected)
+
+
+def test_tokenize_csr_ignores_explicit_zeros():
+    matrix = sp.csr_matrix(
+        (np.array([0.5, 0.0, 2.0]), np.array([0, 1, 2]), np.array([0, 3])), shape=(1, 3)
+    )
+    tokens, offsets = tokenize_csr(matrix, np.array([10, 11, 12]))
+    np.testing.assert_array_equal(tokens, [12, 10])
+    np.testing.assert_array_equal(offsets, [0, 2])
+
+
+def test_add_special_tokens():
+    tokens = np.array([5, 6, 7, 8])
+    offsets = np.array([0, 3, 3, 4])
+
+    wrapped, new_offsets = add_special_tokens(tokens, offsets, cls_token=0, sep_token=1)
+    cells = [cell.tolist() for cell in split_tokens(wrapped, new_offsets)]
+    assert cells == [[0, 5, 6, 7, 1], [0, 1], [0, 8, 1]]
+
+
+@pytest.fixture
+def dictionaries(tmp_path):
+    # 4 个基因有 token, GENE_X 不在词表中
+    medians = {"G0": 1.0, "G1": 2.0, "G2": 0.5, "G3": 4.0}
+    token_dict = {"<pad>": 0, "<cls>": 1, "<sep>": 2, "G0": 10, "G1": 11, "G2": 12, "G3": 13}
+    paths = tmp_path / "medians.pkl", tmp_path / "tokens.pkl"
+    for path, dictionary in zip(paths, (medians, token_dict)):
+        with open(path, "wb") as f:
+            pickle.dump(dictionary, f)
+    return {"gene_median_file": paths[0], "token_dictionary_file": paths[1]}
+
+
+def test_tokenize_matrix_engines_agree(dictionaries):
+    counts = np.array([[5, 0, 2, 100, 1], [0, 3, 0, 0, 0], [0, 0, 0, 50, 0]])
+    genes = ["G0", "G1", "G2", "GENE_X", "G3"]
+
+    vectorized = TranscriptomeTokenizer(**dictionaries).tokenize_matrix(counts, genes)
+    per_cell = TranscriptomeTokenizer(tokenize_engine="per_cell", **dictionaries).tokenize_matrix(counts, genes)
+    # 按表达量 / 基因中位数降序; 总计数包含词表外的基因
+    assert [cell.tolist() for cell in vectorized] == [[10, 12, 13], [11], []]
+    assert [cell.tolist() for cell in per_cell] == [cell.tolist() for cell in vectorized]
+
+
+def test_tokenize_matrix_truncates_with_special_tokens(dictionaries):
+    counts = sp.csr_matrix(np.array([[4, 3, 3, 1], [1, 0, 0, 0]]))
+    genes = ["G0", "G1", "G2", "G3"]
+    for engine in ("vectorized", "per_cell"):
+        tokenizer = TranscriptomeTokenizer(
+            model_input_size=4, special_token=True, tokenize_engine=engine, **dictionaries
+        )
+        cells = tokenizer.tokenize_matrix(counts, genes)
+        assert [cell.tolist() for cell in cells] == [[1, 12, 10, 2], [1, 10, 2]]
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from src.main.app.common.util.upload_util import HDF5_SIGNATURE, ResumableUploadStore
+
+
+class FakeUpload:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.position = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = len(self.content) if size < 0 else self.position + size
+        chunk = self.content[self.position: end]
+        self.position += len(chunk)
+        return chunk
+
+
+def append(store: ResumableUploadStore, upload_id: str, offset: int, content: bytes) -> int:
+    return asyncio.run(store.append(upload_id, offset, FakeUpload(content)))
+
+
+def test_append_and_complete(tmp_path):
+    content = HDF5_SIGNATURE + bytes(range(256)) * 40
+    store = ResumableUploadStore(str(tmp_path))
+    upload_id = store.init("sample.h5ad", len(content))
+
+    assert append(store, upload_id, 0, content[:1000]) == 1000
+    assert store.received(upload_id) == 1000
+    assert append(store, upload_id, 1000, content[1000:]) == len(content)
+
+    part_path, file_name, size, content_hash = store.complete(upload_id)
+    assert file_name == "sample.h5ad"
+    assert size == len(content)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+    with open(part_path, "rb") as f:
+        assert f.read() == content
+
+
+def test_chunks_on_other_workers_are_hashed(tmp_path):
+    content = HDF5_SIGNATURE + bytes(range(256)) * 30
+    # 两个实例共享上传目录, 模拟两个服务进程
+    worker_a = ResumableUploadStore(str(tmp_path))
+    worker_b = ResumableUploadStore(str(tmp_path))
+    upload_id = worker_a.init("sample.h5ad", len(content))
+
+    append(worker_a, upload_id, 0, content[:2000])
+    append(worker_b, upload_id, 2000, content[2000:5000])
+    append(worker_a, upload_id, 5000, content[5000:])
+
+    _, _, _, content_hash = worker_a.complete(upload_id)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+
+
+def test_append_rejects_wrong_offset_and_oversize(tmp_path):
+    content = HDF5_SIGNATURE + b"x" * 100
+    store = ResumableUploadStore(str(tmp_path))
+    upload_id = store.init("sample.h5ad", len(content))
+    append(store, upload_id, 0, content[:50])
+
+    with pytest.raises(ValueError):
+        append(store, upload_id, 10, content[50:])
+    with pytest.raises(ValueError):
+        append(store, upload_id, 50, content[50:] + b"extra")
+    assert store.received(upload_id) == 50
+    with pytest.raises(ValueError):
+        store.complete(upload_id)
+
+    append(store, upload_id, 50, content[50:])
+    _, _, _, content_hash = store.complete(upload_id)
+    assert content_hash == hashlib.sha256(content).hexdigest()
+
+
+def test_concurrent_append_is_refused(tmp_path):
+    store = ResumableUploadStore(str(tmp_path))
+    upload_id = store.init("sample.h5ad", 100)
+
+    with store._locked(upload_id):
+        with pytest.raises(ValueError):
+            append(ResumableUploadStore(str(tmp_path)), upload_id, 0, b"x" * 10)
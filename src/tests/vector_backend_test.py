@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.main.app.common.cell_emb_search.vector_backend import (
+    CURRENT_LINK,
+    LocalIndexBackend,
+    exact_search,
+    normalize,
+)
+from src.main.app.mapper.metadata_mapper import RESULT_COLUMNS
+
+TISSUES = ("lung", "liver", "brain")
+
+
+def make_rows(n_rows: int, dim: int = 16, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n_rows, dim)).astype(np.float32)
+    frame = pd.DataFrame({column: [f"{column}-{i}" for i in range(n_rows)] for column in RESULT_COLUMNS})
+    frame["id"] = np.arange(1000, 1000 + n_rows, dtype=np.int64)
+    frame["tissue"] = [TISSUES[i % len(TISSUES)] for i in range(n_rows)]
+    return frame, embeddings
+
+
+def brute_force(matrix: np.ndarray, queries: np.ndarray, top_k: int, allowed=None):
+    scores = normalize(queries) @ normalize(matrix).T
+    if allowed is not None:
+        scores[:, ~allowed] = -np.inf
+    rows = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+    return rows, np.take_along_axis(scores, rows, axis=1)
+
+
+def write(index_dir: str, frame: pd.DataFrame, embeddings: np.ndarray, index_type: str = "hnsw") -> dict:
+    chunks = [(frame.iloc[start: start + 100], embeddings[start: start + 100]) for start in range(0, len(frame), 100)]
+    return LocalIndexBackend.write_snapshot(index_dir, len(frame), chunks, index_type=index_type, ef_construction=200)
+
+
+def test_exact_search_matches_brute_force(monkeypatch):
+    # 小块大小, 覆盖跨块合并 top k
+    monkeypatch.setattr("src.main.app.common.cell_emb_search.vector_backend.EXACT_BLOCK_ELEMENTS", 1)
+    _, embeddings = make_rows(3000)
+    queries = embeddings[:5] + 0.01
+    allowed = np.arange(3000) % 3 == 1
+
+    rows, scores = exact_search(normalize(embeddings), normalize(queries), 10, allowed)
+    expected_rows, expected_scores = brute_force(embeddings, queries, 10, allowed)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+    assert allowed[rows].all()
+
+
+def test_exact_search_pads_missing_hits():
+    _, embeddings = make_rows(10)
+    allowed = np.zeros(10, dtype=bool)
+    allowed[[2, 7]] = True
+
+    rows, scores = exact_search(normalize(embeddings), normalize(embeddings[:2]), 5, allowed)
+    assert rows.shape == (2, 5)
+    assert set(rows[0, :2]) == {2, 7}
+    assert (rows[:, 2:] == -1).all() and np.isneginf(scores[:, 2:]).all()
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "flat"])
+def test_search_with_filters(tmp_path, index_type):
+    frame, embeddings = make_rows(600)
+    write(str(tmp_path), frame, embeddings, index_type)
+    backend = LocalIndexBackend(str(tmp_path), ef_search=200, oversample=4)
+    queries = embeddings[:4]
+
+    hits = backend.search_sync(queries, 10, filters={"tissue": ["liver"]})
+    assert (hits["tissue"] == "liver").all()
+    allowed = (frame["tissue"] == "liver").to_numpy()
+    expected_rows, _ = brute_force(embeddings, queries, 10, allowed)
+    for query_idx in range(len(queries)):
+        found = hits.loc[hits["query_idx"] == query_idx, "id"].to_numpy()
+        assert len(found) == 10
+        recall = len(set(found) & set(frame["id"].to_numpy()[expected_rows[query_idx]])) / 10
+        assert recall >= 0.9
+    assert (hits.groupby("query_idx")["score"].diff().dropna() <= 1e-6).all()
+
+
+def test_search_with_selective_filter_falls_back_to_exact(tmp_path):
+    frame, embeddings = make_rows(600)
+    frame.loc[[5, 300, 599], "tissue"] = "heart"
+    write(str(tmp_path), frame, embeddings)
+    backend = LocalIndexBackend(str(tmp_path), ef_search=10, oversample=1)
+
+    hits = backend.search_sync(embeddings[:3], 5, filters={"tissue": ["heart"]})
+    for query_idx in range(3):
+        found = hits.loc[hits["query_idx"] == query_idx, "id"]
+        assert sorted(found) == [1005, 1300, 1599]
+
+
+def test_search_with_threshold(tmp_path):
+    frame, embeddings = make_rows(300)
+    write(str(tmp_path), frame, embeddings)
+    backend = LocalIndexBackend(str(tmp_path), ef_search=200)
+
+    hits = backend.search_sync(embeddings[:3], 20, similarity_threshold=0.3)
+    assert (hits["score"] >= 0.3).all()
+    # 查询细胞自身相似度为 1
+    assert set(hits.groupby("query_idx")["id"].first()) == {1000, 1001, 1002}
+
+
+def test_unknown_filter_is_rejected(tmp_path):
+    frame, embeddings = make_rows(50)
+    write(str(tmp_path), frame, embeddings, "flat")
+    with pytest.raises(ValueError):
+        LocalIndexBackend(str(tmp_path)).search_sync(embeddings[:1], 5, filters={"barcode": ["x"]})
+
+
+def test_snapshot_swap_keeps_loaded_version_readable(tmp_path):
+    index_dir = str(tmp_path)
+    frame, embeddings = make_rows(200, seed=1)
+    first = write(index_dir, frame, embeddings, "flat")
+    backend = LocalIndexBackend(index_dir)
+    old = backend.load()
+    old_hits = backend.search_sync(embeddings[:1], 3)
+
+    # 行顺序不同的新快照
+    order = np.arange(199, -1, -1)
+    second = write(index_dir, frame.iloc[order].reset_index(drop=True), embeddings[order], "flat")
+    write(index_dir, frame, embeddings, "flat")
+    assert os.readlink(os.path.join(index_dir, CURRENT_LINK)) != second["version"]
+    assert not os.path.exists(os.path.join(index_dir, first["version"]))
+
+    # 已加载的旧快照仍读取自身的元数据
+    rows, scores = exact_search(old.matrix, normalize(embeddings[:1]), 3)
+    stale_hits = LocalIndexBackend._to_frame(old, rows, scores, None, False)
+    pd.testing.assert_frame_equal(stale_hits.drop(columns="query_idx"), old_hits.drop(columns="query_idx"))
+    assert backend.load() is not old
+    assert backend.search_sync(embeddings[:1], 1)["id"].tolist() == [1000]